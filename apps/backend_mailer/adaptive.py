@@ -0,0 +1,171 @@
+import threading
+
+from apps.backend_mailer.logutils import setup_loghandlers
+from apps.backend_mailer.settings import (
+    get_adaptive_batch_duration,
+    get_adaptive_batch_size,
+    get_adaptive_concurrency,
+    get_adaptive_enabled,
+    get_adaptive_max_failure_rate,
+    get_adaptive_target_latency,
+    get_batch_size,
+    get_threads_per_process,
+)
+
+logger = setup_loghandlers("INFO")
+
+
+def clamp(value, lower, upper):
+    return max(lower, min(value, upper))
+
+
+class BackendWindow:
+    """
+    Concurrency window of one email backend and the samples recorded for it
+    during the current batch.
+    """
+
+    __slots__ = ("size", "threshold", "sent", "failed", "latency")
+
+    def __init__(self, size, threshold):
+        self.size = size
+        self.threshold = threshold
+        self.reset()
+
+    @property
+    def count(self):
+        return self.sent + self.failed
+
+    def reset(self):
+        self.sent = 0
+        self.failed = 0
+        self.latency = 0.0
+
+
+class AdaptiveController:
+    """
+    Adjusts the batch size and the concurrency of every email backend from
+    the latency and failure rate observed while sending, within the
+    ``ADAPTIVE_BATCH_SIZE`` and ``ADAPTIVE_CONCURRENCY`` bounds.
+
+    Backend windows work like a TCP congestion window, once per batch: they
+    double while below their threshold, then grow by one, and are halved
+    when the backend is congested, i.e. its mean latency is above
+    ``ADAPTIVE_TARGET_LATENCY`` or its failure rate above
+    ``ADAPTIVE_MAX_FAILURE_RATE``. The batch size is halved on congestion
+    and otherwise moves towards the number of emails sent in
+    ``ADAPTIVE_BATCH_DURATION`` seconds at the observed throughput.
+    """
+
+    def __init__(
+        self,
+        batch_size=None,
+        concurrency=None,
+        target_latency=None,
+        max_failure_rate=None,
+        batch_duration=None,
+    ):
+        self.min_batch_size, self.max_batch_size = (
+            batch_size or get_adaptive_batch_size()
+        )
+        self.min_concurrency, self.max_concurrency = (
+            concurrency or get_adaptive_concurrency()
+        )
+        self.target_latency = target_latency or get_adaptive_target_latency()
+        self.max_failure_rate = (
+            get_adaptive_max_failure_rate()
+            if max_failure_rate is None
+            else max_failure_rate
+        )
+        self.batch_duration = batch_duration or get_adaptive_batch_duration()
+        self.batch_size = clamp(
+            get_batch_size(), self.min_batch_size, self.max_batch_size
+        )
+        self._initial_concurrency = clamp(
+            get_threads_per_process(), self.min_concurrency, self.max_concurrency
+        )
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def _get_window(self, backend_id) -> BackendWindow:
+        window = self._windows.get(backend_id)
+        if window is None:
+            window = BackendWindow(self._initial_concurrency, self.max_concurrency)
+            self._windows[backend_id] = window
+        return window
+
+    def concurrency(self, backend_id) -> int:
+        """Returns the number of concurrent sends allowed for the backend."""
+        with self._lock:
+            return self._get_window(backend_id).size
+
+    def record(self, backend_id, latency: float, success: bool) -> None:
+        """Records the outcome of sending one email through the backend."""
+        with self._lock:
+            window = self._get_window(backend_id)
+            window.latency += latency
+            if success:
+                window.sent += 1
+            else:
+                window.failed += 1
+
+    def end_batch(self, email_count: int, elapsed: float) -> None:
+        """
+        Adjusts the backend windows and the batch size after a batch of
+        ``email_count`` emails was sent in ``elapsed`` seconds.
+        """
+        with self._lock:
+            congested = False
+            for backend_id, window in self._windows.items():
+                if not window.count:
+                    continue
+
+                failure_rate = window.failed / window.count
+                latency = window.latency / window.count
+                if (
+                    failure_rate > self.max_failure_rate
+                    or latency > self.target_latency
+                ):
+                    congested = True
+                    window.threshold = max(window.size // 2, self.min_concurrency)
+                    window.size = window.threshold
+                elif window.size < window.threshold:
+                    window.size = min(window.size * 2, window.threshold)
+                else:
+                    window.size = min(window.size + 1, self.max_concurrency)
+
+                logger.debug(
+                    "Backend %s: %.3fs mean latency, %.0f%% failed, concurrency %s"
+                    % (backend_id, latency, failure_rate * 100, window.size)
+                )
+                window.reset()
+
+            if congested:
+                self.batch_size = max(self.batch_size // 2, self.min_batch_size)
+            elif email_count >= self.batch_size and elapsed > 0:
+                # Only full batches tell how much more the backends can take
+                target = int(email_count / elapsed * self.batch_duration)
+                self.batch_size = clamp(
+                    (self.batch_size + target) // 2,
+                    self.min_batch_size,
+                    self.max_batch_size,
+                )
+
+
+_controller = None
+
+
+def get_adaptive_controller():
+    """
+    Returns the AdaptiveController of this process, or None when adaptive
+    sending is disabled. The controller lives as long as the process so
+    what it learns carries over from batch to batch. Sends split over
+    several processes don't use it, their samples would stay in the forked
+    processes.
+    """
+    global _controller
+    if not get_adaptive_enabled():
+        return None
+    if _controller is None:
+        _controller = AdaptiveController()
+    return _controller
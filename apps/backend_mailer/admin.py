@@ -27,9 +27,11 @@ from apps.backend_mailer.models import (
     Log,
     EmailBackend,
     SentMessages,
+    Suppression,
 )
 
 from apps.backend_mailer.sanitizer import clean_html
+from apps.backend_mailer.suppression import add_to_filter
 from apps.backend_mailer.constants import BackendConstants
 
 
@@ -432,9 +434,22 @@ class SentMessagesAdmin(admin.ModelAdmin):
     search_fields = ["email__author"]
 
 
+class SuppressionAdmin(admin.ModelAdmin):
+    readonly_fields = ["created"]
+    list_filter = ["reason"]
+    list_display = ["address", "reason", "created"]
+    search_fields = ["address"]
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Senders see the address right away instead of after the next rebuild
+        add_to_filter([obj.address])
+
+
 admin.site.register(Email, EmailAdmin)
 admin.site.register(Log, LogAdmin)
 admin.site.register(EmailTemplate, EmailTemplateAdmin)
 admin.site.register(Attachment, AttachmentAdmin)
 admin.site.register(EmailBackend, EmailBackendAdmin)
 admin.site.register(SentMessages, SentMessagesAdmin)
+admin.site.register(Suppression, SuppressionAdmin)
@@ -1,6 +1,25 @@
 from django.apps import AppConfig
+from django.core.exceptions import ImproperlyConfigured
 
 
 class BackendMailerConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.backend_mailer"
+
+    def ready(self):
+        from apps.backend_mailer.settings import (
+            get_claim_enabled,
+            get_lanes_enabled,
+            get_wakeup_enabled,
+        )
+
+        # Lane drains and promotions run concurrently, only claimed emails
+        # are safe from being picked up twice
+        if get_lanes_enabled() and not get_claim_enabled():
+            raise ImproperlyConfigured("LANES_ENABLED requires CLAIM_ENABLED")
+
+        if get_wakeup_enabled() or get_lanes_enabled():
+            from apps.backend_mailer.signals import email_queued
+            from apps.backend_mailer.tasks import queued_mail_handler
+
+            email_queued.connect(queued_mail_handler)
@@ -0,0 +1,354 @@
+import datetime
+import re
+from typing import Iterator, List, Optional, Set, Tuple
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.backend_mailer.logutils import setup_loghandlers
+from apps.backend_mailer.models import Attachment, Email, Log, SentMessages
+from apps.backend_mailer.models.email import QUEUE_STATUSES
+from apps.backend_mailer.settings import (
+    get_archive_after,
+    get_archive_batch_size,
+    get_archive_detach,
+    get_archive_retention,
+)
+from apps.mailers.models import Campaign
+
+logger = setup_loghandlers("INFO")
+
+# Rows are kept as jsonb so the archive survives schema changes of the live
+# tables, partitioned by month of the row's creation time
+ARCHIVE_TABLE = "backend_mailer_archive"
+PARTITION_NAME = re.compile(r"^%s_y(\d{4})m(\d{2})$" % ARCHIVE_TABLE)
+
+
+def get_month(value: datetime.datetime) -> datetime.datetime:
+    value = value.astimezone(datetime.timezone.utc)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def get_next_month(month: datetime.datetime) -> datetime.datetime:
+    return (month + datetime.timedelta(days=32)).replace(day=1)
+
+
+def iter_months(
+    start: datetime.datetime, end: datetime.datetime
+) -> Iterator[datetime.datetime]:
+    """Yields the first instant of every month from ``start`` to ``end``."""
+    month = get_month(start)
+    while month <= end:
+        yield month
+        month = get_next_month(month)
+
+
+def get_partition_name(month: datetime.datetime) -> str:
+    return "%s_y%04dm%02d" % (ARCHIVE_TABLE, month.year, month.month)
+
+
+class PartitionConflict(Exception):
+    """A table named after a partition isn't attached to the archive."""
+
+
+def get_unattached_tables(cursor, names: List[str]) -> Set[str]:
+    """Returns the given tables that exist but aren't archive partitions."""
+    cursor.execute(
+        "SELECT relname FROM pg_class WHERE relname = ANY(%s) "
+        "AND relkind IN ('r', 'p') AND pg_table_is_visible(oid) "
+        "AND NOT EXISTS (SELECT 1 FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "WHERE pg_inherits.inhrelid = pg_class.oid AND parent.relname = %s)",
+        [names, ARCHIVE_TABLE],
+    )
+    return {name for (name,) in cursor.fetchall()}
+
+
+def ensure_partitions(
+    cursor,
+    start: datetime.datetime,
+    end: datetime.datetime,
+    reattach: bool = False,
+):
+    """
+    Creates the missing monthly partitions from ``start`` to ``end``. A
+    partition detached by ``expire_partitions`` is attached again when
+    ``reattach`` is set, so rows archived late for its month aren't lost,
+    otherwise ``PartitionConflict`` is raised.
+    """
+    months = list(iter_months(start, end))
+    unattached = get_unattached_tables(
+        cursor, [get_partition_name(month) for month in months]
+    )
+    for month in months:
+        name = get_partition_name(month)
+        if name in unattached and not reattach:
+            raise PartitionConflict(
+                "Table %s exists but isn't a partition of %s" % (name, ARCHIVE_TABLE)
+            )
+        if name in unattached:
+            sql = "ALTER TABLE %s ATTACH PARTITION %s FOR VALUES FROM (%%s) TO (%%s)"
+            params = (ARCHIVE_TABLE, name)
+            logger.info("Re-attaching archive partition %s" % name)
+        else:
+            sql = (
+                "CREATE TABLE IF NOT EXISTS %s PARTITION OF %s "
+                "FOR VALUES FROM (%%s) TO (%%s)"
+            )
+            params = (name, ARCHIVE_TABLE)
+        cursor.execute(
+            sql % tuple(connection.ops.quote_name(param) for param in params),
+            [month, get_next_month(month)],
+        )
+
+
+def get_partitions(cursor) -> List[Tuple[str, datetime.datetime]]:
+    """Returns the attached partitions with the month they hold."""
+    cursor.execute(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "WHERE parent.relname = %s",
+        [ARCHIVE_TABLE],
+    )
+    partitions = []
+    for (name,) in cursor.fetchall():
+        match = PARTITION_NAME.match(name)
+        if match:
+            month = datetime.datetime(
+                int(match[1]), int(match[2]), 1, tzinfo=datetime.timezone.utc
+            )
+            partitions.append((name, month))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def _move_rows(cursor, model, created_column, where, params) -> List[int]:
+    """
+    Deletes the rows of ``model`` matching ``where`` and inserts them into
+    the archive in the same statement. Returns the ids of the moved rows.
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    cursor.execute(
+        "WITH moved AS (DELETE FROM %s WHERE %s RETURNING *) "
+        "INSERT INTO %s (table_name, id, created, data) "
+        "SELECT %%s, moved.id, moved.%s, to_jsonb(moved) FROM moved "
+        "RETURNING id"
+        % (
+            table,
+            where,
+            connection.ops.quote_name(ARCHIVE_TABLE),
+            connection.ops.quote_name(created_column),
+        ),
+        params + [model._meta.db_table],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _get_oldest(
+    cursor, model, created_column, cutoff, where, params
+) -> Optional[datetime.datetime]:
+    """
+    Returns the creation time of the oldest row before ``cutoff`` that
+    matches ``where``, the condition rows are archived on.
+    """
+    cursor.execute(
+        "SELECT min(%s) FROM %s WHERE %s < %%s AND %s"
+        % (
+            connection.ops.quote_name(created_column),
+            connection.ops.quote_name(model._meta.db_table),
+            connection.ops.quote_name(created_column),
+            where,
+        ),
+        [cutoff] + params,
+    )
+    return cursor.fetchone()[0]
+
+
+def _get_archivable_emails() -> str:
+    """
+    The condition emails are archived on, taking the queue statuses as
+    parameter: emails still in the queue or used as a campaign message stay
+    in place.
+    """
+    email_table = connection.ops.quote_name(Email._meta.db_table)
+    campaign_table = connection.ops.quote_name(Campaign._meta.db_table)
+    return (
+        "(status IS NULL OR status <> ALL(%%s)) AND NOT EXISTS "
+        "(SELECT 1 FROM %s WHERE %s.%s = %s.id)"
+        % (
+            campaign_table,
+            campaign_table,
+            connection.ops.quote_name(Campaign._meta.get_field("message").column),
+            email_table,
+        )
+    )
+
+
+def _get_archivable_sent_messages() -> str:
+    """The condition sent messages are archived on, once their email is gone."""
+    return "%s IS NULL" % connection.ops.quote_name(
+        SentMessages._meta.get_field("email").column
+    )
+
+
+def archive_emails(cutoff: datetime.datetime, batch_size: int) -> int:
+    """
+    Moves emails created before ``cutoff`` with their logs and sent messages
+    to the archive, one keyset batch per transaction. Emails still in the
+    queue or used as a campaign message stay in place.
+    """
+    email_table = connection.ops.quote_name(Email._meta.db_table)
+    through = Attachment.emails.through
+    email_column = {
+        model: model._meta.get_field("email").column
+        for model in (Log, SentMessages, through)
+    }
+    total_archived = 0
+    last_id = 0
+
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT id FROM %s WHERE created < %%s AND id > %%s "
+                "ORDER BY id LIMIT %%s" % email_table,
+                [cutoff, last_id, batch_size],
+            )
+            candidate_ids = [row[0] for row in cursor.fetchall()]
+            if not candidate_ids:
+                break
+            last_id = candidate_ids[-1]
+
+            # Re-checked in the DELETE so rows requeued meanwhile are kept
+            email_ids = _move_rows(
+                cursor,
+                Email,
+                "created",
+                "id = ANY(%s) AND " + _get_archivable_emails(),
+                [candidate_ids, QUEUE_STATUSES],
+            )
+            if not email_ids:
+                continue
+
+            _move_rows(
+                cursor,
+                Log,
+                "date",
+                "%s = ANY(%%s)" % connection.ops.quote_name(email_column[Log]),
+                [email_ids],
+            )
+            _move_rows(
+                cursor,
+                SentMessages,
+                "created_at",
+                "%s = ANY(%%s)" % connection.ops.quote_name(email_column[SentMessages]),
+                [email_ids],
+            )
+            # Attachments left without emails are collected separately
+            cursor.execute(
+                "DELETE FROM %s WHERE %s = ANY(%%s)"
+                % (
+                    connection.ops.quote_name(through._meta.db_table),
+                    connection.ops.quote_name(email_column[through]),
+                ),
+                [email_ids],
+            )
+        total_archived += len(email_ids)
+
+    return total_archived
+
+
+def archive_sent_messages(cutoff: datetime.datetime, batch_size: int) -> int:
+    """Moves sent messages of deleted emails created before ``cutoff``."""
+    total_archived = 0
+
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            archived_ids = _move_rows(
+                cursor,
+                SentMessages,
+                "created_at",
+                "id IN (SELECT id FROM %s WHERE %s AND created_at < %%s "
+                "ORDER BY id LIMIT %%s)"
+                % (
+                    connection.ops.quote_name(SentMessages._meta.db_table),
+                    _get_archivable_sent_messages(),
+                ),
+                [cutoff, batch_size],
+            )
+        if not archived_ids:
+            break
+        total_archived += len(archived_ids)
+
+    return total_archived
+
+
+def expire_partitions(before: datetime.datetime, detach: bool = False) -> List[str]:
+    """
+    Drops, or detaches into standalone tables, every partition holding only
+    rows created before ``before``. Returns the names of the partitions.
+    """
+    expired = []
+    with connection.cursor() as cursor:
+        for name, month in get_partitions(cursor):
+            if get_next_month(month) > before:
+                break
+            if detach:
+                cursor.execute(
+                    "ALTER TABLE %s DETACH PARTITION %s"
+                    % (
+                        connection.ops.quote_name(ARCHIVE_TABLE),
+                        connection.ops.quote_name(name),
+                    )
+                )
+            else:
+                cursor.execute("DROP TABLE %s" % connection.ops.quote_name(name))
+            expired.append(name)
+    return expired
+
+
+def archive_expired_mails(now: Optional[datetime.datetime] = None):
+    """
+    Moves old emails, logs and sent messages into the monthly partitions of
+    the archive table and expires the partitions past the retention period.
+    Return the number of archived emails and sent messages and the expired
+    partitions.
+    """
+    now = now or timezone.now()
+    cutoff = now - get_archive_after()
+    batch_size = get_archive_batch_size()
+
+    with connection.cursor() as cursor:
+        # Only rows that will be moved, so rows kept in place don't hold
+        # the partitions of their month open
+        oldest = [
+            _get_oldest(
+                cursor,
+                Email,
+                "created",
+                cutoff,
+                _get_archivable_emails(),
+                [QUEUE_STATUSES],
+            ),
+            _get_oldest(
+                cursor,
+                SentMessages,
+                "created_at",
+                cutoff,
+                _get_archivable_sent_messages(),
+                [],
+            ),
+        ]
+        oldest = [value for value in oldest if value is not None]
+        if oldest:
+            # Logs of archived emails are written up to now
+            ensure_partitions(cursor, min(oldest), now, reattach=get_archive_detach())
+
+    emails_count = archive_emails(cutoff, batch_size)
+    sent_messages_count = archive_sent_messages(cutoff, batch_size)
+    expired = expire_partitions(now - get_archive_retention(), get_archive_detach())
+
+    logger.info(
+        "Archived %s emails and %s sent messages, expired partitions: %s"
+        % (emails_count, sent_messages_count, ", ".join(expired) or "none")
+    )
+    return emails_count, sent_messages_count, expired
@@ -0,0 +1,155 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+
+from apps.backend_mailer.bulk import iter_chunks
+from apps.backend_mailer.logutils import setup_loghandlers
+from apps.backend_mailer.models import Attachment
+from apps.backend_mailer.settings import (
+    get_attachment_gc_batch_size,
+    get_attachment_gc_threads,
+)
+
+logger = setup_loghandlers("INFO")
+
+# Most keys a single S3 DeleteObjects request accepts
+S3_DELETE_BATCH_SIZE = 1000
+
+
+def get_orphans():
+    """Attachments not linked to any email, as an anti-join on the M2M table."""
+    through = Attachment.emails.through
+    return Attachment.objects.filter(
+        ~Exists(through.objects.filter(attachment_id=OuterRef("pk")))
+    )
+
+
+def iter_orphan_batches(batch_size: int) -> Iterator[List[Tuple[int, str]]]:
+    """Yields ``(id, file)`` of orphaned attachments walking the id keyset."""
+    last_id = 0
+    while True:
+        batch = list(
+            get_orphans()
+            .filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "file")[:batch_size]
+        )
+        if not batch:
+            return
+        last_id = batch[-1][0]
+        yield batch
+
+
+def delete_orphan_rows(attachment_ids: List[int]) -> Tuple[int, List[str]]:
+    """
+    Deletes the attachments that are still orphaned in one statement.
+    Returns their number and the names of their files no other attachment
+    refers to.
+    """
+    table = connection.ops.quote_name(Attachment._meta.db_table)
+    through = Attachment.emails.through
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM %s WHERE id = ANY(%%s) AND NOT EXISTS "
+            "(SELECT 1 FROM %s WHERE %s = %s.id) RETURNING file"
+            % (
+                table,
+                connection.ops.quote_name(through._meta.db_table),
+                connection.ops.quote_name(through._meta.get_field("attachment").column),
+                table,
+            ),
+            [attachment_ids],
+        )
+        rows = cursor.fetchall()
+        files = {name for name, in rows if name}
+        shared = Attachment.objects.filter(file__in=files).values_list(
+            "file", flat=True
+        )
+        return len(rows), sorted(files.difference(shared))
+
+
+def get_s3_bucket(storage):
+    """Returns the boto3 bucket of an S3 storage of django-storages."""
+    bucket = getattr(storage, "bucket", None)
+    if bucket is not None and hasattr(bucket, "delete_objects"):
+        return bucket
+    return None
+
+
+def delete_s3_objects(storage, bucket, names: List[str]) -> int:
+    normalize = getattr(storage, "_normalize_name", lambda name: name)
+    response = bucket.delete_objects(
+        Delete={
+            "Objects": [{"Key": normalize(name)} for name in names],
+            "Quiet": True,
+        }
+    )
+    for error in response.get("Errors", []):
+        logger.warning(
+            "Could not delete attachment file %s: %s"
+            % (error.get("Key"), error.get("Message"))
+        )
+    return len(names) - len(response.get("Errors", []))
+
+
+def delete_file(storage, name: str) -> int:
+    try:
+        storage.delete(name)
+    except Exception as e:
+        logger.warning("Could not delete attachment file %s: %s" % (name, e))
+        return 0
+    return 1
+
+
+def delete_files(names: List[str], storage=None, threads: Optional[int] = None):
+    """
+    Deletes files from storage in parallel, with batched DeleteObjects
+    requests when the storage is S3. Returns the number of deleted files.
+    """
+    storage = storage or default_storage
+    threads = threads or get_attachment_gc_threads()
+    bucket = get_s3_bucket(storage)
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        if bucket is not None:
+            deleted = executor.map(
+                lambda chunk: delete_s3_objects(storage, bucket, chunk),
+                iter_chunks(names, S3_DELETE_BATCH_SIZE),
+            )
+        else:
+            deleted = executor.map(lambda name: delete_file(storage, name), names)
+        return sum(deleted)
+
+
+def collect_orphan_attachments(
+    batch_size: Optional[int] = None, dry_run: bool = False, storage=None
+):
+    """
+    Deletes attachments no email refers to along with their files. A dry
+    run only counts them. Return the number of orphaned attachments and of
+    their files.
+    """
+    batch_size = batch_size or get_attachment_gc_batch_size()
+    attachments_count = 0
+    files_count = 0
+
+    for batch in iter_orphan_batches(batch_size):
+        if dry_run:
+            attachments_count += len(batch)
+            files_count += len({name for _, name in batch if name})
+            continue
+
+        deleted_count, names = delete_orphan_rows(
+            [attachment_id for attachment_id, _ in batch]
+        )
+        attachments_count += deleted_count
+        files_count += delete_files(names, storage)
+
+    logger.info(
+        "%s %s orphaned attachments with %s files"
+        % ("Found" if dry_run else "Deleted", attachments_count, files_count)
+    )
+    return attachments_count, files_count
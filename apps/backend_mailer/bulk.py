@@ -0,0 +1,140 @@
+import csv
+import datetime
+import io
+import json
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple
+
+from django.db import connection, transaction
+
+from apps.backend_mailer.logutils import setup_loghandlers
+from apps.backend_mailer.models import Email
+from apps.backend_mailer.validators import is_valid_email
+
+logger = setup_loghandlers("INFO")
+
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+COPY_NULL = "\\N"
+
+
+def iter_chunks(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def read_recipients_csv(file, email_column="email") -> Iterator[Tuple[str, dict]]:
+    """
+    Returns an iterator of ``(address, context)`` for every row of a CSV
+    file with a header row, the other columns of a row make up its context.
+    Headers and values are stripped. The header row is read right away, a
+    ValueError names the email column when it is missing.
+    """
+    reader = csv.DictReader(file)
+    fieldnames = [name.strip() for name in reader.fieldnames or []]
+    if email_column not in fieldnames:
+        raise ValueError("The CSV header has no %r column" % email_column)
+    reader.fieldnames = fieldnames
+    return _iter_csv_rows(reader, email_column)
+
+
+def _iter_csv_rows(reader, email_column) -> Iterator[Tuple[str, dict]]:
+    for row in reader:
+        # Short rows have None values, long rows their extra values under None
+        row = {
+            name: (value or "").strip()
+            for name, value in row.items()
+            if name is not None
+        }
+        address = row.pop(email_column)
+        yield address, row
+
+
+def split_valid_recipients(rows: List[Tuple[str, dict]]):
+    """
+    Returns the rows with a valid address and the rejected addresses.
+    """
+    valid, rejected = [], []
+    for address, context in rows:
+        if is_valid_email(address):
+            valid.append((address, context))
+        else:
+            rejected.append(address)
+    return valid, rejected
+
+
+def format_array(values) -> str:
+    return "{%s}" % ",".join(
+        '"%s"' % str(value).replace("\\", "\\\\").replace('"', '\\"')
+        for value in values
+    )
+
+
+def format_copy_value(value) -> str:
+    """Formats a DB value for the text format of ``COPY``."""
+    if value is None:
+        return COPY_NULL
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (list, tuple)):
+        value = format_array(value)
+    elif isinstance(value, dict):
+        value = json.dumps(value)
+    elif hasattr(value, "adapted"):
+        # psycopg2 Json adapters of JSONField values
+        value = value.dumps(value.adapted)
+    elif isinstance(value, (datetime.datetime, datetime.date)):
+        value = value.isoformat()
+    else:
+        value = str(value)
+    return value.translate(COPY_ESCAPES)
+
+
+def allocate_ids(count: int) -> List[int]:
+    """Reserves ``count`` ids from the Email primary key sequence."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, %s)) "
+            "FROM generate_series(1, %s)",
+            [Email._meta.db_table, Email._meta.pk.column, count],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def copy_emails(emails: List[Email]) -> None:
+    """
+    Writes unsaved emails, with their ids already set, using
+    ``COPY FROM STDIN``. Only the given rows are held in memory.
+    """
+    fields = Email._meta.concrete_fields
+    buffer = io.StringIO()
+    for email in emails:
+        buffer.write(
+            "\t".join(
+                format_copy_value(
+                    field.get_db_prep_save(field.pre_save(email, True), connection)
+                )
+                for field in fields
+            )
+        )
+        buffer.write("\n")
+    buffer.seek(0)
+
+    columns = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            "COPY %s (%s) FROM STDIN"
+            % (connection.ops.quote_name(Email._meta.db_table), columns),
+            buffer,
+        )
+
+
+def enqueue_chunk(emails: List[Email]) -> None:
+    with transaction.atomic():
+        for email, email_id in zip(emails, allocate_ids(len(emails))):
+            email.id = email_id
+        copy_emails(emails)
+    logger.info("Enqueued %s emails" % len(emails))
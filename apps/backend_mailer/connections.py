@@ -1,10 +1,25 @@
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from smtplib import SMTPServerDisconnected
 from threading import local
 from typing import Dict
 
 from django.core.mail import get_connection
 from django.core.mail.backends.base import BaseEmailBackend
 
-from apps.backend_mailer.settings import get_backend
+from apps.backend_mailer.constants import BackendConstants
+from apps.backend_mailer.logic.email_backend import backend_config_cache
+from apps.backend_mailer.logutils import setup_loghandlers
+from apps.backend_mailer.settings import (
+    get_backend,
+    get_connection_idle_timeout,
+    get_connection_max_messages,
+    get_connection_pool_size,
+)
+
+logger = setup_loghandlers("INFO")
 
 
 # Copied from Django 1.8's django.core.cache.CacheHandler
@@ -61,4 +76,158 @@ def dynamic_backend(backend_type: str, data: Dict) -> BaseEmailBackend:
     return connection
 
 
+def get_backend_connection(email_backend) -> BaseEmailBackend:
+    """
+    Returns an unopened connection for the given ``EmailBackend`` instance.
+    Falls back to Django's default backend when no instance is given.
+    """
+    if email_backend is None:
+        return get_connection()
+
+    backend_class = BackendConstants.EMAIL_BACKENDS_CHOICES_DICT.get(
+        email_backend.backend_type
+    )
+    data = backend_config_cache.get_backend_fields(email_backend)
+    return get_connection(backend=backend_class, **data)
+
+
+class PooledConnection:
+    __slots__ = ("key", "connection", "messages_sent", "last_used", "suspect")
+
+    def __init__(self, key, connection):
+        self.key = key
+        self.connection = connection
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+        self.suspect = False
+
+
+class BackendConnectionPool:
+    """
+    Keeps open, authenticated connections per ``EmailBackend.id``.
+
+    A connection is used by one thread at a time and goes back to the pool
+    after each message, so emails sharing a backend reuse the same session
+    instead of paying a handshake per message. Connections are recycled
+    after ``max_messages`` and checked with a NOOP when they were idle for
+    longer than ``idle_timeout`` seconds or the last send through them failed.
+    """
+
+    def __init__(self, max_connections=None, max_messages=None, idle_timeout=None):
+        self.max_connections = max_connections or get_connection_pool_size()
+        self.max_messages = max_messages or get_connection_max_messages()
+        self.idle_timeout = (
+            get_connection_idle_timeout() if idle_timeout is None else idle_timeout
+        )
+        self._condition = threading.Condition()
+        self._idle = defaultdict(deque)
+        self._open = defaultdict(int)
+
+    @staticmethod
+    def get_key(email_backend):
+        return email_backend.id if email_backend is not None else None
+
+    @contextmanager
+    def connection(self, email_backend):
+        pooled = self.acquire(email_backend)
+        try:
+            yield pooled.connection
+        except (SMTPServerDisconnected, OSError):
+            self._discard(pooled)
+            raise
+        except Exception:
+            # The session is most likely fine (e.g. a refused recipient),
+            # but check it before it's handed out again
+            pooled.suspect = True
+            self.release(pooled)
+            raise
+        else:
+            self.release(pooled)
+
+    def acquire(self, email_backend) -> PooledConnection:
+        key = self.get_key(email_backend)
+        while True:
+            with self._condition:
+                while not self._idle[key] and self._open[key] >= self.max_connections:
+                    self._condition.wait()
+                if self._idle[key]:
+                    pooled = self._idle[key].pop()
+                else:
+                    pooled = None
+                    self._open[key] += 1
+
+            if pooled is None:
+                return self._open_connection(key, email_backend)
+
+            if self._is_healthy(pooled):
+                return pooled
+
+            self._discard(pooled)
+
+    def release(self, pooled: PooledConnection) -> None:
+        pooled.messages_sent += 1
+        pooled.last_used = time.monotonic()
+
+        if pooled.messages_sent >= self.max_messages:
+            self._discard(pooled)
+            return
+
+        with self._condition:
+            self._idle[pooled.key].append(pooled)
+            self._condition.notify()
+
+    def close(self) -> None:
+        """Closes every idle connection, to be called at the end of a batch."""
+        with self._condition:
+            pooled_connections = [
+                pooled for idle in self._idle.values() for pooled in idle
+            ]
+            for idle in self._idle.values():
+                idle.clear()
+
+        for pooled in pooled_connections:
+            self._discard(pooled)
+
+    def _open_connection(self, key, email_backend) -> PooledConnection:
+        try:
+            connection = get_backend_connection(email_backend)
+            connection.open()
+        except Exception:
+            with self._condition:
+                self._open[key] -= 1
+                self._condition.notify()
+            raise
+
+        logger.debug("Opened pooled connection for email backend %s" % key)
+        return PooledConnection(key, connection)
+
+    def _is_healthy(self, pooled: PooledConnection) -> bool:
+        idle_for = time.monotonic() - pooled.last_used
+        if not pooled.suspect and idle_for < self.idle_timeout:
+            return True
+
+        # Only SMTP backends keep a session we can probe, others are stateless
+        smtp = getattr(pooled.connection, "connection", None)
+        if smtp is None or not hasattr(smtp, "noop"):
+            return True
+
+        try:
+            healthy = smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+        pooled.suspect = not healthy
+        return healthy
+
+    def _discard(self, pooled: PooledConnection) -> None:
+        try:
+            pooled.connection.close()
+        except Exception:
+            logger.debug("Failed to close pooled connection for %s" % pooled.key)
+
+        with self._condition:
+            self._open[pooled.key] -= 1
+            self._condition.notify()
+
+
 connections = ConnectionHandler()
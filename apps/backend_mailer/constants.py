@@ -16,7 +16,9 @@ class BackendConstants:
     """<- EMAIL PRIORITY"""
 
     """ EMAIL STATUS -> """
-    STATUS = namedtuple("STATUS", "sent failed queued requeued created")._make(range(5))
+    STATUS = namedtuple("STATUS", "sent failed queued requeued created sending")._make(
+        range(6)
+    )
 
     STATUS_CHOICES = [
         (STATUS.created, _("created")),
@@ -24,6 +26,7 @@ class BackendConstants:
         (STATUS.failed, _("failed")),
         (STATUS.queued, _("queued")),
         (STATUS.requeued, _("requeued")),
+        (STATUS.sending, _("sending")),
     ]
     """<- EMAIL STATUS"""
     """ MESSAGE TYPE ->"""
@@ -106,6 +109,29 @@ class BackendConstants:
 
     """<- EMAIL BACKENDS"""
 
+    """ RETRY ERROR CLASS ->"""
+    ERROR_CLASS = namedtuple("ERROR_CLASS", "permanent transient throttled")._make(
+        ("permanent", "transient", "throttled")
+    )
+    """<- RETRY ERROR CLASS"""
+
+    """ SUPPRESSION REASON ->"""
+    SUPPRESSION_REASON = namedtuple(
+        "SUPPRESSION_REASON", "hard_bounce complaint unsubscribe manual"
+    )._make(range(4))
+    SUPPRESSION_REASON_CHOICES = [
+        (SUPPRESSION_REASON.hard_bounce, _("hard bounce")),
+        (SUPPRESSION_REASON.complaint, _("complaint")),
+        (SUPPRESSION_REASON.unsubscribe, _("unsubscribe")),
+        (SUPPRESSION_REASON.manual, _("manual")),
+    ]
+    """<- SUPPRESSION REASON"""
+
+    """ DELIVERY ENGINE ->"""
+    ENGINE_DEFAULT = "default"
+    ENGINE_THREADED = "threaded"
+    """<- DELIVERY ENGINE"""
+
     """ TEMPLATE TYPE ->"""
     PROMOTIONAL = "Promotional"
     TRANSACTIONAL = "Transactional"
@@ -3,6 +3,7 @@ from typing import List
 
 from apps.sentry.sentry_constants import SentryConstants
 from apps.sentry.sentry_scripts import SendToSentry
+from apps.backend_mailer.constants import BackendConstants
 from apps.backend_mailer.models import Email
 
 logger = logging.getLogger(__name__)
@@ -74,6 +75,28 @@ class CRUDEmail:
             logger.error(f"Failed to update emails: {ex}")
             return None
 
+    @staticmethod
+    def release_claim(object_id: List[int]) -> int | None:
+        """Puts claimed emails that weren't sent back into the queue."""
+        try:
+            is_ok = Email.objects.filter(
+                id__in=object_id, status=BackendConstants.STATUS.sending
+            ).update(status=BackendConstants.STATUS.queued, claimed_until=None)
+            logger.info(f"Released claim on {is_ok} emails.")
+            return is_ok
+        except Exception as ex:
+            SendToSentry.send_scope_msg(
+                scope_data={
+                    "message": f"CRUDEmail.release_claim(): Email.update Ex",
+                    "level": SentryConstants.SENTRY_MSG_ERROR,
+                    "tag": SentryConstants.SENTRY_TAG_DB_MODEL,
+                    "detail": f"Object id {object_id = }",
+                    "extra_detail": f"{ex = }",
+                }
+            )
+            logger.error(f"Failed to release claimed emails: {ex}")
+            return None
+
     @staticmethod
     def bulk_email_create(
         create_objects: List[Email], batch_size: int = 1000
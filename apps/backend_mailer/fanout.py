@@ -0,0 +1,209 @@
+import copy
+import smtplib
+from typing import Dict, List, Optional
+
+from django.core.mail.backends.smtp import EmailBackend as SMTPEmailBackend
+from django.core.mail.message import sanitize_address
+
+from apps.backend_mailer.serialized import CRLF, SerializedMessage, get_message_id
+
+
+class FanoutInterrupted(smtplib.SMTPServerDisconnected):
+    """
+    The session broke in the middle of a fan-out. ``outcomes`` holds the
+    recipients that were answered before, so accepted copies aren't sent
+    again. Recipients whose copy wasn't acknowledged are left out.
+    """
+
+    def __init__(self, outcomes: Dict[str, Optional[Exception]], error: Exception):
+        self.outcomes = outcomes
+        super().__init__(str(error))
+
+
+class FanoutMessage:
+    """
+    A message serialized once and sent to each recipient as its own copy,
+    with only that recipient in its To header. Recipients in ``skip`` get
+    no copy.
+    """
+
+    def __init__(self, message, serialized: SerializedMessage = None, skip=()):
+        self.serialized = serialized or SerializedMessage(message)
+        self.from_email = self.serialized.from_email
+        self.message_id = get_message_id(message)
+        self.to = list(message.to)
+        self.recipients = [
+            recipient
+            for recipient in self.to + list(message.bcc)
+            if recipient not in skip
+        ]
+        self.addresses = {
+            recipient: sanitize_address(recipient, message.encoding)
+            for recipient in self.recipients
+        }
+
+    def get_to(self, recipient: str) -> List[str]:
+        # Bcc recipients get a copy without a To header
+        return [recipient] if recipient in self.to else []
+
+    def as_bytes(self, recipient: str) -> bytes:
+        return self.serialized.as_bytes(self.get_to(recipient), self.message_id)
+
+    def as_data(self, recipient: str) -> bytes:
+        return self.serialized.as_data(self.get_to(recipient), self.message_id)
+
+
+def send_fanout(
+    connection, message, message_cache=None, skip=()
+) -> Dict[str, Optional[Exception]]:
+    """
+    Sends an individually addressed copy of a django ``EmailMessage`` to
+    each of its To and Bcc recipients through ``connection``, except those
+    in ``skip`` that already accepted one. With a ``MessageCache`` the
+    copies share bytes with identical messages.
+
+    Returns a dict of recipient to the exception it was refused with, or
+    None when it was accepted. A disconnect raises ``FanoutInterrupted``
+    with the outcomes collected until then.
+    """
+    if isinstance(connection, SMTPEmailBackend):
+        connection.open()
+        serialized = message_cache.get(message) if message_cache else None
+        fanout_message = FanoutMessage(message, serialized, skip)
+        smtp = connection.connection
+        # Extensions are only known once the server answered EHLO
+        smtp.ehlo_or_helo_if_needed()
+        if smtp.has_extn("pipelining"):
+            return send_pipelined(smtp, fanout_message)
+        return send_sequential(smtp, fanout_message)
+
+    return send_copies(connection, message, skip)
+
+
+def send_pipelined(smtp, message: FanoutMessage) -> Dict[str, Optional[Exception]]:
+    """
+    Sends one transaction per recipient with ESMTP PIPELINING (RFC 2920).
+
+    Each write carries the message data of the previous recipient followed
+    by MAIL, RCPT and DATA for the next one, so every copy costs a single
+    round trip on the shared session.
+    """
+    outcomes = {}
+    try:
+        _send_pipelined(smtp, message, outcomes)
+    except smtplib.SMTPServerDisconnected as e:
+        raise FanoutInterrupted(outcomes, e) from e
+    return outcomes
+
+
+def _send_pipelined(smtp, message: FanoutMessage, outcomes) -> None:
+    pending = None
+    needs_reset = False
+
+    # None flushes the data of the last recipient
+    for recipient in message.recipients + [None]:
+        group = []
+        if pending is not None:
+            group.append(message.as_data(pending))
+        reset = recipient is not None and needs_reset
+        if reset:
+            group.append(b"RSET" + CRLF)
+        if recipient is not None:
+            group.append(
+                (
+                    "MAIL FROM:%s\r\nRCPT TO:%s\r\nDATA\r\n"
+                    % (
+                        smtplib.quoteaddr(message.from_email),
+                        smtplib.quoteaddr(message.addresses[recipient]),
+                    )
+                ).encode("ascii")
+            )
+        if not group:
+            break
+
+        smtp.send(b"".join(group))
+
+        if pending is not None:
+            code, response = smtp.getreply()
+            outcomes[pending] = (
+                None if code == 250 else smtplib.SMTPDataError(code, response)
+            )
+            pending = None
+
+        if recipient is None:
+            break
+
+        if reset:
+            smtp.getreply()
+            needs_reset = False
+
+        mail_reply = smtp.getreply()
+        rcpt_reply = smtp.getreply()
+        data_reply = smtp.getreply()
+
+        accepted = mail_reply[0] == 250 and rcpt_reply[0] in (250, 251)
+        if accepted and data_reply[0] == 354:
+            pending = recipient
+            continue
+
+        if data_reply[0] == 354:
+            # The server took DATA without a valid recipient, end it empty
+            smtp.send(b"." + CRLF)
+            smtp.getreply()
+
+        if mail_reply[0] != 250:
+            error = smtplib.SMTPSenderRefused(*mail_reply, message.from_email)
+        elif not accepted:
+            error = smtplib.SMTPRecipientsRefused({recipient: rcpt_reply})
+        else:
+            error = smtplib.SMTPDataError(*data_reply)
+        outcomes[recipient] = error
+        needs_reset = True
+
+    if needs_reset:
+        smtp.rset()
+
+
+def send_sequential(smtp, message: FanoutMessage) -> Dict[str, Optional[Exception]]:
+    """Sends one transaction per recipient for servers without PIPELINING."""
+    outcomes = {}
+    for recipient in message.recipients:
+        try:
+            smtp.sendmail(
+                message.from_email,
+                [message.addresses[recipient]],
+                message.as_bytes(recipient),
+            )
+            outcomes[recipient] = None
+        except smtplib.SMTPServerDisconnected as e:
+            raise FanoutInterrupted(outcomes, e) from e
+        except smtplib.SMTPException as e:
+            outcomes[recipient] = e
+    return outcomes
+
+
+def send_copies(connection, message, skip=()) -> Dict[str, Optional[Exception]]:
+    """
+    Sends a copy per recipient through any other backend, each copy is
+    serialized by the backend itself.
+    """
+    outcomes = {}
+    for recipient in message.to + message.bcc:
+        if recipient in skip:
+            continue
+        recipient_message = copy.copy(message)
+        recipient_message.to = [recipient] if recipient in message.to else []
+        recipient_message.cc = []
+        recipient_message.bcc = [] if recipient in message.to else [recipient]
+        try:
+            connection.send_messages([recipient_message])
+            outcomes[recipient] = None
+        except Exception as e:
+            outcomes[recipient] = e
+    return outcomes
+
+
+def get_refused(outcomes: Dict[str, Optional[Exception]]) -> Dict[str, Exception]:
+    return {
+        recipient: error for recipient, error in outcomes.items() if error is not None
+    }
@@ -0,0 +1,85 @@
+import time
+from collections import namedtuple
+from typing import Dict, List, Optional
+
+from django.utils import timezone
+
+from apps.backend_mailer.constants import BackendConstants
+from apps.backend_mailer.lockfile import default_lockfile
+from apps.backend_mailer.logutils import setup_loghandlers
+from apps.backend_mailer.mail import _get_queued_query, send_queued_mail_until_done
+from apps.backend_mailer.models import Email
+from apps.backend_mailer.settings import (
+    get_lane_max_wait,
+    get_lane_processes,
+    get_lane_time_slice,
+)
+from celery_scripts.constants import CeleryConstants
+
+logger = setup_loghandlers("INFO")
+
+PRIORITY = BackendConstants.PRIORITY
+STATUS = BackendConstants.STATUS
+
+Lane = namedtuple("Lane", "name priorities queue")
+
+# "now" emails are sent inline by send(), the ones that failed and were
+# requeued drain with high. Emails without a priority come last in the
+# queue, so they drain as low.
+LANES = (
+    Lane("high", (PRIORITY.now, PRIORITY.high), CeleryConstants.MAIL_HIGH_QUEUE),
+    Lane("medium", (PRIORITY.medium,), CeleryConstants.MAIL_MEDIUM_QUEUE),
+    Lane("low", (PRIORITY.low, None), CeleryConstants.MAIL_LOW_QUEUE),
+)
+LANES_BY_NAME = {lane.name: lane for lane in LANES}
+
+
+def get_lane(priority) -> Lane:
+    for lane in LANES:
+        if priority in lane.priorities:
+            return lane
+    return LANES_BY_NAME["low"]
+
+
+def group_by_lane(emails) -> Dict[Lane, List]:
+    lanes = {}
+    for email in emails or []:
+        lanes.setdefault(get_lane(email.priority), []).append(email)
+    return lanes
+
+
+def drain_lane(lane: Lane, deadline: Optional[float] = None) -> bool:
+    """
+    Sends the eligible emails of one lane until its time slice is used up.
+    Every lane has its own lock file, so a long drain of bulk mail never
+    keeps another lane from sending. Returns False when emails were left
+    for the next drain.
+    """
+    if deadline is None:
+        deadline = time.monotonic() + get_lane_time_slice()
+    return send_queued_mail_until_done(
+        lockfile="%s_%s" % (default_lockfile, lane.name),
+        processes=get_lane_processes().get(lane.name, 1),
+        priorities=lane.priorities,
+        deadline=deadline,
+    )
+
+
+def promote_starved(now=None) -> int:
+    """
+    Moves low priority emails that waited longer than ``LANE_MAX_WAIT`` to
+    the medium lane. Emails are never promoted into the transactional lane.
+    Emails claimed by a low lane drain are left alone, even with an expired
+    lease, so they are never sent by both lanes. Returns the number of
+    promoted emails.
+    """
+    now = now or timezone.now()
+    low = LANES_BY_NAME["low"]
+    promoted = Email.objects.filter(
+        _get_queued_query(now, low.priorities),
+        status__in=[STATUS.queued, STATUS.requeued],
+        created__lt=now - get_lane_max_wait(),
+    ).update(priority=PRIORITY.medium)
+    if promoted:
+        logger.info("Promoted %s waiting low priority emails to medium" % promoted)
+    return promoted
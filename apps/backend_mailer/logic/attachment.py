@@ -0,0 +1,117 @@
+import base64
+import mimetypes
+import mmap
+import os
+from email import message_from_bytes
+from email.mime.base import MIMEBase
+from email.mime.message import MIMEMessage
+from email.mime.nonmultipart import MIMENonMultipart
+
+from django.core.mail.message import DEFAULT_ATTACHMENT_MIME_TYPE
+
+from apps.backend_mailer.settings import get_attachment_cache_size
+
+
+def get_local_path(attachment):
+    """Returns the path of the attachment file on local disk, if it has one."""
+    try:
+        return attachment.file.path
+    except (AttributeError, NotImplementedError, ValueError):
+        return None
+
+
+def read_attachment(attachment) -> bytes:
+    try:
+        attachment.file.open("rb")
+        return attachment.file.read()
+    finally:
+        attachment.file.close()
+
+
+def encode_attachment(attachment) -> str:
+    """
+    Returns the attachment file base64 encoded. Files on local disk are
+    memory-mapped and encoded straight from the page cache.
+    """
+    path = get_local_path(attachment)
+    if path is None:
+        return base64.encodebytes(read_attachment(attachment)).decode("ascii")
+
+    with open(path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return base64.encodebytes(data).decode("ascii")
+
+
+def build_mime_part(attachment) -> MIMEBase:
+    """
+    Returns the MIME part of an ``Attachment``, with its payload already
+    encoded so the part can be attached to any number of messages as is.
+    """
+    if attachment.headers:
+        mime_part = MIMENonMultipart(*attachment.mimetype.split("/"))
+        mime_part.set_payload(read_attachment(attachment))
+        for key, val in attachment.headers.items():
+            try:
+                mime_part.replace_header(key, val)
+            except KeyError:
+                mime_part.add_header(key, val)
+        return mime_part
+
+    mimetype = (
+        attachment.mimetype
+        or mimetypes.guess_type(attachment.name)[0]
+        or DEFAULT_ATTACHMENT_MIME_TYPE
+    )
+    basetype, subtype = mimetype.split("/", 1)
+
+    if mimetype == "message/rfc822":
+        # Messages can't be base64 encoded, see RFC 2046 5.2.1
+        mime_part = MIMEMessage(message_from_bytes(read_attachment(attachment)))
+    else:
+        mime_part = MIMEBase(basetype, subtype)
+        mime_part.set_payload(encode_attachment(attachment))
+        mime_part["Content-Transfer-Encoding"] = "base64"
+
+    filename = attachment.name
+    try:
+        filename.encode("ascii")
+    except UnicodeEncodeError:
+        filename = ("utf-8", "", filename)
+    mime_part.add_header("Content-Disposition", "attachment", filename=filename)
+    return mime_part
+
+
+class AttachmentCache:
+    """
+    MIME parts of the attachments of one batch, keyed by ``Attachment.id``.
+
+    An attachment shared by many emails of the batch is read from storage
+    and encoded once, every message then references the same part. Parts
+    are kept up to ``ATTACHMENT_CACHE_SIZE`` encoded bytes, larger ones are
+    built per message.
+    """
+
+    def __init__(self, max_size: int = None):
+        self.max_size = get_attachment_cache_size() if max_size is None else max_size
+        self.size = 0
+        self._parts = {}
+
+    def get(self, attachment) -> MIMEBase:
+        mime_part = self._parts.get(attachment.id)
+        if mime_part is not None:
+            return mime_part
+
+        mime_part = build_mime_part(attachment)
+        if attachment.id is not None:
+            payload = mime_part.get_payload()
+            if isinstance(payload, (str, bytes)):
+                size = len(payload)
+            else:
+                size = len(mime_part.as_bytes())
+            if self.size + size <= self.max_size:
+                self._parts[attachment.id] = mime_part
+                self.size += size
+
+        return mime_part
@@ -1,6 +1,15 @@
 import logging
+import threading
+import time
+from collections import OrderedDict
 from typing import Dict
+
 from apps.backend_mailer.constants import BackendConstants
+from apps.backend_mailer.fields import decrypt_config
+from apps.backend_mailer.settings import (
+    get_backend_config_cache_size,
+    get_backend_config_cache_ttl,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -16,3 +25,74 @@ class EmailBackendManager:
             return {field: config.get(field) for field in required_fields}
 
         return {}
+
+
+class BackendConfigCache:
+    """
+    In-process LRU of decrypted backend connection kwargs.
+
+    Entries are keyed by ``(EmailBackend.id, updated_at)``, so a saved backend
+    is never served stale, and expire after ``ttl`` seconds so plaintext
+    credentials don't stay in memory longer than configured.
+    """
+
+    def __init__(self, max_size: int = None, ttl: int = None):
+        self.max_size = max_size or get_backend_config_cache_size()
+        self.ttl = get_backend_config_cache_ttl() if ttl is None else ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_key(email_backend) -> tuple:
+        return email_backend.id, getattr(email_backend, "updated_at", None)
+
+    def get_backend_fields(self, email_backend) -> Dict:
+        """
+        Returns ``EmailBackendManager.get_backend_fields()`` for the given
+        backend, decrypting its config only on a cache miss.
+        """
+        key = self.get_key(email_backend)
+        now = time.monotonic()
+
+        with self._lock:
+            self._purge_expired(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        config = decrypt_config(value=email_backend.config)
+        fields = EmailBackendManager.get_backend_fields(
+            backend_type=email_backend.backend_type, config=config
+        )
+
+        if self.ttl > 0:
+            with self._lock:
+                self._purge_expired(now)
+                self._entries[key] = (now + self.ttl, fields)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+
+        return fields
+
+    def _purge_expired(self, now: float) -> None:
+        # Expired credentials of backends that are no longer read are
+        # dropped too, the cache is small enough to scan on every call
+        expired = [
+            key for key, (expires_at, _) in self._entries.items() if expires_at <= now
+        ]
+        for key in expired:
+            del self._entries[key]
+
+    def invalidate(self, backend_id: int) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == backend_id]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+backend_config_cache = BackendConfigCache()
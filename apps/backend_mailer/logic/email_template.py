@@ -0,0 +1,133 @@
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from typing import Dict, Iterable, List
+
+from django.template import Context, Template
+
+from apps.backend_mailer.settings import get_template_cache_size, get_template_engine
+
+logger = logging.getLogger(__name__)
+
+CompiledEmailTemplate = namedtuple(
+    "CompiledEmailTemplate", "subject content html_content"
+)
+RenderedEmail = namedtuple("RenderedEmail", "subject message html_message")
+
+
+class CompiledTemplateCache:
+    """
+    In-process LRU of compiled ``EmailTemplate`` instances.
+
+    Entries are keyed by ``(EmailTemplate.id, last_updated)`` so an edited
+    template is recompiled on its next use. Templates are compiled with the
+    configured ``TEMPLATE_ENGINE``, the same way ``Email.prepare_email_message``
+    renders them. Plain strings are cached apart, keyed by their source.
+
+    The size is read from ``TEMPLATE_CACHE_SIZE`` on use unless given, so the
+    module level cache follows settings overridden after import.
+    """
+
+    def __init__(self, max_size: int = None):
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._sources = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size or get_template_cache_size()
+
+    def _store(self, entries: OrderedDict, key, value) -> None:
+        with self._lock:
+            entries[key] = value
+            while len(entries) > self.max_size:
+                entries.popitem(last=False)
+
+    @staticmethod
+    def get_key(template) -> tuple:
+        return template.id, template.last_updated
+
+    @staticmethod
+    def compile(template) -> CompiledEmailTemplate:
+        engine = get_template_engine()
+        return CompiledEmailTemplate(
+            subject=engine.from_string(template.subject),
+            content=engine.from_string(template.content),
+            html_content=engine.from_string(template.html_content),
+        )
+
+    def get(self, template) -> CompiledEmailTemplate:
+        # Unsaved templates can change without their key changing
+        if template.id is None:
+            return self.compile(template)
+
+        key = self.get_key(template)
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                return compiled
+
+        compiled = self.compile(template)
+        self._store(self._entries, key, compiled)
+        return compiled
+
+    def get_string(self, source: str) -> Template:
+        """
+        Returns a compiled django ``Template`` for the given source, compiling
+        identical sources only once per process.
+        """
+        with self._lock:
+            compiled = self._sources.get(source)
+            if compiled is not None:
+                self._sources.move_to_end(source)
+                return compiled
+
+        compiled = Template(source)
+        self._store(self._sources, source, compiled)
+        return compiled
+
+    def render_string(self, source: str, context: Context) -> str:
+        return self.get_string(source).render(context)
+
+    def render(self, template, context: Dict) -> RenderedEmail:
+        compiled = self.get(template)
+        return RenderedEmail(
+            subject=compiled.subject.render(context),
+            message=compiled.content.render(context),
+            html_message=compiled.html_content.render(context),
+        )
+
+    def render_many(self, template, contexts: Iterable[Dict]) -> List[RenderedEmail]:
+        """
+        Renders one template against many contexts, compiling it only once.
+        Returns the rendered (subject, message, html_message) triples in the
+        order of ``contexts``.
+        """
+        compiled = self.get(template)
+        return [
+            RenderedEmail(
+                subject=compiled.subject.render(context),
+                message=compiled.content.render(context),
+                html_message=compiled.html_content.render(context),
+            )
+            for context in contexts
+        ]
+
+    def invalidate(self, template_id: int) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == template_id]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._sources.clear()
+
+
+template_cache = CompiledTemplateCache()
+
+
+def render_template_string(source: str, context: Context) -> str:
+    return template_cache.render_string(source, context)
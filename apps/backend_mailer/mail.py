@@ -1,30 +1,64 @@
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import connection as db_connection
-from django.db.models import Q
-from django.template import Context, Template
+from django.db import connection as db_connection, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Coalesce
+from django.template import Context
 from django.utils import timezone
 from email.utils import make_msgid
 from multiprocessing import Pool
 from multiprocessing.dummy import Pool as ThreadPool
 
+from apps.backend_mailer.adaptive import get_adaptive_controller
+from apps.backend_mailer.bulk import enqueue_chunk, iter_chunks, split_valid_recipients
+from apps.backend_mailer.connections import BackendConnectionPool
+from apps.backend_mailer.fanout import FanoutInterrupted, get_refused
 from apps.backend_mailer.crud.crud_email import CRUDEmail
 from apps.backend_mailer.crud.crud_sent_messages import CRUDSentMessages
+from apps.backend_mailer.logic.attachment import AttachmentCache
+from apps.backend_mailer.logic.email_template import (
+    render_template_string,
+    template_cache,
+)
 from apps.backend_mailer.lockfile import default_lockfile, FileLock, FileLocked
 from apps.backend_mailer.logutils import setup_loghandlers
 from apps.backend_mailer.models import Email, EmailTemplate, Log, SentMessages
+from apps.backend_mailer.retry import RetryPolicy
+from apps.backend_mailer.serialized import MessageCache, is_personalized
 from apps.backend_mailer.settings import (
+    get_adaptive_enabled,
     get_batch_delivery_timeout,
     get_batch_size,
+    get_claim_enabled,
+    get_claim_lease,
+    get_engine,
+    get_enqueue_chunk_size,
+    get_fanout_enabled,
+    get_message_cache_enabled,
     get_log_level,
-    get_max_retries,
     get_message_id_enabled,
     get_message_id_fqdn,
-    get_retry_timedelta,
     get_sending_order,
+    get_streaming_drain,
     get_threads_per_process,
+    get_threaded_backend_concurrency,
+    get_threaded_max_concurrency,
 )
 from apps.backend_mailer.signals import email_queued
+from apps.backend_mailer.suppression import (
+    RecipientSuppressed,
+    get_suppressed,
+    normalize_address,
+    record_hard_bounces,
+)
+from apps.backend_mailer.throttling import DispatchScheduler, get_rate_limiter
 from apps.backend_mailer.utils import (
     create_attachments,
     get_email_template,
@@ -33,13 +67,16 @@ from apps.backend_mailer.utils import (
     split_emails,
 )
 from apps.backend_mailer.constants import BackendConstants
-from apps.mailers.constants import CampaignConstants
-from apps.mailers.crud.crud_campaign import CRUDCampaign
+from apps.mailers.stats import record_campaign_outcomes
 from apps.notify.constants import NotifyConstants
 from apps.notify.logic.general_user_notify import GeneralUserNotify
 
 logger = setup_loghandlers("INFO")
 
+# Order of the keyset walk in ``iter_queued_batches``, matches the
+# ``email_queue_order_idx`` index
+QUEUE_ORDER = (F("priority").desc(nulls_last=True), "id")
+
 
 def create(
     sender,
@@ -109,9 +146,9 @@ def create(
             html_message = template.html_content
 
         _context = Context(context or {})
-        subject = Template(subject).render(_context)
-        message = Template(message).render(_context)
-        html_message = Template(html_message).render(_context)
+        subject = render_template_string(subject, _context)
+        message = render_template_string(message, _context)
+        html_message = render_template_string(html_message, _context)
 
         email = Email(
             from_email=sender,
@@ -255,36 +292,325 @@ def send_many(kwargs_list, **kwargs):
     return emails
 
 
-def get_queued():
+def send_stream(
+    recipients,
+    sender=None,
+    template=None,
+    subject="",
+    message="",
+    html_message="",
+    context=None,
+    scheduled_time=None,
+    expires_at=None,
+    headers=None,
+    priority=None,
+    render_on_delivery=False,
+    email_backend=None,
+    author=None,
+    chunk_size=None,
+    source_campaign=None,
+):
+    """
+    Queues one email per recipient from an iterable of addresses or
+    ``(address, context)`` tuples, e.g. ``read_recipients_csv()``.
+
+    Recipients are consumed in chunks of ``ENQUEUE_CHUNK_SIZE``: each chunk
+    is validated, rendered, written with ``COPY FROM STDIN`` in its own
+    transaction and announced with one ``email_queued`` signal, so the whole
+    list is never held in memory. The row context is merged over
+    ``context``. Invalid and suppressed recipients are rejected. Returns
+    the number of queued and rejected recipients.
+
+    Emails of a ``source_campaign`` are created with status ``created``
+    instead, the campaign orchestrator releases them into the queue.
+    """
+    priority = parse_priority(priority)
+    if priority == BackendConstants.PRIORITY.now:
+        raise ValueError("send_stream() can't be used with priority = 'now'")
+
+    if sender is None:
+        sender = settings.DEFAULT_FROM_EMAIL
+
+    if template:
+        # template can be an EmailTemplate instance or name
+        if not isinstance(template, EmailTemplate):
+            template = get_email_template(template)
+        subject = template.subject
+        message = template.content
+        html_message = template.html_content
+    elif render_on_delivery:
+        raise ValueError("render_on_delivery requires a template")
+    # Plain strings are rendered like an unsaved template, so both go
+    # through the configured TEMPLATE_ENGINE
+    source = template or EmailTemplate(
+        subject=subject, content=message, html_content=html_message
+    )
+
+    status = (
+        BackendConstants.STATUS.created
+        if source_campaign
+        else BackendConstants.STATUS.queued
+    )
+    queued, rejected = 0, 0
+    rows = (
+        (recipient, {}) if isinstance(recipient, str) else recipient
+        for recipient in recipients
+    )
+    for chunk in iter_chunks(rows, chunk_size or get_enqueue_chunk_size()):
+        chunk, rejected_addresses = split_valid_recipients(chunk)
+        rejected += len(rejected_addresses)
+        if rejected_addresses:
+            logger.info("Rejected %s invalid recipients" % len(rejected_addresses))
+
+        suppressed = get_suppressed(address for address, _ in chunk)
+        if suppressed:
+            kept = [
+                (address, row_context)
+                for address, row_context in chunk
+                if normalize_address(address) not in suppressed
+            ]
+            rejected += len(chunk) - len(kept)
+            logger.info("Rejected %s suppressed recipients" % (len(chunk) - len(kept)))
+            chunk = kept
+
+        contexts = [
+            dict(context or {}, **(row_context or {})) for _, row_context in chunk
+        ]
+        if render_on_delivery:
+            rendered = [None] * len(chunk)
+        else:
+            rendered = template_cache.render_many(source, contexts)
+
+        emails = []
+        for (address, _), email_context, rendered_email in zip(
+            chunk, contexts, rendered
+        ):
+            email = Email(
+                author=author,
+                from_email=sender,
+                to=[address],
+                cc=[],
+                bcc=[],
+                scheduled_time=scheduled_time,
+                expires_at=expires_at,
+                message_id=(
+                    make_msgid(domain=get_message_id_fqdn())
+                    if get_message_id_enabled()
+                    else None
+                ),
+                headers=headers,
+                priority=priority,
+                status=status,
+                template=template,
+                email_backend=email_backend,
+                source_campaign=source_campaign,
+            )
+            if render_on_delivery:
+                email.context = email_context
+                email.render_on_delivery = True
+            else:
+                email.subject, email.message, email.html_message = rendered_email
+            emails.append(email)
+
+        if emails:
+            enqueue_chunk(emails)
+            if not source_campaign:
+                email_queued.send(sender=Email, emails=emails)
+            queued += len(emails)
+
+    return queued, rejected
+
+
+def _get_batch_size():
+    controller = get_adaptive_controller()
+    return controller.batch_size if controller else get_batch_size()
+
+
+def _get_priority_query(priorities):
+    """Emails with one of ``priorities``, where None stands for no priority."""
+    query = Q(
+        priority__in=[priority for priority in priorities if priority is not None]
+    )
+    if None in priorities:
+        query |= Q(priority=None)
+    return query
+
+
+def _get_queued_query(now, priorities=None):
     """
-    Returns the queryset of emails eligible for sending – fulfilling these conditions:
-     - Status is queued or requeued
+    Emails are eligible for sending when:
+     - Status is queued or requeued, or sending with an expired claim lease
      - Has scheduled_time before the current time or is None
      - Has expires_at after the current time or is None
+     - Has one of ``priorities``, when given
+    """
+    query = (
+        (Q(scheduled_time__lte=now) | Q(scheduled_time=None))
+        & (Q(expires_at__gt=now) | Q(expires_at=None))
+        & (
+            Q(
+                status__in=[
+                    BackendConstants.STATUS.queued,
+                    BackendConstants.STATUS.requeued,
+                ]
+            )
+            | Q(status=BackendConstants.STATUS.sending, claimed_until__lt=now)
+        )
+    )
+    if priorities is not None:
+        query &= _get_priority_query(priorities)
+    return query
+
+
+def get_queued(priorities=None):
+    """
+    Returns the queryset of emails eligible for sending, see ``_get_queued_query``.
+    """
+    return (
+        Email.objects.filter(_get_queued_query(timezone.now(), priorities))
+        .select_related("template", "email_backend")
+        .order_by(*get_sending_order())
+        .prefetch_related("attachments")[: _get_batch_size()]
+    )
+
+
+def claim_queued(priorities=None):
+    """
+    Claims the next batch of eligible emails for this sender and returns it.
+
+    Rows are locked with ``SELECT ... FOR UPDATE SKIP LOCKED`` and moved to
+    the ``sending`` status with a lease, so concurrent senders on any host
+    claim disjoint batches, and the batch of a crashed sender becomes
+    eligible again once its lease expires.
     """
     now = timezone.now()
-    query = (Q(scheduled_time__lte=now) | Q(scheduled_time=None)) & (
-        Q(expires_at__gt=now) | Q(expires_at=None)
+    email_ids = _claim_emails(
+        Email.objects.filter(_get_queued_query(now, priorities)).order_by(
+            *get_sending_order()
+        ),
+        now,
     )
+    if not email_ids:
+        return Email.objects.none()
+
     return (
-        Email.objects.filter(
-            query,
-            status__in=[
-                BackendConstants.STATUS.queued,
-                BackendConstants.STATUS.requeued,
-            ],
-        )
-        .select_related("template")
+        Email.objects.filter(id__in=email_ids)
+        .select_related("template", "email_backend")
         .order_by(*get_sending_order())
-        .prefetch_related("attachments")[: get_batch_size()]
+        .prefetch_related("attachments")
     )
 
 
-def send_queued(processes=1, log_level=None):
+def _claim_emails(queryset, now):
+    """
+    Locks the first batch of ``queryset``, skipping rows locked by other
+    senders, and moves it to ``sending``. Returns the claimed ids.
+    """
+    with transaction.atomic():
+        queryset = queryset.select_for_update(skip_locked=True)
+        email_ids = list(queryset.values_list("id", flat=True)[: _get_batch_size()])
+        if email_ids:
+            Email.objects.filter(id__in=email_ids).update(
+                status=BackendConstants.STATUS.sending,
+                claimed_until=now + get_claim_lease(),
+            )
+    return email_ids
+
+
+def _get_keyset_queries(priority, email_id):
+    """
+    Emails after ``(priority, email_id)`` in ``QUEUE_ORDER``, where emails
+    without a priority come last, split into the ranges of
+    ``email_queue_order_idx`` that follow each other: the rest of the
+    email's priority, the lower priorities and the emails without one.
+    """
+    if priority is None:
+        return [Q(priority=None, id__gt=email_id)]
+    return [
+        Q(priority=priority, id__gt=email_id),
+        Q(priority__lt=priority),
+        Q(priority=None),
+    ]
+
+
+def _get_next_batch(queryset, claim, now):
+    if claim:
+        email_ids = _claim_emails(queryset, now)
+        if not email_ids:
+            return []
+        queryset = Email.objects.filter(id__in=email_ids).order_by(*QUEUE_ORDER)
+
+    return list(
+        queryset.select_related("template", "email_backend").prefetch_related(
+            "attachments"
+        )[: _get_batch_size()]
+    )
+
+
+def iter_queued_batches(claim=False, priorities=None):
+    """
+    Yields the eligible emails batch by batch, walking the queue once in
+    ``QUEUE_ORDER`` with a keyset cursor on (priority, id).
+
+    Every batch is read with a single index range scan starting after the
+    last email of the previous one, and the walk only moves on to the next
+    range of ``_get_keyset_queries`` once the current one is exhausted. An
+    OR of the ranges would make Postgres filter the index from its start
+    instead. Emails that were requeued, or enqueued behind the cursor, are
+    not rescanned until the next pass. With ``claim`` each batch is claimed
+    as in ``claim_queued``.
+    """
+    keysets = [Q()]
+    while keysets:
+        now = timezone.now()
+        queryset = Email.objects.filter(_get_queued_query(now, priorities)).order_by(
+            *QUEUE_ORDER
+        )
+        batch = _get_next_batch(queryset.filter(keysets[0]), claim, now)
+        if not batch:
+            keysets.pop(0)
+            continue
+
+        keysets = _get_keyset_queries(batch[-1].priority, batch[-1].id)
+        yield batch
+
+
+def send_queued(processes=1, log_level=None, priorities=None):
     """
     Sends out all queued mails that has scheduled_time less than now or None
     """
-    queued_emails = get_queued()
+    if get_claim_enabled():
+        queued_emails = claim_queued(priorities)
+    else:
+        queued_emails = get_queued(priorities)
+    return _send_batch(queued_emails, processes, log_level)
+
+
+def send_queued_stream(processes=1, log_level=None, priorities=None, deadline=None):
+    """
+    Sends out every eligible email in one pass over the queue, batch by
+    batch, see ``iter_queued_batches``. The pass stops early once the
+    ``time.monotonic()`` deadline is reached.
+    """
+    total_sent, total_failed, total_requeued = 0, 0, 0
+
+    batches = iter_queued_batches(claim=get_claim_enabled(), priorities=priorities)
+    for batch in batches:
+        sent, failed, requeued = _send_batch(batch, processes, log_level)
+        total_sent += sent
+        total_failed += failed
+        total_requeued += requeued
+
+        # Close DB connection to avoid multiprocessing errors
+        db_connection.close()
+
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+
+    return total_sent, total_failed, total_requeued
+
+
+def _send_batch(queued_emails, processes, log_level):
     total_sent, total_failed, total_requeued = 0, 0, 0
 
     emails = [
@@ -302,13 +628,22 @@ def send_queued(processes=1, log_level=None):
         if total_email < processes:
             processes = total_email
 
-        if processes == 1:
+        if get_engine() == BackendConstants.ENGINE_THREADED:
+            total_sent, total_failed, total_requeued = _send_bulk_threaded(
+                emails=queued_emails, log_level=log_level
+            )
+        elif processes == 1:
             total_sent, total_failed, total_requeued = _send_bulk(
                 emails=queued_emails,
                 uses_multiprocessing=False,
                 log_level=log_level,
             )
         else:
+            if get_adaptive_enabled():
+                logger.warning(
+                    "Adaptive sending is disabled when sending with %s processes"
+                    % processes
+                )
             email_lists = split_emails(queued_emails, processes)
 
             pool = Pool(processes)
@@ -330,7 +665,7 @@ def send_queued(processes=1, log_level=None):
 
             total_sent = sum(result[0] for result in results)
             total_failed = sum(result[1] for result in results)
-            total_requeued = [result[2] for result in results]
+            total_requeued = sum(result[2] for result in results)
 
     logger.info(
         "%s emails attempted, %s sent, %s failed, %s requeued",
@@ -343,113 +678,677 @@ def send_queued(processes=1, log_level=None):
     return total_sent, total_failed, total_requeued
 
 
-def _send_bulk(emails, uses_multiprocessing=True, log_level=None):
-    # Multiprocessing does not play well with database connection
-    # Fix: Close connections on forking process
-    # https://groups.google.com/forum/#!topic/django-users/eCAIY9DAfG0
-    if uses_multiprocessing:
-        db_connection.close()
+def _get_backend_limits(emails, controller):
+    """
+    Returns the adaptive concurrency of every email backend used by ``emails``.
+    """
+    return {
+        email.email_backend_id: controller.concurrency(email.email_backend_id)
+        for email in emails
+    }
 
-    if log_level is None:
-        log_level = get_log_level()
 
-    sent_emails = []
-    failed_emails = []
-    emails_list = [
+def _get_recipients(emails):
+    return [
         email
         for email in (email.to or email.bcc for email in emails)
         for email in email
     ]
-    email_count = len(emails_list)
 
-    logger.info("Process started, sending %s emails" % email_count)
 
-    def send(email_obj, email_list):
-        try:
-            email_obj.dispatch(
-                log_level=log_level, commit=False, disconnect_after_delivery=False
-            )
-            sent_emails.append(email_list)
-            logger.debug("Successfully sent email #%d" % email.id)
-        except Exception as e:
-            logger.exception("Failed to send email #%d" % email.id)
-            failed_emails.append((email, e))
+def _exclude_suppressed(emails):
+    """
+    Drops suppressed recipients from the emails of a batch with a single
+    Bloom filter lookup. Emails left without recipients fail with
+    ``RecipientSuppressed``, which is never retried.
+    """
+    fields = ("to", "cc", "bcc")
+    suppressed = get_suppressed(
+        recipient
+        for email in emails
+        for field in fields
+        for recipient in getattr(email, field) or []
+    )
+    if not suppressed:
+        return emails, []
+
+    kept_emails, failed_emails = [], []
+    dropped = 0
+    for email in emails:
+        recipients = {
+            field: [
+                recipient
+                for recipient in getattr(email, field) or []
+                if normalize_address(recipient) not in suppressed
+            ]
+            for field in fields
+        }
+        dropped += sum(
+            len(getattr(email, field) or []) - len(recipients[field])
+            for field in fields
+        )
+        if any(recipients.values()):
+            for field, field_recipients in recipients.items():
+                setattr(email, field, field_recipients)
+            kept_emails.append(email)
+        else:
+            addresses = {
+                normalize_address(recipient)
+                for field in fields
+                for recipient in getattr(email, field) or []
+            }
+            failed_emails.append((email, RecipientSuppressed(addresses)))
 
-    # Prepare emails before we send these to threads for sending
-    # So we don't need to access the DB from within threads
-    st_emails = []
+    logger.info("Dropped %s suppressed recipients" % dropped)
+    return kept_emails, failed_emails
+
+
+def _prepare_emails(emails):
+    """
+    Prepares email messages before they are handed to the sending threads,
+    so the threads don't need to access the DB. Suppressed recipients are
+    dropped before anything is rendered. Returns the list of prepared
+    emails and a list of (email, exception) tuples for those that failed.
+    """
+    prepared_emails = []
+    emails, failed_emails = _exclude_suppressed(emails)
+    # Attachments shared by emails of the batch are read and encoded once
+    attachment_cache = AttachmentCache()
 
     for email in emails:
         # Sometimes this can fail, for example when trying to render
         # email from a faulty Django template
         try:
-            email.prepare_email_message()
+            email.prepare_email_message(attachment_cache=attachment_cache)
+            prepared_emails.append(email)
         except Exception as e:
             logger.exception("Failed to prepare email #%d" % email.id)
             failed_emails.append((email, e))
 
-    number_of_threads = min(get_threads_per_process(), email_count)
+    return prepared_emails, failed_emails
+
+
+def _send_bulk(emails, uses_multiprocessing=True, log_level=None):
+    # Multiprocessing does not play well with database connection
+    # Fix: Close connections on forking process
+    # https://groups.google.com/forum/#!topic/django-users/eCAIY9DAfG0
+    if uses_multiprocessing:
+        db_connection.close()
+
+    if log_level is None:
+        log_level = get_log_level()
+
+    sent_emails = []
+    emails_list = _get_recipients(emails)
+    email_count = len(emails_list)
+
+    logger.info("Process started, sending %s emails" % email_count)
+
+    prepared_emails, failed_emails = _prepare_emails(emails)
+    fanout = get_fanout_enabled()
+    message_cache = MessageCache() if get_message_cache_enabled() else None
+    # Recipients refused by fanned out emails that reached someone else
+    refused = {}
+    # Recipients of retried emails that accepted a copy before, and of
+    # emails whose fan-out was cut off by a disconnect in this batch
+    delivered = _get_delivered_recipients(prepared_emails) if fanout else {}
+    accepted = {}
+
+    # Emails sharing an email backend reuse its authenticated sessions, at
+    # most as many at once as the adaptive controller allows when enabled.
+    # Samples recorded in a forked process would never reach the parent's
+    # controller, so it is only used by single process sends.
+    controller = None if uses_multiprocessing else get_adaptive_controller()
+    if controller is None:
+        number_of_threads = get_threads_per_process()
+        semaphores = defaultdict(nullcontext)
+        connection_pool = BackendConnectionPool()
+    else:
+        limits = _get_backend_limits(prepared_emails, controller)
+        number_of_threads = sum(limits.values())
+        semaphores = {
+            backend_id: threading.BoundedSemaphore(limit)
+            for backend_id, limit in limits.items()
+        }
+        connection_pool = BackendConnectionPool(
+            max_connections=max(limits.values(), default=1)
+        )
+
+    def send(email_obj):
+        with semaphores[email_obj.email_backend_id]:
+            started = time.monotonic()
+            try:
+                _dispatch(
+                    email_obj,
+                    log_level,
+                    connection_pool,
+                    fanout,
+                    refused,
+                    message_cache,
+                    delivered,
+                    accepted,
+                )
+                sent_emails.append(email_obj)
+                logger.debug("Successfully sent email #%d" % email_obj.id)
+                success = True
+            except Exception as e:
+                logger.exception("Failed to send email #%d" % email_obj.id)
+                failed_emails.append((email_obj, e))
+                success = False
+
+            if controller is not None:
+                controller.record(
+                    email_obj.email_backend_id, time.monotonic() - started, success
+                )
+
+    number_of_threads = max(min(number_of_threads, email_count), 1)
     pool = ThreadPool(number_of_threads)
+    started = time.monotonic()
 
     results = []
-    for email in emails:
-        for e in emails_list:
-            st_emails.append(SentMessages(email=email, to=e))
-        results.append(pool.apply_async(send, args=(email, emails_list)))
-
-    if st_emails:
-        CRUDSentMessages.bulk_sent_messages_create(st_emails)
     timeout = get_batch_delivery_timeout()
+    rate_limiter = get_rate_limiter()
+    if rate_limiter is None:
+        for email in prepared_emails:
+            results.append(pool.apply_async(send, args=(email,)))
+    else:
+        throttled_emails = _dispatch_throttled(
+            prepared_emails,
+            rate_limiter,
+            submit=lambda email: results.append(pool.apply_async(send, args=(email,))),
+            deadline=time.monotonic() + timeout,
+        )
+        emails = _exclude_throttled(emails, throttled_emails)
+        emails_list = _get_recipients(emails)
+        email_count = len(emails_list)
+        _release_claims(throttled_emails)
+
+    _create_sent_messages(emails, delivered)
 
     # Wait for all tasks to complete with a timeout
     # The get method is used with a timeout to wait for each result
-    for result in results:
-        result.get(timeout=timeout)
+    try:
+        for result in results:
+            result.get(timeout=timeout)
+    finally:
+        pool.close()
+        pool.join()
+        connection_pool.close()
+
+    if controller is not None:
+        controller.end_batch(len(emails), time.monotonic() - started)
+
+    return _finalize_batch(
+        emails,
+        email_count,
+        sent_emails,
+        failed_emails,
+        log_level,
+        refused_recipients=refused,
+        accepted_recipients=accepted,
+    )
 
-    pool.close()
-    pool.join()
 
-    # Update statuses of sent emails
+def _send_bulk_threaded(emails, log_level=None):
+    """
+    Sends a batch of emails from a single process, without a process Pool.
+
+    Every message is handed to a thread pool sized by
+    ``THREADED_MAX_CONCURRENCY`` and a per-backend semaphore caps concurrent
+    sessions per ``EmailBackend``. SMTP sessions are blocking, so every
+    session in flight holds a thread.
+    """
+    if log_level is None:
+        log_level = get_log_level()
 
-    email_ids = [email.id for email in emails]
-    email_update = CRUDEmail.update_status(
-        object_id=email_ids, status=BackendConstants.STATUS.sent
+    controller = get_adaptive_controller()
+    backend_concurrency = (
+        controller.max_concurrency if controller else get_threaded_backend_concurrency()
     )
-    sent_message_update = CRUDSentMessages.update_status(
-        object_id=email_ids, status=BackendConstants.STATUS.sent
+    connection_pool = BackendConnectionPool(max_connections=backend_concurrency)
+    semaphores = defaultdict(lambda: threading.BoundedSemaphore(backend_concurrency))
+
+    sent_emails = []
+    emails = list(emails)
+    emails_list = _get_recipients(emails)
+    email_count = len(emails_list)
+    logger.info("Thread pool started, sending %s emails" % email_count)
+
+    prepared_emails, failed_emails = _prepare_emails(emails)
+    fanout = get_fanout_enabled()
+    message_cache = MessageCache() if get_message_cache_enabled() else None
+    # Recipients refused by fanned out emails that reached someone else
+    refused = {}
+    # Recipients of retried emails that accepted a copy before, and of
+    # emails whose fan-out was cut off by a disconnect in this batch
+    delivered = _get_delivered_recipients(prepared_emails) if fanout else {}
+    accepted = {}
+
+    if controller is not None:
+        limits = _get_backend_limits(prepared_emails, controller)
+        for backend_id, limit in limits.items():
+            semaphores[backend_id] = threading.BoundedSemaphore(limit)
+
+    def send(email_obj):
+        with semaphores[email_obj.email_backend_id]:
+            started = time.monotonic()
+            try:
+                _dispatch(
+                    email_obj,
+                    log_level,
+                    connection_pool,
+                    fanout,
+                    refused,
+                    message_cache,
+                    delivered,
+                    accepted,
+                )
+                sent_emails.append(email_obj)
+                logger.debug("Successfully sent email #%d" % email_obj.id)
+                success = True
+            except Exception as e:
+                logger.exception("Failed to send email #%d" % email_obj.id)
+                failed_emails.append((email_obj, e))
+                success = False
+
+            if controller is not None:
+                controller.record(
+                    email_obj.email_backend_id, time.monotonic() - started, success
+                )
+
+    executor = ThreadPoolExecutor(
+        max_workers=get_threaded_max_concurrency(), thread_name_prefix="mailer-send"
     )
+    started = time.monotonic()
+    futures = []
+    timeout = get_batch_delivery_timeout()
+    try:
+        rate_limiter = get_rate_limiter()
+        if rate_limiter is None:
+            for email in prepared_emails:
+                futures.append(executor.submit(send, email))
+        else:
+            throttled_emails = _dispatch_throttled(
+                prepared_emails,
+                rate_limiter,
+                submit=lambda email: futures.append(executor.submit(send, email)),
+                deadline=time.monotonic() + timeout,
+            )
+            emails = _exclude_throttled(emails, throttled_emails)
+            emails_list = _get_recipients(emails)
+            email_count = len(emails_list)
+            _release_claims(throttled_emails)
+
+        _create_sent_messages(emails, delivered)
+
+        # Wait for all tasks to complete with a timeout
+        for future in futures:
+            future.result(timeout=timeout)
+    finally:
+        executor.shutdown(wait=False)
+        connection_pool.close()
+
+    if controller is not None:
+        controller.end_batch(len(emails), time.monotonic() - started)
+
+    return _finalize_batch(
+        emails,
+        email_count,
+        sent_emails,
+        failed_emails,
+        log_level,
+        refused_recipients=refused,
+        accepted_recipients=accepted,
+    )
+
+
+def _dispatch_throttled(emails, rate_limiter, submit, deadline):
+    """
+    Hands emails to ``submit`` as soon as their rate limit buckets allow,
+    emails of throttled buckets are skipped over rather than waited on.
+    Returns the emails that were still throttled when ``deadline`` passed.
+    """
+    scheduler = DispatchScheduler(emails, rate_limiter)
+    while scheduler:
+        ready, wait = scheduler.poll()
+        for email in ready:
+            submit(email)
+
+        if scheduler:
+            if time.monotonic() + wait > deadline:
+                break
+            time.sleep(wait)
+
+    return scheduler.pending
+
+
+def _exclude_throttled(emails, throttled_emails):
+    """
+    Emails still throttled at the end of a batch are left queued for the next one.
+    """
+    if throttled_emails:
+        logger.info("%s emails throttled, leaving them queued" % len(throttled_emails))
+    throttled_ids = {email.id for email in throttled_emails}
+    return [email for email in emails if email.id not in throttled_ids]
+
+
+def _release_claims(emails):
+    if emails and get_claim_enabled():
+        CRUDEmail.release_claim(object_id=[email.id for email in emails])
+
+
+def _dispatch(
+    email_obj,
+    log_level,
+    connection_pool,
+    fanout,
+    refused_recipients,
+    message_cache=None,
+    delivered_recipients=None,
+    accepted_recipients=None,
+):
+    """
+    Sends one email of a batch, as a copy per recipient when ``fanout`` is
+    enabled and the email has no Cc. With a ``message_cache`` emails that
+    aren't personalized reuse the bytes of identical emails. Recipients
+    refused by an email that reached others are added to
+    ``refused_recipients``, it only raises when no recipient got the email.
+    A fan-out skips the ``delivered_recipients`` of the email, and adds the
+    recipients that accepted a copy before a disconnect to
+    ``accepted_recipients``.
+    """
+    if message_cache is not None and is_personalized(email_obj):
+        message_cache = None
+
+    if fanout and not email_obj.cc:
+        delivered = (delivered_recipients or {}).get(email_obj.id, set())
+        try:
+            outcomes = email_obj.dispatch_fanout(
+                connection_pool, message_cache, skip=delivered
+            )
+        except FanoutInterrupted as e:
+            outcomes = _record_interrupted_fanout(
+                email_obj, e, delivered, accepted_recipients
+            )
+        refused = get_refused(outcomes)
+        if refused and len(refused) == len(outcomes):
+            raise next(iter(refused.values()))
+    elif message_cache is not None:
+        refused = email_obj.dispatch_serialized(connection_pool, message_cache)
+    else:
+        email_obj.dispatch(
+            log_level=log_level,
+            commit=False,
+            disconnect_after_delivery=False,
+            connection_pool=connection_pool,
+        )
+        return
+
+    if refused:
+        refused_recipients[email_obj.id] = refused
+
+
+def _record_interrupted_fanout(email_obj, interrupted, delivered, accepted_recipients):
+    """
+    Keeps the recipients that accepted their copy before a fan-out was cut
+    off in ``accepted_recipients`` and raises. Their sent messages are
+    marked sent and the retry skips them, the email keeps every recipient.
+    Returns the outcomes when every recipient was answered before the
+    disconnect.
+    """
+    recipients = (email_obj.to or []) + (email_obj.bcc or [])
+    if all(
+        recipient in interrupted.outcomes or recipient in delivered
+        for recipient in recipients
+    ):
+        return interrupted.outcomes
+    accepted = {
+        recipient for recipient, error in interrupted.outcomes.items() if error is None
+    }
+    if accepted and accepted_recipients is not None:
+        accepted_recipients[email_obj.id] = accepted
+        logger.info(
+            "Fan-out of email %s was interrupted after %s accepted copies"
+            % (email_obj.id, len(accepted))
+        )
+    raise interrupted
+
+
+def _get_delivered_recipients(emails):
+    """
+    Returns the recipients of retried emails whose sent message is already
+    sent, by email id, so a retried fan-out doesn't send them another copy.
+    """
+    retried_ids = [email.id for email in emails if email.number_of_retries]
+    delivered = defaultdict(set)
+    if retried_ids:
+        sent_messages = SentMessages.objects.filter(
+            email__in=retried_ids, status=BackendConstants.STATUS.sent
+        ).values_list("email_id", "to")
+        for email_id, recipient in sent_messages:
+            delivered[email_id].add(recipient)
+    return dict(delivered)
+
+
+def _create_sent_messages(emails, delivered_recipients=None):
+    delivered_recipients = delivered_recipients or {}
+    sent_messages = [
+        SentMessages(email=email, to=recipient)
+        for email in emails
+        for recipient in (email.to or []) + (email.cc or []) + (email.bcc or [])
+        if recipient not in delivered_recipients.get(email.id, ())
+    ]
+
+    if sent_messages:
+        CRUDSentMessages.bulk_sent_messages_create(sent_messages)
+
+
+def _finalize_batch(
+    emails,
+    email_count,
+    sent_emails,
+    failed_emails,
+    log_level,
+    refused_recipients=None,
+    accepted_recipients=None,
+):
+    """
+    Records the outcome of every email of a sent batch and notifies their
+    authors. Outcomes are written with a few set-based statements in a
+    single transaction. With claims, outcomes of emails whose claim was
+    lost to another sender are dropped, that sender records its own.
+    """
+    if not emails:
+        return 0, 0, 0
+
+    with transaction.atomic():
+        if get_claim_enabled():
+            held_ids = _get_held_claims(emails)
+            if len(held_ids) < len(emails):
+                logger.warning(
+                    "Lost the claim of %s emails, dropping their outcomes"
+                    % (len(emails) - len(held_ids))
+                )
+                emails = [email for email in emails if email.id in held_ids]
+                sent_emails = [email for email in sent_emails if email.id in held_ids]
+                failed_emails = [
+                    (email, exception)
+                    for email, exception in failed_emails
+                    if email.id in held_ids
+                ]
+                refused_recipients = {
+                    email_id: refused
+                    for email_id, refused in (refused_recipients or {}).items()
+                    if email_id in held_ids
+                }
+                accepted_recipients = {
+                    email_id: accepted
+                    for email_id, accepted in (accepted_recipients or {}).items()
+                    if email_id in held_ids
+                }
+
+        sent_ids = [email.id for email in sent_emails]
+        retry_policy = RetryPolicy()
+        failed_ids, requeued_ids = _split_failures(failed_emails, retry_policy)
+        retry_times = _get_retry_times(failed_emails, requeued_ids, retry_policy)
+
+        _update_outcomes(
+            sent_ids,
+            failed_ids,
+            requeued_ids,
+            refused_recipients,
+            retry_times,
+            accepted_recipients,
+        )
+
+        logs = _get_outcome_logs(
+            sent_emails, failed_emails, log_level, refused_recipients
+        )
+        if logs:
+            Log.objects.bulk_create(logs)
+
+    record_campaign_outcomes(sent_emails, failed_emails, requeued_ids)
+    record_hard_bounces(failed_emails, refused_recipients)
+    logger.info(
+        "Process finished, %s attempted, %s sent, %s failed, %s requeued",
+        email_count,
+        len(sent_ids),
+        len(failed_ids),
+        len(requeued_ids),
+    )
+    _notify_authors(emails, sent_ids, failed_ids, requeued_ids)
+
+    return len(sent_ids), len(failed_ids), len(requeued_ids)
 
-    logger.info(f"Successfully update {email_update} emails")
-    logger.info(f"Successfully update {sent_message_update} sent messages")
 
-    campaign_update = CRUDCampaign.update_campaign_status(
-        object_id=email_ids, status=CampaignConstants.STATUS.completed
+def _get_held_claims(emails):
+    """
+    Locks the emails of a batch this sender still holds the claim of and
+    returns their ids. The ``claimed_until`` of a claim is its token: an
+    email claimed again after its lease expired has another one.
+    """
+    leases = defaultdict(list)
+    for email in emails:
+        leases[email.claimed_until].append(email.id)
+    held = Q(id__in=[])
+    for claimed_until, email_ids in leases.items():
+        held |= Q(id__in=email_ids, claimed_until=claimed_until)
+    return set(
+        Email.objects.filter(held, status=BackendConstants.STATUS.sending)
+        .select_for_update()
+        .values_list("id", flat=True)
     )
-    logger.info(f"Successfully update {campaign_update} campaigns")
-
-    # Update statuses and conditionally requeue failed emails
-    num_failed, num_requeued = 0, 0
-    max_retries = get_max_retries()
-    scheduled_time = timezone.now() + get_retry_timedelta()
-    emails_failed = [email for email, _ in failed_emails]
-
-    for email in emails_failed:
-        if email.number_of_retries is None:
-            email.number_of_retries = 0
-        if email.number_of_retries < max_retries:
-            email.number_of_retries += 1
-            email.status = BackendConstants.STATUS.requeued
-            email.scheduled_time = scheduled_time
-            num_requeued += 1
+
+
+def _split_failures(failed_emails, retry_policy):
+    """
+    Returns the ids of failed emails that are out of retries, or failed
+    permanently, and of those to requeue.
+    """
+    failed_ids, requeued_ids = [], []
+    for email, exception in failed_emails:
+        if retry_policy.should_retry(exception, email.number_of_retries or 0):
+            requeued_ids.append(email.id)
         else:
-            email.status = BackendConstants.STATUS.failed
-            num_failed += 1
-    CRUDEmail.bulk_email_update(update_objects=emails_failed)
+            failed_ids.append(email.id)
+    return failed_ids, requeued_ids
+
+
+def _get_retry_times(failed_emails, requeued_ids, retry_policy):
+    """Returns when each requeued email is sent again, by email id."""
+    now = timezone.now()
+    requeued_ids = set(requeued_ids)
+    return {
+        email.id: retry_policy.get_retry_time(
+            exception, email.number_of_retries or 0, now
+        )
+        for email, exception in failed_emails
+        if email.id in requeued_ids
+    }
+
+
+def _update_outcomes(
+    sent_ids,
+    failed_ids,
+    requeued_ids,
+    refused_recipients=None,
+    retry_times=None,
+    accepted_recipients=None,
+):
+    """
+    Writes the status of the emails and their sent messages with one
+    UPDATE per table, plus one for recipients refused by otherwise sent
+    emails and one for recipients that accepted a copy of an email whose
+    fan-out was interrupted. Sent messages already sent keep their status.
+    Requeued emails are scheduled at their ``retry_times`` by one more
+    UPDATE joined on the unnested times.
+    Campaigns are finished by the orchestrator, see mailers.orchestrator.
+    """
+    email_ids = sent_ids + failed_ids + requeued_ids
+    status = Case(
+        When(id__in=sent_ids, then=Value(BackendConstants.STATUS.sent)),
+        When(id__in=requeued_ids, then=Value(BackendConstants.STATUS.requeued)),
+        default=Value(BackendConstants.STATUS.failed),
+    )
+    email_update = Email.objects.filter(id__in=email_ids).update(
+        status=status,
+        claimed_until=None,
+        number_of_retries=Case(
+            When(id__in=requeued_ids, then=Coalesce("number_of_retries", 0) + 1),
+            default=F("number_of_retries"),
+        ),
+    )
+    logger.info(f"Successfully update {email_update} emails")
 
+    if retry_times:
+        table = db_connection.ops.quote_name(Email._meta.db_table)
+        with db_connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE %s SET scheduled_time = retry.scheduled_time "
+                "FROM unnest(%%s::bigint[], %%s::timestamptz[]) "
+                "AS retry(id, scheduled_time) WHERE %s.id = retry.id" % (table, table),
+                [list(retry_times), list(retry_times.values())],
+            )
+
+    sent_message_update = (
+        SentMessages.objects.filter(email__in=email_ids)
+        .exclude(status=BackendConstants.STATUS.sent)
+        .update(
+            status=Case(
+                When(email__in=sent_ids, then=Value(BackendConstants.STATUS.sent)),
+                When(
+                    email__in=requeued_ids, then=Value(BackendConstants.STATUS.requeued)
+                ),
+                default=Value(BackendConstants.STATUS.failed),
+            )
+        )
+    )
+    logger.info(f"Successfully update {sent_message_update} sent messages")
+
+    if refused_recipients:
+        refused = Q()
+        for email_id, recipients in refused_recipients.items():
+            refused |= Q(email=email_id, to__in=list(recipients))
+        refused_update = SentMessages.objects.filter(refused).update(
+            status=BackendConstants.STATUS.failed
+        )
+        logger.info(f"Successfully update {refused_update} refused sent messages")
+
+    if accepted_recipients:
+        accepted = Q()
+        for email_id, recipients in accepted_recipients.items():
+            accepted |= Q(email=email_id, to__in=list(recipients))
+        accepted_update = SentMessages.objects.filter(accepted).update(
+            status=BackendConstants.STATUS.sent
+        )
+        logger.info(f"Successfully update {accepted_update} accepted sent messages")
+
+
+def _get_outcome_logs(sent_emails, failed_emails, log_level, refused_recipients=None):
     # If log level is 0, log nothing, 1 logs only sending failures
     # and 2 means log both successes and failures
+    logs = []
     if log_level >= 1:
-        logs = []
         for email, exception in failed_emails:
             logs.append(
                 Log(
@@ -460,62 +1359,105 @@ def _send_bulk(emails, uses_multiprocessing=True, log_level=None):
                 )
             )
 
-        if logs:
-            Log.objects.bulk_create(logs)
+        for email in sent_emails:
+            for recipient, exception in (
+                (refused_recipients or {}).get(email.id, {}).items()
+            ):
+                logs.append(
+                    Log(
+                        email=email,
+                        status=BackendConstants.STATUS.failed,
+                        message="%s: %s" % (recipient, exception),
+                        exception_type=type(exception).__name__,
+                    )
+                )
 
     if log_level == 2:
-        logs = []
-        for email in emails:
+        for email in sent_emails:
             logs.append(Log(email=email, status=BackendConstants.STATUS.sent))
 
-        if logs:
-            Log.objects.bulk_create(logs)
+    return logs
 
-    logger.info(
-        "Process finished, %s attempted, %s sent, %s failed, %s requeued",
-        email_count,
-        len(sent_emails[0]),
-        num_failed,
-        num_requeued,
-    )
-    GeneralUserNotify.notify(
-        user_id=str(emails[0].author.id),
-        title=NotifyConstants.NOTIFICATION_SENT_MESSAGE_TITLE,
-        description=NotifyConstants.NOTIFICATION_SENT_MESSAGE_DES
-        % (
-            email_count,
-            len(sent_emails[0]),
-            num_failed,
-            num_requeued,
-        ),
-        notify_type=NotifyConstants.NOTIFICATIONS.item,
-        data={
-            "send_email": str(len(sent_emails[0])),
-            "num_failed": num_failed,
-            "num_requeued": num_requeued,
-        },
-    )
-    return len(sent_emails[0]), num_failed, num_requeued
 
+def _notify_authors(emails, sent_ids, failed_ids, requeued_ids):
+    """
+    Sends every author a summary of their emails in the batch, emails
+    without an author are not reported.
+    """
+    outcomes = {email_id: "sent" for email_id in sent_ids}
+    outcomes.update({email_id: "failed" for email_id in failed_ids})
+    outcomes.update({email_id: "requeued" for email_id in requeued_ids})
+
+    counts = defaultdict(Counter)
+    for email in emails:
+        if email.author_id is None:
+            continue
+        counts[email.author_id]["attempted"] += len(_get_recipients([email]))
+        if email.id in outcomes:
+            counts[email.author_id][outcomes[email.id]] += 1
+
+    for author_id, count in counts.items():
+        GeneralUserNotify.notify(
+            user_id=str(author_id),
+            title=NotifyConstants.NOTIFICATION_SENT_MESSAGE_TITLE,
+            description=NotifyConstants.NOTIFICATION_SENT_MESSAGE_DES
+            % (
+                count["attempted"],
+                count["sent"],
+                count["failed"],
+                count["requeued"],
+            ),
+            notify_type=NotifyConstants.NOTIFICATIONS.item,
+            data={
+                "send_email": str(count["sent"]),
+                "num_failed": count["failed"],
+                "num_requeued": count["requeued"],
+            },
+        )
 
-def send_queued_mail_until_done(lockfile=default_lockfile, processes=1, log_level=None):
+
+def send_queued_mail_until_done(
+    lockfile=default_lockfile,
+    processes=1,
+    log_level=None,
+    priorities=None,
+    deadline=None,
+):
     """
     Send mail in queue batch by batch, until all emails have been processed.
+    Only emails with one of ``priorities`` are sent when given, and no new
+    batch is started after the ``time.monotonic()`` deadline. Returns False
+    when emails were left in the queue because of the deadline.
     """
+    if get_claim_enabled():
+        # Claimed batches never overlap, so senders don't need the lock file
+        return _send_queued_until_done(processes, log_level, priorities, deadline)
+
     try:
         with FileLock(lockfile):
             logger.info("Acquired lock for sending queued emails at %s.lock", lockfile)
-            while True:
-                try:
-                    send_queued(processes, log_level)
-                except Exception as e:
-                    logger.exception(e, extra={"status_code": 500})
-                    raise
-
-                # Close DB connection to avoid multiprocessing errors
-                db_connection.close()
-
-                if not get_queued().exists():
-                    break
+            return _send_queued_until_done(processes, log_level, priorities, deadline)
     except FileLocked:
         logger.info("Failed to acquire lock, terminating now.")
+        return True
+
+
+def _send_queued_until_done(processes, log_level, priorities=None, deadline=None):
+    if get_streaming_drain():
+        send = partial(send_queued_stream, deadline=deadline)
+    else:
+        send = send_queued
+    while True:
+        try:
+            send(processes, log_level, priorities)
+        except Exception as e:
+            logger.exception(e, extra={"status_code": 500})
+            raise
+
+        # Close DB connection to avoid multiprocessing errors
+        db_connection.close()
+
+        if not get_queued(priorities).exists():
+            return True
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
@@ -0,0 +1,62 @@
+# Generated by Django 5.0.6 on 2026-10-18 17:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend_mailer", "0006_rename_type_emailtemplate_template_type_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="email",
+            name="claimed_until",
+            field=models.DateTimeField(
+                blank=True,
+                editable=False,
+                help_text="Lease of the sender currently delivering this email",
+                null=True,
+                verbose_name="Claimed until",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="email",
+            name="status",
+            field=models.PositiveSmallIntegerField(
+                blank=True,
+                choices=[
+                    (4, "created"),
+                    (0, "sent"),
+                    (1, "failed"),
+                    (2, "queued"),
+                    (3, "requeued"),
+                    (5, "sending"),
+                ],
+                db_index=True,
+                default=4,
+                null=True,
+                verbose_name="Status",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="sentmessages",
+            name="status",
+            field=models.PositiveSmallIntegerField(
+                blank=True,
+                choices=[
+                    (4, "created"),
+                    (0, "sent"),
+                    (1, "failed"),
+                    (2, "queued"),
+                    (3, "requeued"),
+                    (5, "sending"),
+                ],
+                db_index=True,
+                default=4,
+                null=True,
+                verbose_name="Status",
+            ),
+        ),
+    ]
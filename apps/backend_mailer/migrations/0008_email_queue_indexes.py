@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2026-10-18 17:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend_mailer", "0007_email_claimed_until"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="email",
+            index=models.Index(
+                models.OrderBy(models.F("priority"), descending=True, nulls_last=True),
+                models.F("id"),
+                condition=models.Q(("status__in", [2, 3, 5])),
+                name="email_queue_order_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="email",
+            index=models.Index(
+                condition=models.Q(("status__in", [2, 3, 5])),
+                fields=["status", "scheduled_time"],
+                name="email_queue_schedule_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend_mailer", "0008_email_queue_indexes"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                "CREATE TABLE backend_mailer_archive ("
+                "table_name varchar(63) NOT NULL, "
+                "id bigint NOT NULL, "
+                "created timestamp with time zone NOT NULL, "
+                "data jsonb NOT NULL"
+                ") PARTITION BY RANGE (created)",
+                "CREATE INDEX backend_mailer_archive_row_idx "
+                "ON backend_mailer_archive (table_name, id)",
+            ],
+            reverse_sql="DROP TABLE backend_mailer_archive",
+        ),
+    ]
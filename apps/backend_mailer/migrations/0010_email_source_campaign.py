@@ -0,0 +1,37 @@
+# Generated by Django 5.0.6 on 2026-10-18 18:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend_mailer", "0009_archive_table"),
+        ("mailers", "0005_campaign_waves"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="email",
+            name="source_campaign",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                help_text="Campaign this email was generated for",
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="emails",
+                to="mailers.campaign",
+                verbose_name="Campaign",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="email",
+            index=models.Index(
+                fields=["source_campaign", "status"], name="email_campaign_status_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.0.6 on 2026-10-18 18:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend_mailer", "0010_email_source_campaign"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Suppression",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "address",
+                    models.CharField(
+                        max_length=254, unique=True, verbose_name="Address"
+                    ),
+                ),
+                (
+                    "reason",
+                    models.PositiveSmallIntegerField(
+                        choices=[
+                            (0, "hard bounce"),
+                            (1, "complaint"),
+                            (2, "unsubscribe"),
+                            (3, "manual"),
+                        ],
+                        default=3,
+                        verbose_name="Reason",
+                    ),
+                ),
+                ("detail", models.TextField(blank=True, verbose_name="Detail")),
+                ("created", models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                "verbose_name": "Suppression",
+                "verbose_name_plural": "Suppressions",
+            },
+        ),
+    ]
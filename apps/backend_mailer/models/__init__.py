@@ -4,3 +4,4 @@ from apps.backend_mailer.models.email_template import EmailTemplate
 from apps.backend_mailer.models.log import Log
 from apps.backend_mailer.models.backend import EmailBackend
 from apps.backend_mailer.models.sent_messages import SentMessages
+from apps.backend_mailer.models.suppression import Suppression
@@ -4,6 +4,7 @@ from django.utils.translation import gettext_lazy as _
 
 from apps.backend_mailer.constants import BackendConstants
 from apps.backend_mailer.fields import encrypt_config
+from apps.backend_mailer.logic.email_backend import backend_config_cache
 from apps.changelog.mixins import ChangeloggableMixin
 from apps.changelog.signals import journal_save_handler, journal_delete_handler
 from utils.models import DateModelMixin, DeleteModelMixin
@@ -38,6 +39,7 @@ class EmailBackend(ChangeloggableMixin, DateModelMixin, DeleteModelMixin):
         if self.config:
             self.config = encrypt_config(self.config)
         super().save(force_insert, force_update, using, update_fields)
+        backend_config_cache.invalidate(self.id)
 
 
 post_save.connect(journal_save_handler, sender=EmailBackend)
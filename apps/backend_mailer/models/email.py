@@ -1,28 +1,36 @@
-from email.mime.nonmultipart import MIMENonMultipart
-
 from django.contrib.postgres.fields import ArrayField
-from django.core.mail import get_connection
 from django.core.exceptions import ValidationError
 from django.core.mail import EmailMessage, EmailMultiAlternatives
 from django.db import models
 from django.utils.encoding import smart_str
 from django.utils.translation import pgettext_lazy, gettext_lazy as _
 
-from apps.backend_mailer.logic.email_backend import EmailBackendManager
+from apps.backend_mailer.connections import get_backend_connection
+from apps.backend_mailer.fanout import send_fanout
+from apps.backend_mailer.logic.attachment import build_mime_part
+from apps.backend_mailer.logic.email_template import template_cache
 from apps.backend_mailer.logutils import setup_loghandlers
+from apps.backend_mailer.serialized import send_serialized
 from apps.backend_mailer.settings import (
     context_field_class,
     get_log_level,
-    get_template_engine,
     get_override_recipients,
+    get_suppression_enabled,
+    get_tracking_enabled,
 )
-from apps.backend_mailer.fields import decrypt_config
 from apps.backend_mailer.validators import validate_email_with_name
 from apps.backend_mailer.constants import BackendConstants
+from apps.mailers.tracking import add_tracking, get_unsubscribe_headers
 from apps.users.models import User
 
 logger = setup_loghandlers("INFO")
 
+QUEUE_STATUSES = [
+    BackendConstants.STATUS.queued,
+    BackendConstants.STATUS.requeued,
+    BackendConstants.STATUS.sending,
+]
+
 
 class Email(models.Model):
     """
@@ -98,6 +106,13 @@ class Email(models.Model):
         "Message-ID", null=True, max_length=255, editable=False
     )
     number_of_retries = models.PositiveIntegerField(null=True, blank=True)
+    claimed_until = models.DateTimeField(
+        _("Claimed until"),
+        blank=True,
+        null=True,
+        editable=False,
+        help_text=_("Lease of the sender currently delivering this email"),
+    )
     headers = models.JSONField(_("Headers"), blank=True, null=True)
     template = models.ForeignKey(
         "backend_mailer.EmailTemplate",
@@ -120,11 +135,41 @@ class Email(models.Model):
         blank=True,
         verbose_name=_("Email backend"),
     )
+    source_campaign = models.ForeignKey(
+        to="mailers.Campaign",
+        on_delete=models.CASCADE,
+        related_name="emails",
+        null=True,
+        blank=True,
+        db_index=False,
+        verbose_name=_("Campaign"),
+        help_text=_("Campaign this email was generated for"),
+    )
 
     class Meta:
 
         verbose_name = pgettext_lazy("Email address", "Email")
         verbose_name_plural = pgettext_lazy("Email addresses", "Emails")
+        # Partial indexes covering only the rows the sender still has to
+        # walk, so they stay small however large the sent history grows
+        indexes = [
+            models.Index(
+                models.F("priority").desc(nulls_last=True),
+                "id",
+                name="email_queue_order_idx",
+                condition=models.Q(status__in=QUEUE_STATUSES),
+            ),
+            models.Index(
+                fields=["status", "scheduled_time"],
+                name="email_queue_schedule_idx",
+                condition=models.Q(status__in=QUEUE_STATUSES),
+            ),
+            # Campaign waves and progress are read per status
+            models.Index(
+                fields=["source_campaign", "status"],
+                name="email_campaign_status_idx",
+            ),
+        ]
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -136,18 +181,7 @@ class Email(models.Model):
 
     def create_connection(self):
         try:
-            encrypt_config = self.email_backend.config
-            backend_config = decrypt_config(value=encrypt_config)
-
-            backend_class = BackendConstants.EMAIL_BACKENDS_CHOICES_DICT.get(
-                self.email_backend.backend_type
-            )
-
-            data = EmailBackendManager.get_backend_fields(
-                backend_type=self.email_backend.backend_type, config=backend_config
-            )
-
-            self.connection = get_connection(backend=backend_class, **data)
+            self.connection = get_backend_connection(self.email_backend)
 
             logger.info(f"Connection {self.connection}.")
         except Exception as e:
@@ -165,21 +199,20 @@ class Email(models.Model):
 
         return self.prepare_email_message()
 
-    def prepare_email_message(self):
+    def prepare_email_message(self, attachment_cache=None):
         """
         Returns a django ``EmailMessage`` or ``EmailMultiAlternatives`` object,
-        depending on whether html_message is empty.
+        depending on whether html_message is empty. Attachment parts are taken
+        from ``attachment_cache`` when given.
         """
         if get_override_recipients():
             self.to = get_override_recipients()
 
         if self.template is not None and self.context is not None:
-            engine = get_template_engine()
-            subject = engine.from_string(self.template.subject).render(self.context)
-            plaintext_message = engine.from_string(self.template.content).render(
-                self.context
-            )
-            multipart_template = engine.from_string(self.template.html_content)
+            compiled_template = template_cache.get(self.template)
+            subject = compiled_template.subject.render(self.context)
+            plaintext_message = compiled_template.content.render(self.context)
+            multipart_template = compiled_template.html_content
             html_message = multipart_template.render(self.context)
 
         else:
@@ -188,6 +221,9 @@ class Email(models.Model):
             multipart_template = None
             html_message = self.html_message
 
+        if html_message and self.source_campaign_id and get_tracking_enabled():
+            html_message = add_tracking(html_message, self.id, self.source_campaign_id)
+
         if isinstance(self.headers, dict) or self.expires_at or self.message_id:
             headers = dict(self.headers or {})
             if self.expires_at:
@@ -199,8 +235,17 @@ class Email(models.Model):
         else:
             headers = None
 
-        self.create_connection()
-        connection = self.connection
+        if (
+            self.source_campaign_id
+            and get_suppression_enabled()
+            and len(self.to or []) == 1
+            and not self.cc
+            and not self.bcc
+        ):
+            headers = dict(
+                headers or {},
+                **get_unsubscribe_headers(self.id, self.source_campaign_id, self.to[0]),
+            )
 
         if html_message:
             if plaintext_message:
@@ -212,7 +257,6 @@ class Email(models.Model):
                     bcc=self.bcc,
                     cc=self.cc,
                     headers=headers,
-                    connection=connection,
                 )
                 msg.attach_alternative(html_message, "text/html")
             else:
@@ -224,7 +268,6 @@ class Email(models.Model):
                     bcc=self.bcc,
                     cc=self.cc,
                     headers=headers,
-                    connection=connection,
                 )
                 msg.content_subtype = "html"
             if hasattr(multipart_template, "attach_related"):
@@ -239,36 +282,39 @@ class Email(models.Model):
                 bcc=self.bcc,
                 cc=self.cc,
                 headers=headers,
-                connection=connection,
             )
 
         for attachment in self.attachments.all():
-            if attachment.headers:
-                mime_part = MIMENonMultipart(*attachment.mimetype.split("/"))
-                mime_part.set_payload(attachment.file.read())
-                for key, val in attachment.headers.items():
-                    try:
-                        mime_part.replace_header(key, val)
-                    except KeyError:
-                        mime_part.add_header(key, val)
-                msg.attach(mime_part)
+            if attachment_cache is None:
+                msg.attach(build_mime_part(attachment))
             else:
-                msg.attach(
-                    attachment.name,
-                    attachment.file.read(),
-                    mimetype=attachment.mimetype or None,
-                )
-            attachment.file.close()
+                msg.attach(attachment_cache.get(attachment))
 
         self._cached_email_message = msg
         return msg
 
-    def dispatch(self, log_level=None, disconnect_after_delivery=True, commit=True):
+    def dispatch(
+        self,
+        log_level=None,
+        disconnect_after_delivery=True,
+        commit=True,
+        connection_pool=None,
+    ):
         """
-        Sends email and log the result.
+        Sends email and log the result. When ``connection_pool`` is given the
+        message goes through a pooled connection of its email backend.
         """
         try:
-            self.email_message().send()
+            message = self.email_message()
+            if connection_pool is not None:
+                with connection_pool.connection(self.email_backend) as connection:
+                    message.connection = connection
+                    message.send()
+            else:
+                if self.connection is None:
+                    self.create_connection()
+                message.connection = self.connection
+                message.send()
             status = BackendConstants.STATUS.sent
             message = ""
             exception_type = ""
@@ -284,7 +330,7 @@ class Email(models.Model):
                 # layer handle the exception
                 raise
 
-        if disconnect_after_delivery:
+        if disconnect_after_delivery and self.connection is not None:
             self.connection.close()
 
         if commit:
@@ -308,6 +354,27 @@ class Email(models.Model):
 
         return status
 
+    def dispatch_fanout(self, connection_pool, message_cache=None, skip=()):
+        """
+        Sends an individually addressed copy to each To and Bcc recipient,
+        except those in ``skip``, over one pooled session of the email
+        backend. Returns a dict of recipient to the exception it was refused
+        with, or None.
+        """
+        message = self.email_message()
+        with connection_pool.connection(self.email_backend) as connection:
+            return send_fanout(connection, message, message_cache, skip)
+
+    def dispatch_serialized(self, connection_pool, message_cache):
+        """
+        Sends the email through a pooled connection, reusing the serialized
+        bytes of identical emails in ``message_cache``. Returns the refused
+        recipients when others accepted the email.
+        """
+        message = self.email_message()
+        with connection_pool.connection(self.email_backend) as connection:
+            return send_serialized(connection, message, message_cache)
+
     def clean(self):
         if (
             self.scheduled_time
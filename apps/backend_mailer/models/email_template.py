@@ -3,6 +3,7 @@ from django.utils.translation import gettext_lazy as _
 
 from apps.backend_mailer import cache
 from apps.backend_mailer.constants import BackendConstants
+from apps.backend_mailer.logic.email_template import template_cache
 from apps.backend_mailer.logutils import setup_loghandlers
 from apps.backend_mailer.validators import validate_template_syntax
 
@@ -92,4 +93,5 @@ class EmailTemplate(models.Model):
 
         template = super().save(*args, **kwargs)
         cache.delete(self.name)
+        template_cache.invalidate(self.id)
         return template
@@ -0,0 +1,33 @@
+from django.db import models
+
+from django.utils.translation import gettext_lazy as _
+
+from apps.backend_mailer.constants import BackendConstants
+from apps.backend_mailer.validators import get_recipient
+
+
+class Suppression(models.Model):
+    """
+    An address no email is sent to anymore, see suppression.py.
+    """
+
+    address = models.CharField(_("Address"), max_length=254, unique=True)
+    reason = models.PositiveSmallIntegerField(
+        _("Reason"),
+        choices=BackendConstants.SUPPRESSION_REASON_CHOICES,
+        default=BackendConstants.SUPPRESSION_REASON.manual,
+    )
+    detail = models.TextField(_("Detail"), blank=True)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = _("Suppression")
+        verbose_name_plural = _("Suppressions")
+
+    def __str__(self):
+        return self.address
+
+    def save(self, *args, **kwargs):
+        # Addresses are matched lowercased, without a display name
+        self.address = get_recipient(self.address).strip().lower()
+        return super().save(*args, **kwargs)
@@ -0,0 +1,139 @@
+import datetime
+import random
+import re
+import smtplib
+from typing import Optional
+
+from anymail.exceptions import AnymailAPIError, AnymailRecipientsRefused
+
+from apps.backend_mailer.constants import BackendConstants
+from apps.backend_mailer.settings import get_max_retries, get_retry_policy
+from apps.backend_mailer.suppression import RecipientSuppressed
+
+ERROR_CLASS = BackendConstants.ERROR_CLASS
+
+# 421 closes the session, servers send it when a client connects too often
+THROTTLED_SMTP_CODES = {421}
+THROTTLED_SMTP_MESSAGE = re.compile(
+    r"rate limit|throttl|too many|try again later|exceeded|slow down", re.IGNORECASE
+)
+# Enhanced status codes of RFC 3463 that mean a policy or rate limit
+THROTTLED_ENHANCED_STATUS = re.compile(r"\b4\.7\.\d+\b")
+
+# botocore ClientError codes of SES
+THROTTLED_SES_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "LimitExceededException",
+}
+PERMANENT_SES_CODES = {
+    "MessageRejected",
+    "MailFromDomainNotVerified",
+    "MailFromDomainNotVerifiedException",
+    "InvalidParameterValue",
+    "BadRequestException",
+}
+
+# Rejections of the session rather than of an email
+BACKEND_ERRORS = (
+    smtplib.SMTPAuthenticationError,
+    smtplib.SMTPConnectError,
+    smtplib.SMTPHeloError,
+)
+
+SEVERITY = (ERROR_CLASS.throttled, ERROR_CLASS.transient, ERROR_CLASS.permanent)
+
+
+def classify_smtp_reply(code: int, message) -> str:
+    if isinstance(message, bytes):
+        message = message.decode("utf-8", "replace")
+    message = message or ""
+
+    if 500 <= code < 600:
+        return ERROR_CLASS.permanent
+    if (
+        code in THROTTLED_SMTP_CODES
+        or THROTTLED_SMTP_MESSAGE.search(message)
+        or THROTTLED_ENHANCED_STATUS.search(message)
+    ):
+        return ERROR_CLASS.throttled
+    return ERROR_CLASS.transient
+
+
+def classify_ses_error(code: Optional[str], message: str = "") -> str:
+    if code in THROTTLED_SES_CODES or THROTTLED_SMTP_MESSAGE.search(message or ""):
+        return ERROR_CLASS.throttled
+    if code in PERMANENT_SES_CODES:
+        return ERROR_CLASS.permanent
+    return ERROR_CLASS.transient
+
+
+def classify_error(exception) -> str:
+    """
+    Returns whether a delivery failure is permanent, transient or caused by
+    throttling. Errors that can't be told apart are transient.
+    """
+    if isinstance(exception, RecipientSuppressed):
+        return ERROR_CLASS.permanent
+    if isinstance(exception, smtplib.SMTPRecipientsRefused):
+        # Retried while any recipient may still accept it
+        classes = {
+            classify_smtp_reply(code, message)
+            for code, message in exception.recipients.values()
+        }
+        return next(
+            (error_class for error_class in SEVERITY if error_class in classes),
+            ERROR_CLASS.transient,
+        )
+    if isinstance(exception, BACKEND_ERRORS):
+        # Something is wrong with the backend, not with the email
+        return ERROR_CLASS.transient
+    if isinstance(exception, smtplib.SMTPResponseException):
+        return classify_smtp_reply(exception.smtp_code, exception.smtp_error)
+    if isinstance(exception, AnymailRecipientsRefused):
+        return ERROR_CLASS.permanent
+    if isinstance(exception, AnymailAPIError):
+        status_code = exception.status_code
+        if status_code == 429:
+            return ERROR_CLASS.throttled
+        if status_code is not None and 400 <= status_code < 500:
+            return ERROR_CLASS.permanent
+        return ERROR_CLASS.transient
+
+    response = getattr(exception, "response", None)
+    if isinstance(response, dict) and "Error" in response:
+        error = response["Error"]
+        return classify_ses_error(error.get("Code"), error.get("Message", ""))
+    return ERROR_CLASS.transient
+
+
+class RetryPolicy:
+    """
+    Decides if and when a failed email is retried, with exponential backoff
+    and jitter per error class, see ``RETRY_POLICY``.
+
+    Half of every delay is random, so emails that failed together don't
+    come back together.
+    """
+
+    def __init__(self, max_retries=None, policy=None):
+        self.max_retries = get_max_retries() if max_retries is None else max_retries
+        self.policy = get_retry_policy() if policy is None else policy
+
+    def get_max_retries(self, error_class: str) -> int:
+        if error_class == ERROR_CLASS.permanent:
+            return 0
+        return self.policy.get(error_class, {}).get("max_retries", self.max_retries)
+
+    def should_retry(self, exception, retries: int) -> bool:
+        return retries < self.get_max_retries(classify_error(exception))
+
+    def get_delay(self, error_class: str, retries: int) -> datetime.timedelta:
+        options = self.policy.get(error_class, self.policy[ERROR_CLASS.transient])
+        # The exponent is bounded to keep the timedelta in range
+        delay = min(options["base"] * 2 ** min(retries, 30), options["cap"])
+        return delay / 2 + delay / 2 * random.random()
+
+    def get_retry_time(self, exception, retries: int, now: datetime.datetime):
+        return now + self.get_delay(classify_error(exception), retries)
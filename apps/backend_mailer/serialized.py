@@ -0,0 +1,159 @@
+import hashlib
+import json
+import re
+import smtplib
+import threading
+from email.mime.base import MIMEBase
+from email.utils import make_msgid
+from typing import Dict, Iterable
+
+from django.core.mail.backends.smtp import EmailBackend as SMTPEmailBackend
+from django.core.mail.message import forbid_multi_line_headers, sanitize_address
+from django.core.mail.utils import DNS_NAME
+
+from apps.backend_mailer.settings import get_suppression_enabled, get_tracking_enabled
+
+CRLF = b"\r\n"
+LEADING_PERIOD = re.compile(rb"(?m)^\.")
+
+
+class SerializedMessage:
+    """
+    RFC 5322 bytes of a django ``EmailMessage`` without its To and
+    Message-ID headers.
+
+    The bytes are built once and shared by every copy of the message, the
+    headers of each copy are written in front of them.
+    """
+
+    def __init__(self, message):
+        self.encoding = message.encoding
+        self.from_email = sanitize_address(message.from_email, self.encoding)
+
+        mime_message = message.message()
+        del mime_message["To"]
+        del mime_message["Message-ID"]
+        self.body = mime_message.as_bytes(linesep="\r\n")
+        if not self.body.endswith(CRLF):
+            self.body += CRLF
+        # Dot-stuffed once for the DATA command, see RFC 5321 4.5.2
+        self.stuffed_body = LEADING_PERIOD.sub(b"..", self.body)
+
+    def get_headers(self, to: Iterable[str], message_id: str) -> bytes:
+        headers = b""
+        addresses = [
+            forbid_multi_line_headers("To", address, self.encoding)[1] for address in to
+        ]
+        if addresses:
+            # Folded after every address to stay within the line length limit
+            value = ",\n ".join(addresses).replace("\r\n", "\n")
+            headers += b"To: " + value.replace("\n", "\r\n").encode("ascii") + CRLF
+        return headers + b"Message-ID: " + message_id.encode("ascii") + CRLF
+
+    def as_bytes(self, to: Iterable[str], message_id: str) -> bytes:
+        return self.get_headers(to, message_id) + self.body
+
+    def as_data(self, to: Iterable[str], message_id: str) -> bytes:
+        """Returns the DATA payload of a copy, terminated by ``.``"""
+        return self.get_headers(to, message_id) + self.stuffed_body + b"." + CRLF
+
+
+def get_message_id(message) -> str:
+    for name, value in message.extra_headers.items():
+        if name.lower() == "message-id":
+            return value
+    return make_msgid(domain=DNS_NAME)
+
+
+def is_personalized(email) -> bool:
+    """
+    Emails rendered from a template on delivery differ per email. So do
+    campaign emails while tracking or suppression is enabled: their links
+    and List-Unsubscribe headers carry tokens of their own email, so the
+    message cache never shares them.
+    """
+    if email.template_id is not None and email.context is not None:
+        return True
+    return email.source_campaign_id is not None and (
+        get_tracking_enabled() or get_suppression_enabled()
+    )
+
+
+def get_content_key(message) -> str:
+    """
+    Returns a hash of everything that goes into a django ``EmailMessage``
+    except its To and Message-ID headers.
+    """
+    headers = {
+        name: value
+        for name, value in message.extra_headers.items()
+        if name.lower() != "message-id"
+    }
+    content = [
+        message.from_email,
+        message.cc,
+        message.reply_to,
+        message.subject,
+        message.body,
+        message.content_subtype,
+        getattr(message, "alternatives", []),
+        headers,
+        # Parts from an AttachmentCache are shared by identical emails
+        [
+            id(attachment) if isinstance(attachment, MIMEBase) else attachment
+            for attachment in message.attachments
+        ],
+    ]
+    return hashlib.sha256(
+        json.dumps(content, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+class MessageCache:
+    """
+    Serialized messages of one batch keyed by content, so emails with the
+    same content are serialized once and only differ in To and Message-ID.
+    """
+
+    def __init__(self):
+        self._messages = {}
+        self._lock = threading.Lock()
+
+    def get(self, message) -> SerializedMessage:
+        key = get_content_key(message)
+        with self._lock:
+            serialized = self._messages.get(key)
+        if serialized is None:
+            serialized = SerializedMessage(message)
+            with self._lock:
+                serialized = self._messages.setdefault(key, serialized)
+        return serialized
+
+
+def send_serialized(connection, message, message_cache) -> Dict[str, Exception]:
+    """
+    Sends ``message`` to all its recipients from the bytes it shares with
+    identical messages in ``message_cache``, only its own To and Message-ID
+    are written per send. Other than SMTP backends serialize it themselves.
+    Returns the recipients the server refused, when others were accepted.
+    """
+    if not isinstance(connection, SMTPEmailBackend):
+        message.connection = connection
+        message.send()
+        return {}
+
+    serialized = message_cache.get(message)
+    connection.open()
+    addresses = {
+        sanitize_address(recipient, message.encoding): recipient
+        for recipient in message.recipients()
+    }
+    refused = connection.connection.sendmail(
+        serialized.from_email,
+        list(addresses),
+        serialized.as_bytes(message.to, get_message_id(message)),
+    )
+    return {
+        addresses[address]: smtplib.SMTPRecipientsRefused({address: reply})
+        for address, reply in refused.items()
+    }
@@ -11,6 +11,7 @@ from django.utils.module_loading import import_string
 import datetime
 from cryptography.fernet import Fernet
 from config.settings import FERNET_SECRET_KEY
+from apps.backend_mailer.constants import BackendConstants
 
 
 fernet = Fernet(FERNET_SECRET_KEY)
@@ -105,6 +106,11 @@ def get_log_level():
     return get_config().get("LOG_LEVEL", 2)
 
 
+# Recipients validated and written per COPY by mail.send_stream()
+def get_enqueue_chunk_size():
+    return get_config().get("ENQUEUE_CHUNK_SIZE", 5000)
+
+
 def get_sending_order():
     return get_config().get("SENDING_ORDER", ["-priority"])
 
@@ -114,6 +120,20 @@ def get_template_engine():
     return template_engines[using]
 
 
+# Encoded attachment bytes kept per batch, defaults to 64 MiB
+def get_attachment_cache_size():
+    return get_config().get("ATTACHMENT_CACHE_SIZE", 64 * 1024 * 1024)
+
+
+def get_template_cache_size():
+    return get_config().get("TEMPLATE_CACHE_SIZE", 256)
+
+
+# Validated domain parts kept by the email validator
+def get_email_domain_cache_size():
+    return get_config().get("EMAIL_DOMAIN_CACHE_SIZE", 4096)
+
+
 def get_override_recipients():
     return get_config().get("OVERRIDE_RECIPIENTS", None)
 
@@ -126,6 +146,160 @@ def get_retry_timedelta():
     return get_config().get("RETRY_INTERVAL", datetime.timedelta(minutes=15))
 
 
+# Backoff per error class, "base" doubles with every retry up to "cap" and
+# "max_retries" overrides MAX_RETRIES, permanent errors are never retried
+def get_retry_policy():
+    policy = {
+        "transient": {
+            "base": datetime.timedelta(minutes=1),
+            "cap": get_retry_timedelta(),
+        },
+        "throttled": {
+            "base": datetime.timedelta(minutes=5),
+            "cap": datetime.timedelta(hours=2),
+        },
+    }
+    for error_class, options in get_config().get("RETRY_POLICY", {}).items():
+        policy[error_class] = {**policy.get(error_class, {}), **options}
+    return policy
+
+
+# Walk the queue once per pass with a keyset cursor instead of re-querying
+def get_streaming_drain():
+    return get_config().get("STREAMING_DRAIN", False)
+
+
+def get_claim_enabled():
+    return get_config().get("CLAIM_ENABLED", False)
+
+
+# Claimed emails not finalized within this lease are handed to another sender
+def get_claim_lease():
+    return get_config().get("CLAIM_LEASE", datetime.timedelta(minutes=10))
+
+
+# Emails, logs and sent messages older than this move to the archive table
+def get_archive_after():
+    return get_config().get("ARCHIVE_AFTER", datetime.timedelta(days=90))
+
+
+# Monthly archive partitions older than this are dropped
+def get_archive_retention():
+    return get_config().get("ARCHIVE_RETENTION", datetime.timedelta(days=365))
+
+
+# Detach expired partitions into standalone tables instead of dropping them
+def get_archive_detach():
+    return get_config().get("ARCHIVE_DETACH", False)
+
+
+def get_archive_batch_size():
+    return get_config().get("ARCHIVE_BATCH_SIZE", 5000)
+
+
+def get_attachment_gc_batch_size():
+    return get_config().get("ATTACHMENT_GC_BATCH_SIZE", 1000)
+
+
+# Threads deleting files of orphaned attachments from storage
+def get_attachment_gc_threads():
+    return get_config().get("ATTACHMENT_GC_THREADS", 8)
+
+
+def get_wakeup_enabled():
+    return get_config().get("WAKEUP_ENABLED", False)
+
+
+# Seconds a wakeup for low and medium priority emails waits for more emails
+def get_wakeup_debounce():
+    return get_config().get("WAKEUP_DEBOUNCE", 0.5)
+
+
+# A drain whose heartbeat stops renewing this lease is assumed dead
+def get_wakeup_lease():
+    return get_config().get("WAKEUP_LEASE", datetime.timedelta(minutes=10))
+
+
+# Drain every priority in its own Celery queue, see lanes.py
+def get_lanes_enabled():
+    return get_config().get("LANES_ENABLED", False)
+
+
+# Processes of one drain per lane name, lanes not listed use one
+def get_lane_processes():
+    return get_config().get("LANE_PROCESSES", {})
+
+
+# Seconds a lane drain runs before it hands its worker slot back
+def get_lane_time_slice():
+    return get_config().get("LANE_TIME_SLICE", 60)
+
+
+# Low priority emails waiting longer than this are promoted to medium
+def get_lane_max_wait():
+    return get_config().get("LANE_MAX_WAIT", datetime.timedelta(minutes=30))
+
+
+# Emails of a campaign released into the queue per wave, unless the
+# campaign sets its own wave_size
+def get_campaign_wave_size():
+    return get_config().get("CAMPAIGN_WAVE_SIZE", 1000)
+
+
+def get_campaign_wave_interval():
+    return get_config().get("CAMPAIGN_WAVE_INTERVAL", datetime.timedelta(minutes=1))
+
+
+# Buffer campaign delivery counters in Redis, see mailers.stats
+def get_campaign_stats_enabled():
+    return get_config().get("CAMPAIGN_STATS_ENABLED", False)
+
+
+# Add an open pixel and tracked links to the html of campaign emails
+def get_tracking_enabled():
+    return get_config().get("TRACKING_ENABLED", False)
+
+
+# Scheme and host tracking URLs point to, defaults to MAIN_HOST
+def get_tracking_host():
+    return get_config().get("TRACKING_HOST", None)
+
+
+# Approximate number of tracking events the Redis stream keeps
+def get_tracking_stream_maxlen():
+    return get_config().get("TRACKING_STREAM_MAXLEN", 1000000)
+
+
+def get_tracking_batch_size():
+    return get_config().get("TRACKING_BATCH_SIZE", 1000)
+
+
+# Drop suppressed recipients before sending, see suppression.py
+def get_suppression_enabled():
+    return get_config().get("SUPPRESSION_ENABLED", False)
+
+
+# Where the Bloom filter of suppressed addresses lives, "redis" or "local".
+# A "local" filter only learns the suppressions added by its own process,
+# the others pick them up on their next SUPPRESSION_REFRESH reload.
+def get_suppression_bloom():
+    return get_config().get("SUPPRESSION_BLOOM", "redis")
+
+
+# Addresses the Bloom filter is sized for at SUPPRESSION_ERROR_RATE
+def get_suppression_capacity():
+    return get_config().get("SUPPRESSION_CAPACITY", 1000000)
+
+
+def get_suppression_error_rate():
+    return get_config().get("SUPPRESSION_ERROR_RATE", 0.001)
+
+
+# A "local" Bloom filter is reloaded from the database this often
+def get_suppression_refresh():
+    return get_config().get("SUPPRESSION_REFRESH", datetime.timedelta(minutes=5))
+
+
 def get_message_id_enabled():
     return get_config().get("MESSAGE_ID_ENABLED", False)
 
@@ -139,6 +313,106 @@ def get_batch_delivery_timeout():
     return get_config().get("BATCH_DELIVERY_TIMEOUT", 180)
 
 
+# ENGINE is either "default" (processes + thread pool) or "threaded" (one
+# process, SMTP sessions on a larger thread pool capped per backend)
+def get_engine():
+    return get_config().get("ENGINE", BackendConstants.ENGINE_DEFAULT)
+
+
+# Threads blocked in SMTP sessions at once with the threaded engine
+def get_threaded_max_concurrency():
+    return get_config().get("THREADED_MAX_CONCURRENCY", 200)
+
+
+def get_threaded_backend_concurrency():
+    return get_config().get("THREADED_BACKEND_CONCURRENCY", 20)
+
+
+def get_rate_limit_enabled():
+    return get_config().get("RATE_LIMIT_ENABLED", False)
+
+
+# Rates are in recipients per second, None means unlimited
+def get_backend_rate_limit():
+    return get_config().get("BACKEND_RATE_LIMIT", None)
+
+
+def get_backend_rate_limits():
+    return get_config().get("BACKEND_RATE_LIMITS", {})
+
+
+def get_domain_rate_limits():
+    return get_config().get("DOMAIN_RATE_LIMITS", {})
+
+
+# Token buckets hold this many seconds worth of tokens
+def get_rate_limit_burst():
+    return get_config().get("RATE_LIMIT_BURST", 1)
+
+
+# Send every To/Bcc recipient its own copy of the rendered message
+def get_fanout_enabled():
+    return get_config().get("FANOUT_ENABLED", False)
+
+
+# Serialize identical, non-personalized emails of a batch only once. Campaign
+# emails aren't shared while TRACKING_ENABLED or SUPPRESSION_ENABLED add
+# tokens of their own email to them.
+def get_message_cache_enabled():
+    return get_config().get("MESSAGE_CACHE_ENABLED", False)
+
+
+def get_adaptive_enabled():
+    return get_config().get("ADAPTIVE_ENABLED", False)
+
+
+# (min, max) bounds the adaptive controller keeps the batch size within
+def get_adaptive_batch_size():
+    return get_config().get("ADAPTIVE_BATCH_SIZE", (10, 1000))
+
+
+# (min, max) concurrent sends per email backend under the adaptive controller
+def get_adaptive_concurrency():
+    return get_config().get("ADAPTIVE_CONCURRENCY", (1, 50))
+
+
+# Mean seconds per message above which a backend is considered congested
+def get_adaptive_target_latency():
+    return get_config().get("ADAPTIVE_TARGET_LATENCY", 2.0)
+
+
+def get_adaptive_max_failure_rate():
+    return get_config().get("ADAPTIVE_MAX_FAILURE_RATE", 0.1)
+
+
+# Seconds of sending the adaptive batch size aims for
+def get_adaptive_batch_duration():
+    return get_config().get("ADAPTIVE_BATCH_DURATION", 30)
+
+
+def get_connection_pool_size():
+    """Max open connections per email backend, defaults to THREADS_PER_PROCESS"""
+    return get_config().get("CONNECTION_POOL_SIZE", get_threads_per_process())
+
+
+def get_connection_max_messages():
+    return get_config().get("CONNECTION_MAX_MESSAGES", 100)
+
+
+def get_backend_config_cache_size():
+    return get_config().get("BACKEND_CONFIG_CACHE_SIZE", 128)
+
+
+# Decrypted backend configs are kept in memory for at most this many seconds
+def get_backend_config_cache_ttl():
+    return get_config().get("BACKEND_CONFIG_CACHE_TTL", 300)
+
+
+# Pooled connections idle longer than this (in seconds) are checked before reuse
+def get_connection_idle_timeout():
+    return get_config().get("CONNECTION_IDLE_TIMEOUT", 30)
+
+
 CONTEXT_FIELD_CLASS = get_config().get(
     "CONTEXT_FIELD_CLASS", "django.db.models.JSONField"
 )
@@ -0,0 +1,365 @@
+import hashlib
+import math
+import re
+import smtplib
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+import redis
+from django.utils import timezone
+
+from apps.backend_mailer.constants import BackendConstants
+from apps.backend_mailer.logutils import setup_loghandlers
+from apps.backend_mailer.models import Suppression
+from apps.backend_mailer.settings import (
+    get_suppression_bloom,
+    get_suppression_capacity,
+    get_suppression_enabled,
+    get_suppression_error_rate,
+    get_suppression_refresh,
+)
+from apps.backend_mailer.validators import get_recipient
+from config.settings import REDIS_URL
+
+logger = setup_loghandlers("INFO")
+
+REASON = BackendConstants.SUPPRESSION_REASON
+
+# Replies refusing the mailbox itself rather than the message, e.g.
+# "550 5.1.1 User unknown". Policy rejections (5.7.x) aren't bounces.
+HARD_BOUNCE_CODES = {550, 551, 553}
+HARD_BOUNCE_STATUS = re.compile(r"\b5\.1\.\d+\b")
+POLICY_STATUS = re.compile(r"\b5\.7\.\d+\b")
+
+# Addresses looked up or written per query
+QUERY_BATCH_SIZE = 5000
+
+
+class RecipientSuppressed(Exception):
+    """Every recipient of an email is on the suppression list."""
+
+    def __init__(self, addresses):
+        self.addresses = sorted(addresses)
+        super().__init__("Suppressed recipients: %s" % ", ".join(self.addresses))
+
+
+def normalize_address(address: str) -> str:
+    """Lowercased address without its display name."""
+    return get_recipient(address).strip().lower()
+
+
+class BloomFilter:
+    """
+    In-process Bloom filter of addresses. Bits are laid out like a Redis
+    bitmap, so a filter built here can be copied to Redis as is.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def get_positions(self, address: str) -> List[int]:
+        # Double hashing derives every position from a single digest
+        digest = hashlib.blake2b(address.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "big")
+        second = int.from_bytes(digest[8:], "big") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, addresses: Iterable[str]) -> None:
+        for address in addresses:
+            for position in self.get_positions(address):
+                self.bits[position >> 3] |= 0x80 >> (position & 7)
+
+    def contains(self, addresses: List[str]) -> List[bool]:
+        """Whether each address may be suppressed, never wrong when False."""
+        return [
+            all(
+                self.bits[position >> 3] & (0x80 >> (position & 7))
+                for position in self.get_positions(address)
+            )
+            for address in addresses
+        ]
+
+
+class FilterNotBuilt(Exception):
+    """The Redis bitmap wasn't built from the database yet, or went stale."""
+
+
+class RedisBloomFilter(BloomFilter):
+    """
+    The Bloom filter kept as a Redis bitmap shared by every sender, the
+    addresses of a batch are looked up in one round trip. The bitmap is
+    only trusted while its ready marker is set: a full build sets it and a
+    failed add removes it, so bits set on a missing or partial bitmap never
+    hide a suppressed address.
+    """
+
+    # Seconds a build may hold the lock before another sender takes over
+    BUILD_TIMEOUT = 600
+
+    def __init__(self, capacity: int, error_rate: float, client=None):
+        super().__init__(capacity, error_rate)
+        self.bits = None
+        self.client = client or redis.StrictRedis.from_url(REDIS_URL)
+        # Filters sized differently live under different keys
+        self.key = "post_office:suppression:bloom:%s:%s" % (self.size, self.hashes)
+        self.ready_key = self.key + ":ready"
+        self.lock_key = self.key + ":lock"
+
+    def add(self, addresses: Iterable[str]) -> None:
+        pipeline = self.client.pipeline(transaction=False)
+        for address in addresses:
+            for position in self.get_positions(address):
+                pipeline.setbit(self.key, position, 1)
+        pipeline.execute()
+
+    def contains(self, addresses: List[str]) -> List[bool]:
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.exists(self.ready_key)
+        for address in addresses:
+            for position in self.get_positions(address):
+                pipeline.getbit(self.key, position)
+        ready, *bits = pipeline.execute()
+        if not ready:
+            raise FilterNotBuilt(self.key)
+        hits = []
+        for index in range(len(addresses)):
+            start = index * self.hashes
+            end = start + self.hashes
+            hits.append(all(bits[start:end]))
+        return hits
+
+    def replace(self, bloom: BloomFilter) -> None:
+        """
+        Swaps the bitmap for the bits of a filter built in memory. It isn't
+        trusted until ``mark_ready``, once addresses suppressed meanwhile
+        were added.
+        """
+        temp_key = self.key + ":rebuild"
+        pipeline = self.client.pipeline()
+        pipeline.set(temp_key, bytes(bloom.bits))
+        pipeline.delete(self.ready_key)
+        pipeline.rename(temp_key, self.key)
+        pipeline.execute()
+
+    def mark_ready(self) -> None:
+        self.client.set(self.ready_key, 1)
+
+    def mark_stale(self) -> None:
+        self.client.delete(self.ready_key)
+
+    def acquire_build_lock(self) -> bool:
+        return bool(self.client.set(self.lock_key, 1, nx=True, ex=self.BUILD_TIMEOUT))
+
+    def release_build_lock(self) -> None:
+        self.client.delete(self.lock_key)
+
+
+def iter_suppressed_addresses(since=None) -> Iterable[str]:
+    suppressions = Suppression.objects.all()
+    if since is not None:
+        suppressions = suppressions.filter(created__gte=since)
+    return suppressions.values_list("address", flat=True).iterator(
+        chunk_size=QUERY_BATCH_SIZE
+    )
+
+
+def build_filter() -> BloomFilter:
+    bloom = BloomFilter(get_suppression_capacity(), get_suppression_error_rate())
+    bloom.add(iter_suppressed_addresses())
+    return bloom
+
+
+_filter = None
+_filter_loaded_at = None
+
+
+def get_suppression_filter() -> Optional[BloomFilter]:
+    """
+    Returns the Bloom filter of this process, or None when suppression is
+    disabled. A "local" filter is reloaded every ``SUPPRESSION_REFRESH``.
+    """
+    global _filter, _filter_loaded_at
+    if not get_suppression_enabled():
+        return None
+
+    if get_suppression_bloom() == "redis":
+        if not isinstance(_filter, RedisBloomFilter):
+            _filter = RedisBloomFilter(
+                get_suppression_capacity(), get_suppression_error_rate()
+            )
+        return _filter
+
+    refresh = get_suppression_refresh().total_seconds()
+    if (
+        _filter is None
+        or isinstance(_filter, RedisBloomFilter)
+        or time.monotonic() - _filter_loaded_at > refresh
+    ):
+        _filter = build_filter()
+        _filter_loaded_at = time.monotonic()
+    return _filter
+
+
+def rebuild_suppression_filter() -> bool:
+    """
+    Rebuilds the Redis Bloom filter from the database, dropping addresses
+    that were unsuppressed. Addresses suppressed while it was built are
+    added before it's trusted again. Returns False when another sender is
+    already building it.
+    """
+    bloom = get_suppression_filter()
+    if not isinstance(bloom, RedisBloomFilter):
+        return False
+    if not bloom.acquire_build_lock():
+        return False
+
+    try:
+        started = timezone.now()
+        bloom.replace(build_filter())
+        bloom.add(iter_suppressed_addresses(since=started))
+        bloom.mark_ready()
+    finally:
+        bloom.release_build_lock()
+    logger.info("Rebuilt the suppression filter")
+    return True
+
+
+def get_suppressed(addresses: Iterable[str]) -> Set[str]:
+    """
+    Returns the normalized addresses that are suppressed. Only addresses
+    the Bloom filter matches are confirmed by the database. A Redis filter
+    that isn't built is built first, every address is checked in the
+    database meanwhile.
+    """
+    bloom = get_suppression_filter()
+    if bloom is None:
+        return set()
+
+    addresses = sorted({normalize_address(address) for address in addresses} - {""})
+    if not addresses:
+        return set()
+    try:
+        hits = [
+            address for address, hit in zip(addresses, bloom.contains(addresses)) if hit
+        ]
+    except FilterNotBuilt:
+        logger.info("Suppression filter isn't built, checking the database")
+        hits = addresses
+        try:
+            rebuild_suppression_filter()
+        except redis.RedisError as e:
+            logger.warning("Suppression filter couldn't be built: %s" % e)
+    except redis.RedisError as e:
+        logger.warning("Suppression filter unavailable, checking the database: %s" % e)
+        hits = addresses
+
+    suppressed = set()
+    for start in range(0, len(hits), QUERY_BATCH_SIZE):
+        end = start + QUERY_BATCH_SIZE
+        batch = hits[start:end]
+        suppressed.update(
+            Suppression.objects.filter(address__in=batch).values_list(
+                "address", flat=True
+            )
+        )
+    return suppressed
+
+
+def add_to_filter(addresses: Iterable[str]) -> None:
+    bloom = get_suppression_filter()
+    if bloom is None:
+        return
+    try:
+        bloom.add(addresses)
+    except redis.RedisError as e:
+        logger.warning("Suppression filter unavailable: %s" % e)
+        if not isinstance(bloom, RedisBloomFilter):
+            return
+        # Without these addresses the bitmap can't be trusted until the
+        # next build
+        try:
+            bloom.mark_stale()
+        except redis.RedisError as e:
+            logger.error("Suppression filter couldn't be marked stale: %s" % e)
+
+
+def add_suppressions(details: Dict[str, str], reason: int) -> None:
+    """Adds ``{address: detail}`` to the list and the Bloom filter."""
+    details = {
+        normalize_address(address): detail for address, detail in details.items()
+    }
+    details.pop("", None)
+    if not details:
+        return
+    Suppression.objects.bulk_create(
+        [
+            Suppression(address=address, reason=reason, detail=detail)
+            for address, detail in sorted(details.items())
+        ],
+        batch_size=QUERY_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+    add_to_filter(details)
+    logger.info("Suppressed %s addresses" % len(details))
+
+
+def suppress(
+    addresses: Iterable[str], reason: int = REASON.manual, detail: str = ""
+) -> None:
+    """
+    Adds addresses to the suppression list, addresses that are already on
+    it keep their reason.
+    """
+    add_suppressions(dict.fromkeys(addresses, detail), reason)
+
+
+def unsuppress(addresses: Iterable[str]) -> int:
+    """
+    Removes addresses from the suppression list. They stay in the Bloom
+    filter until it is rebuilt, which only costs a database lookup.
+    """
+    addresses = sorted({normalize_address(address) for address in addresses})
+    deleted, _ = Suppression.objects.filter(address__in=addresses).delete()
+    return deleted
+
+
+def is_hard_bounce(code: int, message) -> bool:
+    if isinstance(message, bytes):
+        message = message.decode("utf-8", "replace")
+    message = message or ""
+    if HARD_BOUNCE_STATUS.search(message):
+        return True
+    return code in HARD_BOUNCE_CODES and not POLICY_STATUS.search(message)
+
+
+def get_hard_bounces(failed_emails, refused_recipients=None) -> Dict[str, str]:
+    """
+    Returns the recipients whose mailbox was refused permanently, with the
+    reply of the server, from the failures of a batch.
+    """
+    exceptions = [exception for _, exception in failed_emails]
+    for refused in (refused_recipients or {}).values():
+        exceptions.extend(refused.values())
+
+    bounces = {}
+    for exception in exceptions:
+        if not isinstance(exception, smtplib.SMTPRecipientsRefused):
+            continue
+        for address, (code, message) in exception.recipients.items():
+            if is_hard_bounce(code, message):
+                if isinstance(message, bytes):
+                    message = message.decode("utf-8", "replace")
+                bounces[address] = "%s %s" % (code, message)
+    return bounces
+
+
+def record_hard_bounces(failed_emails, refused_recipients=None) -> None:
+    if get_suppression_enabled():
+        add_suppressions(
+            get_hard_bounces(failed_emails, refused_recipients), REASON.hard_bounce
+        )
@@ -6,13 +6,30 @@ of auto-discovering tasks in "tasks" submodules.
 """
 
 import datetime
+import time
 
+from django.db import transaction
 from django.utils.timezone import now
 
+from apps.backend_mailer.archive import archive_expired_mails
+from apps.backend_mailer.attachment_gc import collect_orphan_attachments
+from apps.backend_mailer.lanes import (
+    LANES,
+    LANES_BY_NAME,
+    drain_lane,
+    group_by_lane,
+    promote_starved,
+)
 from apps.backend_mailer.mail import send_queued_mail_until_done
+from apps.backend_mailer.suppression import rebuild_suppression_filter
 from apps.backend_mailer.utils import cleanup_expired_mails
+from apps.backend_mailer.wakeup import get_queue_wakeup, get_wakeup_countdown
 
-from apps.backend_mailer.settings import get_celery_enabled
+from apps.backend_mailer.settings import (
+    get_celery_enabled,
+    get_lane_time_slice,
+    get_lanes_enabled,
+)
 
 try:
     if get_celery_enabled():
@@ -32,15 +49,86 @@ else:
     @shared_task(ignore_result=True)
     def send_queued_mail(*args, **kwargs):
         """
-        To be called by the Celery task manager.
+        To be called by the Celery task manager. Wakeups pass the token of
+        their drain, periodic runs only drain when no drain is in flight.
         """
-        send_queued_mail_until_done()
+        if get_lanes_enabled():
+            # Every lane is drained by the workers of its own queue
+            for lane in LANES:
+                send_lane_mail.apply_async(args=(lane.name,), queue=lane.queue)
+            return
+
+        wakeup = get_queue_wakeup()
+        if wakeup is None:
+            send_queued_mail_until_done()
+            return
+        wakeup.run(send_queued_mail_until_done, kwargs.get("token"))
+
+    @shared_task(ignore_result=True)
+    def send_lane_mail(lane_name, token=None):
+        """
+        Drains one priority lane. A drain that used up its time slice hands
+        its worker slot back and queues the rest of the lane behind the
+        tasks already waiting on the lane's queue.
+        """
+        lane = LANES_BY_NAME[lane_name]
+        deadline = time.monotonic() + get_lane_time_slice()
+        drained = []
+
+        def drain():
+            drained.append(time.monotonic() < deadline and drain_lane(lane, deadline))
+
+        wakeup = get_queue_wakeup(lane.name)
+        if wakeup is None:
+            drain()
+        elif not wakeup.run(drain, token):
+            return
+
+        if not all(drained):
+            send_lane_mail.apply_async(args=(lane.name,), queue=lane.queue)
+
+    @shared_task(ignore_result=True)
+    def promote_starved_mail(*args, **kwargs):
+        """
+        Moves long waiting low priority emails to the medium lane.
+        """
+        if get_lanes_enabled():
+            promote_starved()
+
+    def wake_drain(task, wakeup, emails, **options):
+        if wakeup is None:
+            task.apply_async(**options)
+            return
+        countdown = get_wakeup_countdown(emails)
+
+        def wake():
+            token = wakeup.notify()
+            if token is not None:
+                task.apply_async(
+                    kwargs={"token": token}, countdown=countdown, **options
+                )
+
+        # The drain has to see the emails, so wait for them to be committed
+        transaction.on_commit(wake)
 
     def queued_mail_handler(sender, **kwargs):
         """
-        Trigger an asynchronous mail delivery.
+        Trigger an asynchronous mail delivery, unless one is already in flight.
+        With lanes, the drain of every lane the emails belong to is woken.
         """
-        send_queued_mail.delay()
+        emails = kwargs.get("emails")
+        if not get_lanes_enabled():
+            wake_drain(send_queued_mail, get_queue_wakeup(), emails)
+            return
+
+        for lane, lane_emails in group_by_lane(emails).items():
+            wake_drain(
+                send_lane_mail,
+                get_queue_wakeup(lane.name),
+                lane_emails,
+                args=(lane.name,),
+                queue=lane.queue,
+            )
 
     @shared_task(ignore_result=True)
     def cleanup_mail(*args, **kwargs):
@@ -48,3 +136,24 @@ else:
         cutoff_date = now() - datetime.timedelta(days)
         delete_attachments = kwargs.get("delete_attachments", True)
         cleanup_expired_mails(cutoff_date, delete_attachments)
+
+    @shared_task(ignore_result=True)
+    def archive_mail(*args, **kwargs):
+        """
+        Moves old mails into the archive partitions and expires old partitions.
+        """
+        archive_expired_mails()
+
+    @shared_task(ignore_result=True)
+    def cleanup_attachments(*args, **kwargs):
+        """
+        Deletes attachments no email refers to along with their files.
+        """
+        collect_orphan_attachments(dry_run=kwargs.get("dry_run", False))
+
+    @shared_task(ignore_result=True)
+    def rebuild_suppression(*args, **kwargs):
+        """
+        Rebuilds the Bloom filter of suppressed addresses from the database.
+        """
+        rebuild_suppression_filter()
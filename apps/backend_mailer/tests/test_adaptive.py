@@ -0,0 +1,84 @@
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+
+from apps.backend_mailer import mail
+from apps.backend_mailer.adaptive import AdaptiveController
+
+
+@override_settings(POST_OFFICE={"BATCH_SIZE": 100, "THREADS_PER_PROCESS": 4})
+class AdaptiveControllerTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_adaptive
+    """
+
+    def make_controller(self):
+        return AdaptiveController(
+            batch_size=(10, 1000),
+            concurrency=(1, 32),
+            target_latency=1.0,
+            max_failure_rate=0.1,
+            batch_duration=10,
+        )
+
+    def send(self, controller, backend_id, count, latency, failed=0):
+        for i in range(count):
+            controller.record(backend_id, latency, success=i >= failed)
+
+    def test_fast_backend_grows(self):
+        controller = self.make_controller()
+
+        self.send(controller, 1, 100, latency=0.1)
+        controller.end_batch(email_count=100, elapsed=1)
+        self.assertEqual(controller.concurrency(1), 8)
+        # 100 emails per second for 10 seconds, halfway from 100
+        self.assertEqual(controller.batch_size, 550)
+
+        self.send(controller, 1, 10, latency=0.1)
+        controller.end_batch(email_count=10, elapsed=1)
+        self.assertEqual(controller.concurrency(1), 16)
+        # A partial batch leaves the batch size alone
+        self.assertEqual(controller.batch_size, 550)
+
+    def test_slow_backend_shrinks(self):
+        controller = self.make_controller()
+
+        self.send(controller, 1, 100, latency=0.1)
+        self.send(controller, 2, 100, latency=3)
+        controller.end_batch(email_count=200, elapsed=1)
+
+        self.assertEqual(controller.concurrency(1), 8)
+        self.assertEqual(controller.concurrency(2), 2)
+        self.assertEqual(controller.batch_size, 50)
+
+        # Grows linearly past the threshold set by the congestion
+        self.send(controller, 2, 10, latency=0.1)
+        controller.end_batch(email_count=10, elapsed=1)
+        self.assertEqual(controller.concurrency(2), 3)
+
+    def test_failures_shrink_within_bounds(self):
+        controller = self.make_controller()
+
+        for _ in range(5):
+            self.send(controller, 1, 10, latency=0.1, failed=5)
+            controller.end_batch(email_count=10, elapsed=1)
+
+        self.assertEqual(controller.concurrency(1), 1)
+        self.assertEqual(controller.batch_size, 10)
+
+
+class AdaptiveSendTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_adaptive
+    """
+
+    @patch.object(mail, "_finalize_batch")
+    @patch.object(mail, "_create_sent_messages")
+    @patch.object(mail, "_prepare_emails", return_value=([], []))
+    @patch.object(mail, "get_adaptive_controller")
+    def test_forked_sends_dont_use_the_controller(self, get_controller, *mocks):
+        mail._send_bulk([], uses_multiprocessing=True, log_level=0)
+        get_controller.assert_not_called()
+
+        mail._send_bulk([], uses_multiprocessing=False, log_level=0)
+        get_controller.assert_called_once_with()
@@ -0,0 +1,226 @@
+import datetime
+from unittest.mock import MagicMock, patch
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from apps.backend_mailer import archive, utils
+from apps.backend_mailer.archive import get_partition_name, iter_months
+from apps.backend_mailer.constants import BackendConstants
+from apps.backend_mailer.models import Email, Log, SentMessages
+from apps.backend_mailer.tests.test_bulk import CursorProxy
+from apps.mailers.models import Campaign
+from apps.users.models import User
+
+
+def utc(*args):
+    return datetime.datetime(*args, tzinfo=datetime.timezone.utc)
+
+
+class ArchivePartitionTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_archive
+    """
+
+    def setUp(self):
+        self.cursor = MagicMock()
+        self.executed = self.cursor.__enter__.return_value.execute
+        proxy = CursorProxy(archive.connection, self.cursor)
+        patcher = patch.object(archive, "connection", proxy)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_months_span_the_year_boundary(self):
+        months = list(iter_months(utc(2025, 11, 17, 8), utc(2026, 2, 1)))
+
+        self.assertEqual(
+            months,
+            [utc(2025, 11, 1), utc(2025, 12, 1), utc(2026, 1, 1), utc(2026, 2, 1)],
+        )
+        self.assertEqual(
+            get_partition_name(months[1]), "backend_mailer_archive_y2025m12"
+        )
+
+    def test_partitions_are_created_per_month(self):
+        self.cursor.fetchall.return_value = []
+
+        archive.ensure_partitions(self.cursor, utc(2026, 1, 20), utc(2026, 2, 3))
+
+        self.assertEqual(self.cursor.execute.call_count, 3)
+        sql, params = self.cursor.execute.call_args.args
+        self.assertIn('"backend_mailer_archive_y2026m02" PARTITION OF', sql)
+        self.assertEqual(params, [utc(2026, 2, 1), utc(2026, 3, 1)])
+
+    def test_detached_partitions_are_attached_again(self):
+        self.cursor.fetchall.return_value = [("backend_mailer_archive_y2026m01",)]
+
+        archive.ensure_partitions(
+            self.cursor, utc(2026, 1, 20), utc(2026, 2, 3), reattach=True
+        )
+
+        names, _ = self.cursor.execute.call_args_list[0].args[1]
+        self.assertEqual(
+            names,
+            ["backend_mailer_archive_y2026m01", "backend_mailer_archive_y2026m02"],
+        )
+        sql, params = self.cursor.execute.call_args_list[1].args
+        self.assertEqual(
+            sql,
+            'ALTER TABLE "backend_mailer_archive" ATTACH PARTITION '
+            '"backend_mailer_archive_y2026m01" FOR VALUES FROM (%s) TO (%s)',
+        )
+        self.assertEqual(params, [utc(2026, 1, 1), utc(2026, 2, 1)])
+        self.assertIn("CREATE TABLE", self.cursor.execute.call_args_list[2].args[0])
+
+    def test_unattached_partition_tables_are_refused(self):
+        self.cursor.fetchall.return_value = [("backend_mailer_archive_y2026m02",)]
+
+        with self.assertRaises(archive.PartitionConflict):
+            archive.ensure_partitions(self.cursor, utc(2026, 1, 20), utc(2026, 2, 3))
+
+    def test_only_partitions_past_retention_are_dropped(self):
+        self.cursor.__enter__.return_value.fetchall.return_value = [
+            ("backend_mailer_archive_y2026m03",),
+            ("backend_mailer_archive_y2026m01",),
+            ("backend_mailer_archive_y2026m02",),
+            ("backend_mailer_archive_detached",),
+        ]
+
+        expired = archive.expire_partitions(utc(2026, 3, 1))
+
+        self.assertEqual(
+            expired,
+            ["backend_mailer_archive_y2026m01", "backend_mailer_archive_y2026m02"],
+        )
+        self.assertEqual(
+            self.executed.call_args.args[0],
+            'DROP TABLE "backend_mailer_archive_y2026m02"',
+        )
+
+    def test_partitions_can_be_detached(self):
+        self.cursor.__enter__.return_value.fetchall.return_value = [
+            ("backend_mailer_archive_y2026m01",),
+        ]
+
+        archive.expire_partitions(utc(2026, 3, 1), detach=True)
+
+        self.assertEqual(
+            self.executed.call_args.args[0],
+            'ALTER TABLE "backend_mailer_archive" '
+            'DETACH PARTITION "backend_mailer_archive_y2026m01"',
+        )
+
+    def test_rows_are_moved_in_one_statement(self):
+        self.cursor.fetchall.return_value = [(1,), (2,)]
+
+        moved = archive._move_rows(
+            self.cursor, Email, "created", "id = ANY(%s)", [[1, 2]]
+        )
+
+        self.assertEqual(moved, [1, 2])
+        sql, params = self.cursor.execute.call_args.args
+        self.assertTrue(
+            sql.startswith(
+                'WITH moved AS (DELETE FROM "backend_mailer_email" WHERE id = ANY(%s)'
+            )
+        )
+        self.assertIn("to_jsonb(moved)", sql)
+        self.assertEqual(params, [[1, 2], "backend_mailer_email"])
+
+
+class CleanupExpiredMailsTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_archive
+    """
+
+    @patch.object(utils, "Email")
+    def test_deleted_emails_are_counted(self, email_model):
+        email_model.objects.filter.return_value.values_list.return_value.__getitem__.side_effect = [
+            [1, 2],
+            [],
+        ]
+        email_model.objects.filter.return_value.delete.return_value = (
+            5,
+            {"backend_mailer.Email": 2, "backend_mailer.Log": 3},
+        )
+
+        deleted = utils.cleanup_expired_mails(utc(2026, 1, 1), delete_attachments=False)
+
+        self.assertEqual(deleted, (2, 0))
+
+
+class ArchiveDatabaseTests(TestCase):
+    """
+    Runs an archive pass against Postgres.
+
+    ./manage.py test apps.backend_mailer.tests.test_archive.ArchiveDatabaseTests
+    """
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.author = User.objects.create_user(
+            email="archive@example.com", password="P@$$w0rd"
+        )
+
+    def make_email(self, age, status):
+        email = Email.objects.create(
+            author=self.author,
+            from_email="shop@example.com",
+            to=["ann@example.com"],
+            status=status,
+        )
+        Email.objects.filter(id=email.id).update(created=self.now - age)
+        return email
+
+    def get_archived(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT table_name, id FROM %s" % archive.ARCHIVE_TABLE)
+            return set(cursor.fetchall())
+
+    def get_partition_months(self):
+        with connection.cursor() as cursor:
+            return [month for _, month in archive.get_partitions(cursor)]
+
+    def test_kept_rows_dont_open_partitions(self):
+        STATUS = BackendConstants.STATUS
+        sent = self.make_email(datetime.timedelta(days=120), STATUS.sent)
+        log = Log.objects.create(email=sent, status=STATUS.sent, message="")
+        Log.objects.filter(id=log.id).update(
+            date=self.now - datetime.timedelta(days=120)
+        )
+        sent_message = SentMessages.objects.create(
+            email=sent, to="ann@example.com", status=STATUS.sent
+        )
+        SentMessages.objects.filter(id=sent_message.id).update(
+            created_at=self.now - datetime.timedelta(days=120)
+        )
+        # Older than the retention, but never archived
+        queued = self.make_email(datetime.timedelta(days=700), STATUS.queued)
+        message = self.make_email(datetime.timedelta(days=700), STATUS.sent)
+        Campaign.objects.create(
+            author=self.author, campaign_name="Archive", message=message
+        )
+
+        result = archive.archive_expired_mails(self.now)
+
+        self.assertEqual(result, (1, 0, []))
+        self.assertEqual(
+            set(Email.objects.values_list("id", flat=True)), {queued.id, message.id}
+        )
+        self.assertEqual(
+            self.get_archived(),
+            {
+                ("backend_mailer_email", sent.id),
+                ("backend_mailer_log", log.id),
+                ("backend_mailer_sentmessages", sent_message.id),
+            },
+        )
+        months = self.get_partition_months()
+        self.assertEqual(
+            months[0], archive.get_month(self.now - datetime.timedelta(days=120))
+        )
+
+        # Nothing left to archive, the next pass doesn't touch the partitions
+        self.assertEqual(archive.archive_expired_mails(self.now), (0, 0, []))
+        self.assertEqual(self.get_partition_months(), months)
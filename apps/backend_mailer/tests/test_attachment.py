@@ -0,0 +1,70 @@
+import base64
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.core.mail import EmailMessage
+from django.test import SimpleTestCase
+
+from apps.backend_mailer.logic import attachment as attachment_logic
+from apps.backend_mailer.logic.attachment import AttachmentCache
+
+
+class LocalFile:
+    def __init__(self, path):
+        self.path = path
+
+
+class AttachmentCacheTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_attachment
+    """
+
+    def setUp(self):
+        self.content = os.urandom(10000)
+        fd, path = tempfile.mkstemp(suffix=".pdf")
+        with os.fdopen(fd, "wb") as f:
+            f.write(self.content)
+        self.addCleanup(os.remove, path)
+
+        self.attachment = SimpleNamespace(
+            id=1,
+            name="report.pdf",
+            mimetype="application/pdf",
+            headers=None,
+            file=LocalFile(path),
+        )
+
+    def test_attachment_is_encoded_once_per_batch(self):
+        cache = AttachmentCache(max_size=1024 * 1024)
+
+        with patch.object(
+            attachment_logic,
+            "encode_attachment",
+            wraps=attachment_logic.encode_attachment,
+        ) as encode_attachment:
+            parts = [cache.get(self.attachment) for _ in range(3)]
+
+        self.assertEqual(encode_attachment.call_count, 1)
+        self.assertIs(parts[0], parts[2])
+        self.assertEqual(base64.b64decode(parts[0].get_payload()), self.content)
+
+    def test_shared_part_is_attached_to_every_message(self):
+        mime_part = AttachmentCache(max_size=1024 * 1024).get(self.attachment)
+
+        for to in ["a@example.com", "b@example.com"]:
+            message = EmailMessage("Hi", "Body", "from@example.com", [to])
+            message.attach(mime_part)
+            attached = message.message().get_payload()[1]
+
+            self.assertEqual(attached.get_filename(), "report.pdf")
+            self.assertEqual(attached.get_payload(decode=True), self.content)
+
+    def test_large_attachments_are_not_kept(self):
+        cache = AttachmentCache(max_size=100)
+
+        first = cache.get(self.attachment)
+
+        self.assertIsNot(cache.get(self.attachment), first)
+        self.assertEqual(cache.size, 0)
@@ -0,0 +1,87 @@
+import os
+import tempfile
+from unittest.mock import MagicMock, patch
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.test import SimpleTestCase
+
+from apps.backend_mailer import attachment_gc
+from apps.backend_mailer.attachment_gc import collect_orphan_attachments, delete_files
+
+
+class S3Storage:
+    def __init__(self):
+        self.bucket = MagicMock()
+        self.bucket.delete_objects.return_value = {}
+
+    def _normalize_name(self, name):
+        return "media/" + name
+
+
+class AttachmentGCTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_attachment_gc
+    """
+
+    def test_s3_objects_are_deleted_in_batches(self):
+        storage = S3Storage()
+        names = ["file-%s.pdf" % i for i in range(2500)]
+
+        deleted = delete_files(names, storage, threads=2)
+
+        self.assertEqual(deleted, 2500)
+        calls = storage.bucket.delete_objects.call_args_list
+        self.assertEqual(
+            sorted(len(call.kwargs["Delete"]["Objects"]) for call in calls),
+            [500, 1000, 1000],
+        )
+        keys = {
+            item["Key"] for call in calls for item in call.kwargs["Delete"]["Objects"]
+        }
+        self.assertIn("media/file-0.pdf", keys)
+
+    def test_failed_s3_deletes_are_not_counted(self):
+        storage = S3Storage()
+        storage.bucket.delete_objects.return_value = {
+            "Errors": [{"Key": "media/b.pdf", "Message": "Access Denied"}]
+        }
+
+        self.assertEqual(delete_files(["a.pdf", "b.pdf"], storage, threads=1), 1)
+
+    def test_local_files_are_deleted(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, location)
+        storage = FileSystemStorage(location=location)
+        names = [storage.save("%s.txt" % i, ContentFile(b"x")) for i in range(3)]
+
+        deleted = delete_files(names + ["missing.txt"], storage, threads=2)
+
+        self.assertEqual(deleted, 4)
+        self.assertEqual(os.listdir(location), [])
+
+    @patch.object(attachment_gc, "delete_orphan_rows")
+    @patch.object(attachment_gc, "iter_orphan_batches")
+    def test_dry_run_only_counts(self, iter_orphan_batches, delete_orphan_rows):
+        iter_orphan_batches.return_value = iter(
+            [[(1, "a.pdf"), (2, "a.pdf")], [(5, "b.pdf"), (6, "")]]
+        )
+
+        counts = collect_orphan_attachments(batch_size=2, dry_run=True)
+
+        self.assertEqual(counts, (4, 2))
+        delete_orphan_rows.assert_not_called()
+
+    @patch.object(attachment_gc, "delete_files", return_value=1)
+    @patch.object(attachment_gc, "delete_orphan_rows", return_value=(2, ["a.pdf"]))
+    @patch.object(attachment_gc, "iter_orphan_batches")
+    def test_orphans_are_deleted_per_batch(
+        self, iter_orphan_batches, delete_orphan_rows, delete_files
+    ):
+        iter_orphan_batches.return_value = iter([[(1, "a.pdf"), (2, "a.pdf")]])
+
+        counts = collect_orphan_attachments(batch_size=2)
+
+        self.assertEqual(counts, (2, 1))
+        delete_orphan_rows.assert_called_once_with([1, 2])
+        delete_files.assert_called_once_with(["a.pdf"], None)
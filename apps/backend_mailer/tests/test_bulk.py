@@ -0,0 +1,222 @@
+import io
+from unittest.mock import MagicMock, patch
+
+from django.test import SimpleTestCase, TestCase
+
+from apps.backend_mailer import bulk, mail
+from apps.backend_mailer.constants import BackendConstants
+from apps.backend_mailer.bulk import format_copy_value, read_recipients_csv
+from apps.backend_mailer.models import Email
+from apps.mailers.models import Campaign
+
+
+class CursorProxy:
+    def __init__(self, connection, cursor):
+        self._connection = connection
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+class CopyFormatTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_bulk
+    """
+
+    def test_values_are_escaped(self):
+        self.assertEqual(format_copy_value(None), "\\N")
+        self.assertEqual(format_copy_value(True), "t")
+        self.assertEqual(format_copy_value("a\tb\nc\\d"), "a\\tb\\nc\\\\d")
+        self.assertEqual(
+            format_copy_value(['a"b@example.com', "c@example.com"]),
+            '{"a\\\\"b@example.com","c@example.com"}',
+        )
+
+    def test_email_rows_are_copied(self):
+        cursor = MagicMock()
+        copied = {}
+        cursor.__enter__.return_value.copy_expert.side_effect = (
+            lambda sql, buffer: copied.update(sql=sql, rows=buffer.read())
+        )
+        email = Email(
+            id=7,
+            from_email="from@example.com",
+            to=["to@example.com"],
+            subject="Hi\tthere",
+            context={"name": "Ann"},
+        )
+
+        with patch.object(bulk, "connection", CursorProxy(bulk.connection, cursor)):
+            bulk.copy_emails([email])
+
+        self.assertTrue(copied["sql"].startswith('COPY "backend_mailer_email" ('))
+        row = copied["rows"].rstrip("\n").split("\t")
+        self.assertEqual(len(row), len(Email._meta.concrete_fields))
+        self.assertIn('{"to@example.com"}', row)
+        self.assertIn("Hi\\tthere", row)
+        self.assertIn('{"name": "Ann"}', row)
+
+
+class EnqueueChunkTests(TestCase):
+    """
+    Copies emails into Postgres and reads them back.
+
+    ./manage.py test apps.backend_mailer.tests.test_bulk.EnqueueChunkTests
+    """
+
+    def test_rows_read_back_as_written(self):
+        tricky = "tab\there, new\nline, back\\slash and \\N"
+        context = {"name": tricky, "quote": 'say "hi"', "nested": {"list": [1, None]}}
+        emails = [
+            Email(
+                from_email="Shop <shop@example.com>",
+                to=["ann@example.com", "bob@example.com"],
+                subject=tricky,
+                message="\\N",
+                html_message="<p>\r\n</p>",
+                context=context,
+                headers={"X-Tag": tricky},
+                status=BackendConstants.STATUS.queued,
+                priority=BackendConstants.PRIORITY.low,
+            ),
+            Email(from_email="shop@example.com", to=["carl@example.com"]),
+        ]
+
+        bulk.enqueue_chunk(emails)
+
+        first, second = (Email.objects.get(id=email.id) for email in emails)
+        self.assertEqual(first.to, ["ann@example.com", "bob@example.com"])
+        self.assertEqual(first.from_email, "Shop <shop@example.com>")
+        self.assertEqual(first.subject, tricky)
+        self.assertEqual(first.message, "\\N")
+        self.assertEqual(first.html_message, "<p>\r\n</p>")
+        self.assertEqual(first.context, context)
+        self.assertEqual(first.headers, {"X-Tag": tricky})
+        self.assertEqual(first.status, BackendConstants.STATUS.queued)
+        self.assertEqual(first.priority, BackendConstants.PRIORITY.low)
+        self.assertIsNotNone(first.created)
+        self.assertEqual(
+            (second.cc, second.context, second.headers, second.priority),
+            (None, None, None, None),
+        )
+        # Ids come from the sequence, rows saved later don't collide
+        later = Email.objects.create(
+            from_email="shop@example.com", to=["d@example.com"]
+        )
+        self.assertGreater(later.id, max(email.id for email in emails))
+
+
+class ReadRecipientsTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_bulk
+    """
+
+    def test_headers_and_values_are_stripped(self):
+        recipients = read_recipients_csv(
+            io.StringIO(" email , name\n ann@example.com , Ann \nbob@example.com\n")
+        )
+
+        self.assertEqual(
+            list(recipients),
+            [("ann@example.com", {"name": "Ann"}), ("bob@example.com", {"name": ""})],
+        )
+
+    def test_missing_email_column_is_named(self):
+        with self.assertRaisesMessage(ValueError, "'address'"):
+            read_recipients_csv(io.StringIO("email,name\n"), email_column="address")
+
+
+class SendStreamTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_bulk
+    """
+
+    @patch.object(mail.email_queued, "send")
+    @patch.object(mail, "enqueue_chunk")
+    def test_recipients_are_queued_in_chunks(self, enqueue_chunk, email_queued):
+        recipients = read_recipients_csv(
+            io.StringIO(
+                "email,name\n"
+                "ann@example.com,Ann\n"
+                "not an email,Nobody\n"
+                "bob@example.com,Bob\n"
+                "cid@example.com,Cid\n"
+            )
+        )
+
+        queued, rejected = mail.send_stream(
+            recipients,
+            sender="shop@example.com",
+            subject="Hi {{ name }}",
+            message="Hello {{ name }} from {{ shop }}",
+            context={"shop": "Shop"},
+            chunk_size=2,
+        )
+
+        self.assertEqual((queued, rejected), (3, 1))
+        self.assertEqual(email_queued.call_count, 2)
+        emails = [
+            email for call in enqueue_chunk.call_args_list for email in call.args[0]
+        ]
+        self.assertEqual(
+            [(email.to, email.subject, email.message) for email in emails],
+            [
+                (["ann@example.com"], "Hi Ann", "Hello Ann from Shop"),
+                (["bob@example.com"], "Hi Bob", "Hello Bob from Shop"),
+                (["cid@example.com"], "Hi Cid", "Hello Cid from Shop"),
+            ],
+        )
+
+    @patch.object(mail.email_queued, "send")
+    @patch.object(mail, "enqueue_chunk")
+    def test_chunks_are_rendered_with_the_template_cache(self, enqueue_chunk, _):
+        with patch.object(
+            mail.template_cache,
+            "render_many",
+            wraps=mail.template_cache.render_many,
+        ) as render_many:
+            mail.send_stream(
+                [("ann@example.com", {"name": "Ann"})] * 3,
+                subject="Hi {{ name }}",
+                chunk_size=2,
+            )
+
+        self.assertEqual(render_many.call_count, 2)
+        self.assertEqual(
+            [email.subject for email in enqueue_chunk.call_args.args[0]], ["Hi Ann"]
+        )
+
+    @patch.object(mail.email_queued, "send")
+    @patch.object(mail, "enqueue_chunk")
+    def test_campaign_emails_wait_for_release(self, enqueue_chunk, email_queued):
+        campaign = Campaign(id=3)
+
+        queued, _ = mail.send_stream(
+            ["ann@example.com", "bob@example.com"],
+            subject="Hi",
+            source_campaign=campaign,
+        )
+
+        self.assertEqual(queued, 2)
+        email_queued.assert_not_called()
+        emails = enqueue_chunk.call_args.args[0]
+        self.assertEqual(
+            {(email.status, email.source_campaign_id) for email in emails},
+            {(BackendConstants.STATUS.created, 3)},
+        )
+
+    @patch.object(mail, "get_suppressed", return_value={"bob@example.com"})
+    @patch.object(mail.email_queued, "send")
+    @patch.object(mail, "enqueue_chunk")
+    def test_suppressed_recipients_are_rejected(self, enqueue_chunk, *mocks):
+        queued, rejected = mail.send_stream(
+            ["ann@example.com", "Bob@example.com"], subject="Hi"
+        )
+
+        self.assertEqual((queued, rejected), (1, 1))
+        emails = enqueue_chunk.call_args.args[0]
+        self.assertEqual([email.to for email in emails], [["ann@example.com"]])
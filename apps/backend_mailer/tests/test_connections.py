@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from django.test import SimpleTestCase
+
+from apps.backend_mailer.connections import BackendConnectionPool
+
+
+class BackendConnectionPoolTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_connections
+    """
+
+    def setUp(self):
+        self.email_backend = SimpleNamespace(id=1)
+        patcher = patch(
+            "apps.backend_mailer.connections.get_backend_connection",
+            side_effect=lambda email_backend: MagicMock(),
+        )
+        self.get_backend_connection = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_connection_is_reused(self):
+        pool = BackendConnectionPool(max_connections=2, max_messages=10)
+
+        for _ in range(5):
+            with pool.connection(self.email_backend):
+                pass
+
+        self.assertEqual(self.get_backend_connection.call_count, 1)
+
+    def test_connection_is_recycled_after_max_messages(self):
+        pool = BackendConnectionPool(max_connections=1, max_messages=2)
+
+        for _ in range(4):
+            with pool.connection(self.email_backend) as connection:
+                pass
+
+        self.assertEqual(self.get_backend_connection.call_count, 2)
+        connection.close.assert_called_once()
+
+    def test_close_closes_idle_connections(self):
+        pool = BackendConnectionPool(max_connections=1, max_messages=10)
+
+        with pool.connection(self.email_backend) as connection:
+            pass
+        pool.close()
+
+        connection.close.assert_called_once()
+        with pool.connection(self.email_backend):
+            pass
+        self.assertEqual(self.get_backend_connection.call_count, 2)
+
+    def test_suspect_connection_is_checked_before_reuse(self):
+        pool = BackendConnectionPool(max_connections=1, max_messages=10)
+
+        with self.assertRaises(ValueError):
+            with pool.connection(self.email_backend) as connection:
+                raise ValueError()
+
+        connection.connection.noop.return_value = (421, b"")
+        with pool.connection(self.email_backend) as new_connection:
+            pass
+
+        connection.connection.noop.assert_called_once()
+        self.assertIsNot(connection, new_connection)
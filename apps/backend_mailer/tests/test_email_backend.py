@@ -0,0 +1,76 @@
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from apps.backend_mailer.constants import BackendConstants
+from apps.backend_mailer.fields import decrypt_config, encrypt_config
+from apps.backend_mailer.logic.email_backend import BackendConfigCache
+
+
+class BackendConfigCacheTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_email_backend
+    """
+
+    def setUp(self):
+        self.email_backend = SimpleNamespace(
+            id=1,
+            updated_at=1,
+            backend_type=BackendConstants.SMTP_EMAIL_BACKEND,
+            config=encrypt_config(
+                json.dumps({"host": "smtp.example.com", "port": 587, "extra": 1})
+            ),
+        )
+
+    def test_config_is_decrypted_once(self):
+        cache = BackendConfigCache(max_size=8, ttl=60)
+
+        with patch(
+            "apps.backend_mailer.logic.email_backend.decrypt_config",
+            wraps=decrypt_config,
+        ) as decrypt:
+            first = cache.get_backend_fields(self.email_backend)
+            second = cache.get_backend_fields(self.email_backend)
+
+        self.assertEqual(decrypt.call_count, 1)
+        self.assertEqual(first["host"], "smtp.example.com")
+        self.assertNotIn("extra", first)
+        self.assertIs(first, second)
+
+    def test_updated_backend_is_not_served_stale(self):
+        cache = BackendConfigCache(max_size=8, ttl=60)
+        cache.get_backend_fields(self.email_backend)
+
+        self.email_backend.updated_at = 2
+        self.email_backend.config = encrypt_config(
+            json.dumps({"host": "smtp2.example.com"})
+        )
+
+        self.assertEqual(
+            cache.get_backend_fields(self.email_backend)["host"], "smtp2.example.com"
+        )
+
+    def test_invalidate_and_ttl(self):
+        cache = BackendConfigCache(max_size=8, ttl=0)
+        cache.get_backend_fields(self.email_backend)
+        self.assertEqual(len(cache._entries), 0)
+
+        cache = BackendConfigCache(max_size=8, ttl=60)
+        cache.get_backend_fields(self.email_backend)
+        cache.invalidate(self.email_backend.id)
+        self.assertEqual(len(cache._entries), 0)
+
+    def test_expired_entries_of_other_backends_are_purged(self):
+        cache = BackendConfigCache(max_size=8, ttl=60)
+        other_backend = SimpleNamespace(**{**vars(self.email_backend), "id": 2})
+
+        with patch(
+            "apps.backend_mailer.logic.email_backend.time.monotonic",
+            side_effect=[0, 100],
+        ):
+            cache.get_backend_fields(self.email_backend)
+            cache.get_backend_fields(other_backend)
+
+        self.assertEqual(list(cache._entries), [(2, 1)])
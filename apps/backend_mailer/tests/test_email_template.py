@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.template import Context, Template
+from django.test import SimpleTestCase, override_settings
+
+from apps.backend_mailer.logic.email_template import CompiledTemplateCache
+
+
+class CompiledTemplateCacheTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_email_template
+    """
+
+    def setUp(self):
+        self.template = SimpleNamespace(
+            id=1,
+            last_updated=1,
+            subject="Hello {{ name }}",
+            content="Hi {{ name }}",
+            html_content="<p>Hi {{ name }}</p>",
+        )
+
+    def test_render_many(self):
+        cache = CompiledTemplateCache(max_size=8)
+
+        rendered = cache.render_many(self.template, [{"name": "Ann"}, {"name": "Bob"}])
+
+        self.assertEqual(
+            [(r.subject, r.message, r.html_message) for r in rendered],
+            [
+                ("Hello Ann", "Hi Ann", "<p>Hi Ann</p>"),
+                ("Hello Bob", "Hi Bob", "<p>Hi Bob</p>"),
+            ],
+        )
+
+    def test_template_is_compiled_once_per_version(self):
+        cache = CompiledTemplateCache(max_size=8)
+
+        with patch.object(cache, "compile", wraps=cache.compile) as compile_template:
+            cache.render(self.template, {"name": "Ann"})
+            cache.render(self.template, {"name": "Bob"})
+            self.assertEqual(compile_template.call_count, 1)
+
+            self.template.last_updated = 2
+            self.template.subject = "Bye {{ name }}"
+            rendered = cache.render(self.template, {"name": "Ann"})
+            self.assertEqual(compile_template.call_count, 2)
+
+        self.assertEqual(rendered.subject, "Bye Ann")
+
+    @override_settings(POST_OFFICE={"TEMPLATE_CACHE_SIZE": 1})
+    def test_size_is_read_from_settings_on_use(self):
+        cache = CompiledTemplateCache()
+
+        cache.get_string("Hi {{ name }}")
+        cache.get_string("Bye {{ name }}")
+
+        self.assertEqual(cache.max_size, 1)
+        self.assertEqual(list(cache._sources), ["Bye {{ name }}"])
+
+    def test_strings_are_compiled_once(self):
+        cache = CompiledTemplateCache(max_size=8)
+
+        with patch(
+            "apps.backend_mailer.logic.email_template.Template", wraps=Template
+        ) as compile_template:
+            first = cache.render_string("Hi {{ name }}", Context({"name": "Ann"}))
+            second = cache.render_string("Hi {{ name }}", Context({"name": "Bob"}))
+
+        self.assertEqual((first, second), ("Hi Ann", "Hi Bob"))
+        self.assertEqual(compile_template.call_count, 1)
@@ -0,0 +1,189 @@
+import smtplib
+from collections import deque
+
+from unittest.mock import MagicMock, patch
+
+from django.core import mail as django_mail
+from django.core.mail import EmailMessage, get_connection
+from django.core.mail.backends.smtp import EmailBackend as SMTPEmailBackend
+from django.test import SimpleTestCase
+
+from apps.backend_mailer import mail
+from apps.backend_mailer.fanout import (
+    FanoutInterrupted,
+    FanoutMessage,
+    get_refused,
+    send_copies,
+    send_fanout,
+    send_pipelined,
+)
+from apps.backend_mailer.models import Email
+
+
+class FakeSMTP:
+    def __init__(self, replies):
+        self.replies = deque(replies)
+        self.sent = []
+
+    def send(self, data):
+        self.sent.append(data)
+
+    def getreply(self):
+        if not self.replies:
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        return self.replies.popleft()
+
+    def rset(self):
+        self.sent.append(b"RSET\r\n")
+        return self.getreply()
+
+
+def make_message():
+    return EmailMessage(
+        subject="Hello",
+        body="Hi\n.hidden line",
+        from_email="sender@example.com",
+        to=["a@example.com", "b@example.com", "c@example.com"],
+    )
+
+
+class FanoutMessageTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_fanout
+    """
+
+    def test_copies_are_addressed_to_their_recipient(self):
+        message = make_message()
+        message.bcc = ["hidden@example.com"]
+
+        fanout_message = FanoutMessage(message)
+
+        self.assertTrue(
+            fanout_message.as_bytes("b@example.com").startswith(
+                b"To: b@example.com\r\n"
+            )
+        )
+        self.assertNotIn(b"a@example.com", fanout_message.as_bytes("b@example.com"))
+        self.assertNotIn(b"To:", fanout_message.as_bytes("hidden@example.com"))
+        self.assertIn(b"\r\n..hidden line", fanout_message.as_data("a@example.com"))
+        self.assertTrue(fanout_message.as_data("a@example.com").endswith(b"\r\n.\r\n"))
+
+    def test_pipelined_outcomes_are_per_recipient(self):
+        smtp = FakeSMTP(
+            [
+                (250, b"OK"),
+                (250, b"OK"),
+                (354, b"Go ahead"),
+                # Data of a@, then b@ is refused
+                (250, b"Queued"),
+                (250, b"OK"),
+                (550, b"No such user"),
+                (503, b"No valid recipients"),
+                # RSET, then c@
+                (250, b"OK"),
+                (250, b"OK"),
+                (250, b"OK"),
+                (354, b"Go ahead"),
+                (250, b"Queued"),
+            ]
+        )
+
+        outcomes = send_pipelined(smtp, FanoutMessage(make_message()))
+
+        self.assertEqual(list(get_refused(outcomes)), ["b@example.com"])
+        self.assertIsInstance(outcomes["b@example.com"], smtplib.SMTPRecipientsRefused)
+        self.assertEqual(len(smtp.sent), 4)
+        self.assertTrue(smtp.sent[2].startswith(b"RSET\r\nMAIL FROM:"))
+        self.assertFalse(smtp.replies)
+
+    def test_disconnect_keeps_the_outcomes_so_far(self):
+        smtp = FakeSMTP(
+            [
+                (250, b"OK"),
+                (250, b"OK"),
+                (354, b"Go ahead"),
+                # Data of a@, then b@ is cut off before its data is answered
+                (250, b"Queued"),
+                (250, b"OK"),
+                (250, b"OK"),
+                (354, b"Go ahead"),
+            ]
+        )
+
+        with self.assertRaises(FanoutInterrupted) as raised:
+            send_pipelined(smtp, FanoutMessage(make_message()))
+
+        self.assertEqual(raised.exception.outcomes, {"a@example.com": None})
+
+    def test_extensions_are_read_after_ehlo(self):
+        connection = MagicMock(spec=SMTPEmailBackend)
+        connection.connection = smtp = MagicMock()
+        smtp.has_extn.return_value = False
+
+        with patch(
+            "apps.backend_mailer.fanout.send_sequential", return_value={}
+        ) as send_sequential:
+            send_fanout(connection, make_message())
+
+        self.assertEqual(
+            [name for name, _, _ in smtp.mock_calls[:2]],
+            ["ehlo_or_helo_if_needed", "has_extn"],
+        )
+        send_sequential.assert_called_once()
+
+    def test_interrupted_emails_keep_their_recipients(self):
+        email = Email(id=1, to=["a@example.com", "b@example.com"], bcc=[])
+        interrupted = FanoutInterrupted(
+            {"a@example.com": None}, smtplib.SMTPServerDisconnected()
+        )
+        accepted = {}
+
+        with self.assertRaises(FanoutInterrupted):
+            mail._record_interrupted_fanout(email, interrupted, set(), accepted)
+
+        self.assertEqual(email.to, ["a@example.com", "b@example.com"])
+        self.assertEqual(accepted, {1: {"a@example.com"}})
+
+    def test_delivered_recipients_count_as_answered(self):
+        email = Email(id=1, to=["a@example.com", "b@example.com"], bcc=[])
+        interrupted = FanoutInterrupted(
+            {"b@example.com": None}, smtplib.SMTPServerDisconnected()
+        )
+
+        outcomes = mail._record_interrupted_fanout(
+            email, interrupted, {"a@example.com"}, {}
+        )
+
+        self.assertEqual(outcomes, {"b@example.com": None})
+
+    def test_delivered_recipients_are_skipped(self):
+        message = make_message()
+
+        self.assertEqual(
+            FanoutMessage(message, skip={"a@example.com"}).recipients,
+            ["b@example.com", "c@example.com"],
+        )
+        connection = get_connection("django.core.mail.backends.locmem.EmailBackend")
+        django_mail.outbox = []
+        outcomes = send_copies(connection, message, skip={"b@example.com"})
+        self.assertEqual(list(outcomes), ["a@example.com", "c@example.com"])
+
+    def test_sent_messages_arent_created_again_for_delivered_recipients(self):
+        email = Email(id=1, to=["a@example.com", "b@example.com"], cc=[], bcc=[])
+
+        with patch.object(mail.CRUDSentMessages, "bulk_sent_messages_create") as create:
+            mail._create_sent_messages([email], {1: {"a@example.com"}})
+
+        self.assertEqual([m.to for m in create.call_args.args[0]], ["b@example.com"])
+
+    def test_other_backends_get_a_copy_per_recipient(self):
+        connection = get_connection("django.core.mail.backends.locmem.EmailBackend")
+        django_mail.outbox = []
+
+        outcomes = send_copies(connection, make_message())
+
+        self.assertEqual(get_refused(outcomes), {})
+        self.assertEqual(
+            [message.to for message in django_mail.outbox],
+            [["a@example.com"], ["b@example.com"], ["c@example.com"]],
+        )
@@ -0,0 +1,99 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+
+from apps.backend_mailer import lanes, mail
+from apps.backend_mailer.constants import BackendConstants
+from apps.backend_mailer.lanes import LANES_BY_NAME, drain_lane, get_lane, group_by_lane
+from apps.backend_mailer.models import Email
+from celery_scripts.constants import CeleryConstants
+
+PRIORITY = BackendConstants.PRIORITY
+STATUS = BackendConstants.STATUS
+
+
+class PriorityLaneTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_lanes
+    """
+
+    def test_every_priority_has_its_own_queue(self):
+        self.assertEqual(get_lane(PRIORITY.now).queue, CeleryConstants.MAIL_HIGH_QUEUE)
+        self.assertEqual(get_lane(PRIORITY.high).queue, CeleryConstants.MAIL_HIGH_QUEUE)
+        self.assertEqual(get_lane(PRIORITY.medium).name, "medium")
+        self.assertEqual(get_lane(PRIORITY.low).name, "low")
+        self.assertEqual(get_lane(None).name, "low")
+
+    def test_emails_are_grouped_by_lane(self):
+        emails = [
+            SimpleNamespace(id=1, priority=PRIORITY.low),
+            SimpleNamespace(id=2, priority=PRIORITY.high),
+            SimpleNamespace(id=3, priority=None),
+        ]
+
+        grouped = group_by_lane(emails)
+
+        self.assertEqual(
+            {
+                lane.name: [email.id for email in group]
+                for lane, group in grouped.items()
+            },
+            {"low": [1, 3], "high": [2]},
+        )
+
+    def test_lane_query_only_matches_its_priorities(self):
+        queryset = Email.objects.filter(mail._get_priority_query((PRIORITY.low, None)))
+
+        sql = str(queryset.query)
+        self.assertIn('"priority" IN (%s)' % PRIORITY.low, sql)
+        self.assertIn('"priority" IS NULL', sql)
+
+    @patch.object(lanes, "get_lane_processes", return_value={"medium": 4})
+    @patch.object(lanes, "send_queued_mail_until_done", return_value=True)
+    def test_lanes_drain_with_their_own_lock_and_budget(self, send_until_done, _):
+        drain_lane(LANES_BY_NAME["medium"], deadline=10.0)
+
+        kwargs = send_until_done.call_args.kwargs
+        self.assertTrue(kwargs["lockfile"].endswith("_medium"))
+        self.assertEqual(kwargs["processes"], 4)
+        self.assertEqual(kwargs["priorities"], (PRIORITY.medium,))
+        self.assertEqual(kwargs["deadline"], 10.0)
+
+    def test_claimed_emails_are_not_promoted(self):
+        with patch.object(lanes.Email.objects, "filter") as filter:
+            lanes.promote_starved()
+
+        self.assertEqual(
+            filter.call_args.kwargs["status__in"], [STATUS.queued, STATUS.requeued]
+        )
+        filter.return_value.update.assert_called_once_with(priority=PRIORITY.medium)
+
+    @override_settings(POST_OFFICE={"LANES_ENABLED": True})
+    def test_lanes_require_claims(self):
+        with self.assertRaises(ImproperlyConfigured):
+            apps.get_app_config("backend_mailer").ready()
+
+
+class DrainDeadlineTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_lanes
+    """
+
+    @patch.object(mail, "db_connection")
+    @patch.object(mail, "get_queued")
+    @patch.object(mail, "send_queued")
+    def test_drain_stops_at_the_deadline(self, send_queued, get_queued, _):
+        get_queued.return_value.exists.return_value = True
+
+        with patch.object(mail.time, "monotonic", side_effect=[5.0, 11.0]):
+            drained = mail._send_queued_until_done(
+                1, 0, priorities=(PRIORITY.low,), deadline=10.0
+            )
+
+        self.assertFalse(drained)
+        self.assertEqual(send_queued.call_count, 2)
+        send_queued.assert_called_with(1, 0, (PRIORITY.low,))
+        get_queued.assert_called_with((PRIORITY.low,))
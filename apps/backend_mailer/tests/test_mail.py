@@ -0,0 +1,404 @@
+import datetime
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+from django.db import connection, transaction
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.utils import timezone
+
+from apps.backend_mailer import mail
+from apps.backend_mailer.constants import BackendConstants
+from apps.backend_mailer.models import Email, SentMessages
+
+
+class FakeEmail:
+    def __init__(self, email_id, email_backend_id=1, fail=False):
+        self.id = email_id
+        self.email_backend_id = email_backend_id
+        self.to = ["user%s@example.com" % email_id]
+        self.bcc = []
+        self.number_of_retries = None
+        self.fail = fail
+
+    def dispatch(self, **kwargs):
+        if self.fail:
+            raise ValueError("Failed")
+
+
+class SendBulkThreadedTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_mail
+    """
+
+    def setUp(self):
+        patcher = patch.object(mail, "_create_sent_messages")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = patch.object(
+            mail, "_prepare_emails", side_effect=lambda emails: (list(emails), [])
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = patch.object(mail, "_finalize_batch")
+        self.finalize_batch = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = patch.object(mail, "BackendConnectionPool", MagicMock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_outcomes_are_collected(self):
+        emails = [FakeEmail(1), FakeEmail(2, fail=True), FakeEmail(3)]
+
+        mail._send_bulk_threaded(emails, log_level=0)
+
+        _, email_count, sent_emails, failed_emails, _ = self.finalize_batch.call_args[0]
+        self.assertEqual(email_count, 3)
+        self.assertEqual(len(sent_emails), 2)
+        self.assertEqual([email.id for email, _ in failed_emails], [2])
+
+    @override_settings(POST_OFFICE={"THREADED_BACKEND_CONCURRENCY": 2})
+    def test_backend_concurrency_is_limited(self):
+        lock = threading.Lock()
+        running = {"now": 0, "max": 0}
+
+        def dispatch(**kwargs):
+            with lock:
+                running["now"] += 1
+                running["max"] = max(running["max"], running["now"])
+            time.sleep(0.01)
+            with lock:
+                running["now"] -= 1
+
+        emails = [FakeEmail(i) for i in range(10)]
+        for email in emails:
+            email.dispatch = dispatch
+
+        mail._send_bulk_threaded(emails, log_level=0)
+
+        self.assertEqual(running["max"], 2)
+
+
+class SendQueuedStreamTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_mail
+    """
+
+    @patch.object(mail, "db_connection")
+    @patch.object(mail, "_send_batch", side_effect=[(2, 0, 0), (0, 1, 0)])
+    @patch.object(mail, "iter_queued_batches")
+    def test_every_batch_is_sent_once(self, iter_queued_batches, send_batch, _):
+        batches = [[FakeEmail(1), FakeEmail(2)], [FakeEmail(3)]]
+        iter_queued_batches.return_value = iter(batches)
+
+        totals = mail.send_queued_stream(processes=1, log_level=0)
+
+        self.assertEqual(totals, (2, 1, 0))
+        self.assertEqual([call.args[0] for call in send_batch.call_args_list], batches)
+
+
+class FinalizeBatchTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_mail
+    """
+
+    def test_failures_are_requeued_until_out_of_retries(self):
+        emails = [FakeEmail(1), FakeEmail(2), FakeEmail(3)]
+        emails[0].number_of_retries = None
+        emails[1].number_of_retries = 1
+        emails[2].number_of_retries = 2
+
+        failed_ids, requeued_ids = mail._split_failures(
+            [(email, ValueError()) for email in emails],
+            mail.RetryPolicy(max_retries=2),
+        )
+
+        self.assertEqual(failed_ids, [3])
+        self.assertEqual(requeued_ids, [1, 2])
+
+    @patch.object(mail.GeneralUserNotify, "notify")
+    def test_authors_are_notified_of_their_own_emails(self, notify):
+        emails = [FakeEmail(1), FakeEmail(2), FakeEmail(3), FakeEmail(4)]
+        for email, author_id in zip(emails, ["a", "a", "b", None]):
+            email.author_id = author_id
+
+        mail._notify_authors(
+            emails, sent_ids=[1, 3, 4], failed_ids=[2], requeued_ids=[]
+        )
+
+        data = {
+            call.kwargs["user_id"]: call.kwargs["data"] for call in notify.mock_calls
+        }
+        self.assertEqual(
+            data,
+            {
+                "a": {"send_email": "1", "num_failed": 1, "num_requeued": 0},
+                "b": {"send_email": "1", "num_failed": 0, "num_requeued": 0},
+            },
+        )
+
+    @override_settings(POST_OFFICE={"CLAIM_ENABLED": True})
+    @patch.object(mail, "_notify_authors")
+    @patch.object(mail, "record_hard_bounces")
+    @patch.object(mail, "record_campaign_outcomes")
+    @patch.object(mail, "_update_outcomes")
+    @patch.object(mail, "_get_held_claims", return_value={1})
+    @patch.object(mail.transaction, "atomic")
+    def test_outcomes_of_lost_claims_are_dropped(
+        self, _, get_held_claims, update_outcomes, record_campaign_outcomes, *mocks
+    ):
+        emails = [FakeEmail(1), FakeEmail(2), FakeEmail(3)]
+        for email in emails:
+            email.number_of_retries = 0
+
+        sent, failed, requeued = mail._finalize_batch(
+            emails,
+            3,
+            [emails[0], emails[1]],
+            [(emails[2], ValueError())],
+            log_level=0,
+            refused_recipients={2: {"ann@example.com": ValueError()}},
+        )
+
+        self.assertEqual((sent, failed, requeued), (1, 0, 0))
+        self.assertEqual(update_outcomes.call_args.args[:4], ([1], [], [], {}))
+        record_campaign_outcomes.assert_called_once_with([emails[0]], [], [])
+
+    def test_claims_are_held_by_their_lease(self):
+        first, second = FakeEmail(1), FakeEmail(2)
+        first.claimed_until = second.claimed_until = "2026-01-01T10:00:00Z"
+
+        with patch.object(mail.Email.objects, "filter") as filter:
+            mail._get_held_claims([first, second])
+
+        (query,) = filter.call_args.args
+        self.assertIn(
+            ("claimed_until", "2026-01-01T10:00:00Z"), query.children[1].children
+        )
+        self.assertEqual(
+            filter.call_args.kwargs, {"status": mail.BackendConstants.STATUS.sending}
+        )
+        filter.return_value.select_for_update.assert_called_once_with()
+
+
+class ClaimQueuedTests(TransactionTestCase):
+    """
+    Claims emails from several database connections, needs Postgres.
+
+    ./manage.py test apps.backend_mailer.tests.test_mail.ClaimQueuedTests
+    """
+
+    def make_emails(self, count):
+        return [
+            Email.objects.create(
+                from_email="shop@example.com",
+                to=["user%s@example.com" % i],
+                status=BackendConstants.STATUS.queued,
+            ).id
+            for i in range(count)
+        ]
+
+    def claim(self):
+        return set(mail.claim_queued().values_list("id", flat=True))
+
+    @override_settings(POST_OFFICE={"BATCH_SIZE": 10})
+    def test_rows_locked_by_another_sender_are_skipped(self):
+        email_ids = self.make_emails(4)
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            try:
+                with transaction.atomic():
+                    list(
+                        Email.objects.filter(id__in=email_ids[:2])
+                        .select_for_update()
+                        .values_list("id", flat=True)
+                    )
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        try:
+            self.assertTrue(locked.wait(10))
+            claimed = self.claim()
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual(claimed, set(email_ids[2:]))
+
+    @override_settings(POST_OFFICE={"BATCH_SIZE": 5})
+    def test_concurrent_senders_claim_disjoint_batches(self):
+        email_ids = self.make_emails(20)
+        barrier = threading.Barrier(4)
+        batches = []
+
+        def claim():
+            try:
+                barrier.wait(10)
+                batches.append(self.claim())
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=claim) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        claimed = [email_id for batch in batches for email_id in batch]
+        self.assertEqual(len(claimed), len(set(claimed)))
+        self.assertEqual(set(claimed), set(email_ids))
+
+    @override_settings(POST_OFFICE={"BATCH_SIZE": 1})
+    def test_claims_are_taken_over_once_their_lease_expires(self):
+        self.make_emails(2)
+        first, second = self.claim(), self.claim()
+
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.claim(), set())
+        self.assertEqual(
+            Email.objects.filter(status=BackendConstants.STATUS.sending).count(), 2
+        )
+
+        Email.objects.filter(id__in=first).update(
+            claimed_until=timezone.now() - datetime.timedelta(minutes=1)
+        )
+        self.assertEqual(self.claim(), first)
+        self.assertGreater(
+            Email.objects.get(id__in=first).claimed_until, timezone.now()
+        )
+
+
+class UpdateOutcomesTests(TestCase):
+    """
+    Writes the outcomes of a batch to Postgres.
+
+    ./manage.py test apps.backend_mailer.tests.test_mail.UpdateOutcomesTests
+    """
+
+    def test_mixed_batch(self):
+        STATUS = BackendConstants.STATUS
+        now = timezone.now()
+        scheduled = now - datetime.timedelta(hours=1)
+        emails = {}
+        for name, retries in [
+            ("sent", None),
+            ("failed", 3),
+            ("first_retry", None),
+            ("retried", 2),
+        ]:
+            emails[name] = Email.objects.create(
+                from_email="shop@example.com",
+                to=["%s@example.com" % name],
+                status=STATUS.sending,
+                claimed_until=now,
+                scheduled_time=scheduled,
+                number_of_retries=retries,
+            )
+            SentMessages.objects.create(email=emails[name], to="%s@example.com" % name)
+        retry_times = {
+            emails["first_retry"].id: now + datetime.timedelta(minutes=1),
+            emails["retried"].id: now + datetime.timedelta(minutes=30),
+        }
+
+        mail._update_outcomes(
+            [emails["sent"].id],
+            [emails["failed"].id],
+            [emails["first_retry"].id, emails["retried"].id],
+            retry_times=retry_times,
+        )
+
+        rows = {email.to[0].split("@")[0]: email for email in Email.objects.all()}
+        self.assertEqual(
+            {
+                name: (email.status, email.number_of_retries, email.scheduled_time)
+                for name, email in rows.items()
+            },
+            {
+                "sent": (STATUS.sent, None, scheduled),
+                "failed": (STATUS.failed, 3, scheduled),
+                "first_retry": (
+                    STATUS.requeued,
+                    1,
+                    retry_times[emails["first_retry"].id],
+                ),
+                "retried": (STATUS.requeued, 3, retry_times[emails["retried"].id]),
+            },
+        )
+        self.assertFalse(Email.objects.exclude(claimed_until=None).exists())
+        self.assertEqual(
+            dict(SentMessages.objects.values_list("to", "status")),
+            {
+                "sent@example.com": STATUS.sent,
+                "failed@example.com": STATUS.failed,
+                "first_retry@example.com": STATUS.requeued,
+                "retried@example.com": STATUS.requeued,
+            },
+        )
+
+
+class IterQueuedBatchesTests(TestCase):
+    """
+    Walks a queue stored in Postgres.
+
+    ./manage.py test apps.backend_mailer.tests.test_mail.IterQueuedBatchesTests
+    """
+
+    def setUp(self):
+        PRIORITY = BackendConstants.PRIORITY
+        self.emails = [
+            Email.objects.create(
+                from_email="shop@example.com",
+                to=["user%s@example.com" % i],
+                status=BackendConstants.STATUS.queued,
+                priority=priority,
+            )
+            for i, priority in enumerate(
+                [PRIORITY.low, None, PRIORITY.high, PRIORITY.low, None, PRIORITY.high]
+                + [PRIORITY.medium, PRIORITY.low]
+            )
+        ]
+
+    @override_settings(POST_OFFICE={"BATCH_SIZE": 2})
+    def test_queue_is_walked_once_in_order(self):
+        batches = list(mail.iter_queued_batches())
+
+        walked = [email.id for batch in batches for email in batch]
+        expected = sorted(
+            self.emails,
+            key=lambda email: (
+                email.priority is None,
+                -(email.priority or 0),
+                email.id,
+            ),
+        )
+        self.assertEqual(walked, [email.id for email in expected])
+
+    def test_keyset_ranges_are_index_range_scans(self):
+        with connection.cursor() as cursor:
+            # The table is tiny, make the planner show how the index is used
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("SET LOCAL enable_bitmapscan = off")
+
+        queryset = Email.objects.filter(
+            mail._get_queued_query(timezone.now())
+        ).order_by(*mail.QUEUE_ORDER)
+        for keyset in mail._get_keyset_queries(BackendConstants.PRIORITY.low, 1):
+            with self.subTest(keyset=keyset):
+                plan = queryset.filter(keyset)[:10].explain()
+
+                self.assertIn("Index Scan using email_queue_order_idx", plan)
+                self.assertIn("Index Cond", plan)
+                self.assertNotIn("Sort", plan)
@@ -0,0 +1,125 @@
+import datetime
+import smtplib
+from unittest.mock import patch
+
+from anymail.exceptions import AnymailAPIError, AnymailRecipientsRefused
+from botocore.exceptions import ClientError
+from django.test import SimpleTestCase
+
+from apps.backend_mailer import retry
+from apps.backend_mailer.constants import BackendConstants
+from apps.backend_mailer.retry import RetryPolicy, classify_error
+
+ERROR_CLASS = BackendConstants.ERROR_CLASS
+
+POLICY = {
+    "transient": {
+        "base": datetime.timedelta(minutes=1),
+        "cap": datetime.timedelta(minutes=15),
+    },
+    "throttled": {
+        "base": datetime.timedelta(minutes=5),
+        "cap": datetime.timedelta(hours=2),
+        "max_retries": 10,
+    },
+}
+
+
+def ses_error(code, message=""):
+    return ClientError({"Error": {"Code": code, "Message": message}}, "SendRawEmail")
+
+
+class ClassifyErrorTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_retry
+    """
+
+    def test_smtp_replies(self):
+        cases = [
+            (smtplib.SMTPDataError(550, b"5.1.1 User unknown"), ERROR_CLASS.permanent),
+            (
+                smtplib.SMTPDataError(451, b"4.3.0 Try again later"),
+                ERROR_CLASS.throttled,
+            ),
+            (smtplib.SMTPDataError(450, b"4.2.0 Mailbox busy"), ERROR_CLASS.transient),
+            (smtplib.SMTPDataError(421, b"Service closing"), ERROR_CLASS.throttled),
+            (
+                smtplib.SMTPSenderRefused(452, b"4.7.1 Rate limited", "a@b.com"),
+                ERROR_CLASS.throttled,
+            ),
+            (smtplib.SMTPAuthenticationError(535, b"Bad login"), ERROR_CLASS.transient),
+            (smtplib.SMTPServerDisconnected(), ERROR_CLASS.transient),
+            (TimeoutError(), ERROR_CLASS.transient),
+        ]
+        for exception, error_class in cases:
+            with self.subTest(exception=exception):
+                self.assertEqual(classify_error(exception), error_class)
+
+    def test_refused_recipients_are_permanent_only_if_all_are(self):
+        bounced = {"a@example.com": (550, b"No such user")}
+        deferred = {"b@example.com": (450, b"Greylisted")}
+
+        self.assertEqual(
+            classify_error(smtplib.SMTPRecipientsRefused(bounced)),
+            ERROR_CLASS.permanent,
+        )
+        self.assertEqual(
+            classify_error(smtplib.SMTPRecipientsRefused({**bounced, **deferred})),
+            ERROR_CLASS.transient,
+        )
+
+    def test_ses_and_anymail_errors(self):
+        cases = [
+            (
+                ses_error("Throttling", "Maximum sending rate exceeded."),
+                ERROR_CLASS.throttled,
+            ),
+            (
+                ses_error("MessageRejected", "Email address is not verified."),
+                ERROR_CLASS.permanent,
+            ),
+            (ses_error("ServiceUnavailable"), ERROR_CLASS.transient),
+            (AnymailAPIError("Rate", status_code=429), ERROR_CLASS.throttled),
+            (AnymailAPIError("Invalid", status_code=400), ERROR_CLASS.permanent),
+            (AnymailAPIError("Down", status_code=503), ERROR_CLASS.transient),
+            (AnymailRecipientsRefused(), ERROR_CLASS.permanent),
+        ]
+        for exception, error_class in cases:
+            with self.subTest(exception=exception):
+                self.assertEqual(classify_error(exception), error_class)
+
+
+class RetryPolicyTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_retry
+    """
+
+    def setUp(self):
+        self.policy = RetryPolicy(max_retries=3, policy=POLICY)
+
+    def test_permanent_failures_are_not_retried(self):
+        bounce = smtplib.SMTPDataError(550, b"User unknown")
+
+        self.assertFalse(self.policy.should_retry(bounce, 0))
+        self.assertTrue(self.policy.should_retry(TimeoutError(), 2))
+        self.assertFalse(self.policy.should_retry(TimeoutError(), 3))
+        # Throttling has its own retry budget
+        throttled = smtplib.SMTPDataError(421, b"Too many connections")
+        self.assertTrue(self.policy.should_retry(throttled, 9))
+
+    def test_delays_grow_exponentially_up_to_the_cap(self):
+        with patch.object(retry.random, "random", return_value=1.0):
+            delays = [self.policy.get_delay(ERROR_CLASS.transient, n) for n in range(6)]
+
+        self.assertEqual(
+            [delay.total_seconds() / 60 for delay in delays], [1, 2, 4, 8, 15, 15]
+        )
+
+    def test_delays_are_jittered(self):
+        with patch.object(retry.random, "random", return_value=0.0):
+            shortest = self.policy.get_delay(ERROR_CLASS.throttled, 2)
+        with patch.object(retry.random, "random", return_value=0.5):
+            middle = self.policy.get_delay(ERROR_CLASS.throttled, 2)
+
+        self.assertEqual(shortest, datetime.timedelta(minutes=10))
+        self.assertEqual(middle, datetime.timedelta(minutes=15))
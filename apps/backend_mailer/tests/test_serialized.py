@@ -0,0 +1,92 @@
+from email import message_from_bytes
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.core.mail import EmailMessage
+from django.core.mail.backends.smtp import EmailBackend as SMTPEmailBackend
+from django.test import SimpleTestCase, override_settings
+
+from apps.backend_mailer import serialized as serialized_module
+from apps.backend_mailer.serialized import (
+    MessageCache,
+    is_personalized,
+    send_serialized,
+)
+
+
+class FakeSMTP:
+    def __init__(self):
+        self.sent = []
+
+    def sendmail(self, from_addr, to_addrs, msg):
+        self.sent.append((from_addr, to_addrs, msg))
+        return {}
+
+
+def make_message(to, message_id):
+    return EmailMessage(
+        subject="Sale",
+        body="Everything must go",
+        from_email="shop@example.com",
+        to=to,
+        headers={"Message-ID": message_id},
+    )
+
+
+class MessageCacheTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_serialized
+    """
+
+    def setUp(self):
+        self.connection = SMTPEmailBackend(host="localhost")
+        self.connection.connection = FakeSMTP()
+
+    def test_identical_messages_are_serialized_once(self):
+        message_cache = MessageCache()
+
+        with patch.object(
+            serialized_module,
+            "SerializedMessage",
+            wraps=serialized_module.SerializedMessage,
+        ) as serialized_message:
+            send_serialized(
+                self.connection, make_message(["a@example.com"], "<1@x>"), message_cache
+            )
+            send_serialized(
+                self.connection,
+                make_message(["b@example.com", "c@example.com"], "<2@x>"),
+                message_cache,
+            )
+
+        self.assertEqual(serialized_message.call_count, 1)
+
+        _, to_addrs, msg = self.connection.connection.sent[1]
+        parsed = message_from_bytes(msg)
+        self.assertEqual(to_addrs, ["b@example.com", "c@example.com"])
+        self.assertEqual(" ".join(parsed["To"].split()), "b@example.com, c@example.com")
+        self.assertEqual(parsed.get_all("Message-ID"), ["<2@x>"])
+        self.assertEqual(parsed["Subject"], "Sale")
+
+    def test_different_content_is_serialized_separately(self):
+        message_cache = MessageCache()
+        other = make_message(["b@example.com"], "<2@x>")
+        other.body = "Last chance"
+
+        first = message_cache.get(make_message(["a@example.com"], "<1@x>"))
+
+        self.assertIsNot(message_cache.get(other), first)
+
+    def test_tracked_campaign_emails_are_personalized(self):
+        campaign_email = SimpleNamespace(
+            template_id=None, context=None, source_campaign_id=7
+        )
+        other_email = SimpleNamespace(
+            template_id=None, context=None, source_campaign_id=None
+        )
+
+        with override_settings(POST_OFFICE={"TRACKING_ENABLED": True}):
+            self.assertTrue(is_personalized(campaign_email))
+            self.assertFalse(is_personalized(other_email))
+        with override_settings(POST_OFFICE={}):
+            self.assertFalse(is_personalized(campaign_email))
@@ -0,0 +1,197 @@
+import smtplib
+from unittest.mock import MagicMock, patch
+
+import redis
+
+from django.test import SimpleTestCase, override_settings
+
+from apps.backend_mailer import mail, suppression
+from apps.backend_mailer.constants import BackendConstants
+from apps.backend_mailer.models import Email
+from apps.backend_mailer.retry import classify_error
+from apps.backend_mailer.suppression import (
+    BloomFilter,
+    RecipientSuppressed,
+    FilterNotBuilt,
+    RedisBloomFilter,
+    add_to_filter,
+    get_hard_bounces,
+    get_suppressed,
+)
+
+
+class BloomFilterTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_suppression
+    """
+
+    def test_added_addresses_are_always_found(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        addresses = ["user%s@example.com" % i for i in range(1000)]
+        bloom.add(addresses)
+
+        self.assertTrue(all(bloom.contains(addresses)))
+        others = ["other%s@example.com" % i for i in range(10000)]
+        false_positives = sum(bloom.contains(others))
+        self.assertLess(false_positives, 300)
+
+    def test_redis_lookups_take_one_round_trip(self):
+        client = MagicMock()
+        bloom = RedisBloomFilter(capacity=1000, error_rate=0.01, client=client)
+        pipeline = client.pipeline.return_value
+        pipeline.execute.return_value = [1] + [1] * bloom.hashes + [0] * bloom.hashes
+
+        hits = bloom.contains(["ann@example.com", "bob@example.com"])
+
+        self.assertEqual(hits, [True, False])
+        self.assertEqual(pipeline.getbit.call_count, 2 * bloom.hashes)
+        pipeline.execute.assert_called_once_with()
+
+    def test_unbuilt_redis_filter_isnt_trusted(self):
+        client = MagicMock()
+        bloom = RedisBloomFilter(capacity=1000, error_rate=0.01, client=client)
+        # Bits set by an add before the first build
+        client.pipeline.return_value.execute.return_value = [0] + [1] * bloom.hashes
+
+        with self.assertRaises(FilterNotBuilt):
+            bloom.contains(["ann@example.com"])
+
+    def test_redis_bitmap_matches_local_layout(self):
+        bloom = BloomFilter(capacity=100, error_rate=0.01)
+        bloom.add(["ann@example.com"])
+        client = MagicMock()
+
+        RedisBloomFilter(capacity=100, error_rate=0.01, client=client).replace(bloom)
+
+        key, bits = client.pipeline.return_value.set.call_args.args
+        for position in bloom.get_positions("ann@example.com"):
+            self.assertTrue(bits[position >> 3] & (0x80 >> (position & 7)))
+
+
+class GetSuppressedTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_suppression
+    """
+
+    @override_settings(POST_OFFICE={"SUPPRESSION_ENABLED": False})
+    def test_nothing_is_suppressed_when_disabled(self):
+        with patch.object(suppression, "Suppression") as model:
+            self.assertEqual(get_suppressed(["ann@example.com"]), set())
+        model.objects.filter.assert_not_called()
+
+    def test_only_bloom_hits_are_confirmed(self):
+        bloom = BloomFilter(capacity=100, error_rate=0.001)
+        bloom.add(["ann@example.com"])
+
+        with patch.object(
+            suppression, "get_suppression_filter", return_value=bloom
+        ), patch.object(suppression, "Suppression") as model:
+            model.objects.filter.return_value.values_list.return_value = [
+                "ann@example.com"
+            ]
+            suppressed = get_suppressed(["Ann <ANN@example.com>", "bob@example.com"])
+
+        self.assertEqual(suppressed, {"ann@example.com"})
+        model.objects.filter.assert_called_once_with(address__in=["ann@example.com"])
+
+    @patch.object(suppression, "rebuild_suppression_filter")
+    def test_unbuilt_filter_is_built_and_the_database_checked(self, rebuild):
+        bloom = MagicMock()
+        bloom.contains.side_effect = FilterNotBuilt("key")
+
+        with patch.object(
+            suppression, "get_suppression_filter", return_value=bloom
+        ), patch.object(suppression, "Suppression") as model:
+            model.objects.filter.return_value.values_list.return_value = []
+            get_suppressed(["bob@example.com", "ann@example.com"])
+
+        rebuild.assert_called_once_with()
+        model.objects.filter.assert_called_once_with(
+            address__in=["ann@example.com", "bob@example.com"]
+        )
+
+    def test_failed_add_marks_the_filter_stale(self):
+        client = MagicMock()
+        bloom = RedisBloomFilter(capacity=100, error_rate=0.01, client=client)
+        client.pipeline.return_value.execute.side_effect = redis.ConnectionError()
+
+        with patch.object(suppression, "get_suppression_filter", return_value=bloom):
+            add_to_filter(["ann@example.com"])
+
+        client.delete.assert_called_once_with(bloom.ready_key)
+
+    def test_rebuild_marks_the_filter_ready_once_caught_up(self):
+        client = MagicMock()
+        bloom = RedisBloomFilter(capacity=100, error_rate=0.01, client=client)
+        client.set.return_value = True
+
+        with patch.object(
+            suppression, "get_suppression_filter", return_value=bloom
+        ), patch.object(suppression, "build_filter") as build_filter, patch.object(
+            suppression, "iter_suppressed_addresses", return_value=[]
+        ):
+            build_filter.return_value = BloomFilter(capacity=100, error_rate=0.01)
+            self.assertTrue(suppression.rebuild_suppression_filter())
+
+        client.pipeline.return_value.delete.assert_called_once_with(bloom.ready_key)
+        client.set.assert_called_with(bloom.ready_key, 1)
+        client.delete.assert_called_once_with(bloom.lock_key)
+
+
+class HardBounceTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_suppression
+    """
+
+    def test_only_refused_mailboxes_are_hard_bounces(self):
+        refused = smtplib.SMTPRecipientsRefused(
+            {
+                "gone@example.com": (550, b"5.1.1 User unknown"),
+                "spam@example.com": (550, b"5.7.1 Message rejected as spam"),
+                "full@example.com": (452, b"4.2.2 Mailbox full"),
+            }
+        )
+        fanout_refused = smtplib.SMTPRecipientsRefused(
+            {"moved@example.com": (551, b"User not local")}
+        )
+
+        bounces = get_hard_bounces(
+            [(Email(id=1), refused), (Email(id=2), smtplib.SMTPDataError(554, b"x"))],
+            {3: {"moved@example.com": fanout_refused}},
+        )
+
+        self.assertEqual(
+            bounces,
+            {
+                "gone@example.com": "550 5.1.1 User unknown",
+                "moved@example.com": "551 User not local",
+            },
+        )
+
+    def test_suppressed_emails_are_not_retried(self):
+        self.assertEqual(
+            classify_error(RecipientSuppressed(["ann@example.com"])),
+            BackendConstants.ERROR_CLASS.permanent,
+        )
+
+
+class ExcludeSuppressedTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_suppression
+    """
+
+    @patch.object(mail, "get_suppressed", return_value={"ann@example.com"})
+    def test_suppressed_recipients_are_dropped(self, get_suppressed):
+        shared = Email(id=1, to=["Ann <ann@example.com>", "bob@example.com"], cc=[])
+        alone = Email(id=2, to=["ann@example.com"], cc=[], bcc=[])
+
+        with patch.object(mail.logger, "info") as info:
+            emails, failed = mail._exclude_suppressed([shared, alone])
+
+        get_suppressed.assert_called_once()
+        # One suppressed address, but two of the batch's recipients
+        info.assert_called_once_with("Dropped 2 suppressed recipients")
+        self.assertEqual(emails, [shared])
+        self.assertEqual(shared.to, ["bob@example.com"])
+        self.assertEqual([email for email, _ in failed], [alone])
+        self.assertIsInstance(failed[0][1], RecipientSuppressed)
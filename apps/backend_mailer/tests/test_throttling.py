@@ -0,0 +1,118 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from django.test import SimpleTestCase, override_settings
+
+from apps.backend_mailer import throttling
+from apps.backend_mailer.throttling import (
+    DispatchScheduler,
+    RateLimiter,
+    get_rate_limiter,
+    get_recipient_domains,
+)
+
+
+class FakeRateLimiter:
+    """Lets through ``tokens`` emails per bucket, then throttles it."""
+
+    def __init__(self, tokens):
+        self.tokens = dict(tokens)
+        self.calls = 0
+
+    def get_buckets(self, email):
+        return {"domain:%s" % domain: 1 for domain in get_recipient_domains(email)}
+
+    def acquire(self, buckets):
+        self.calls += 1
+        empty = [key for key in buckets if self.tokens.get(key, 0) < 1]
+        if empty:
+            return 1.5, empty
+        for key in buckets:
+            self.tokens[key] -= 1
+        return 0, []
+
+
+def make_email(email_id, to):
+    return SimpleNamespace(id=email_id, email_backend_id=1, to=[to], cc=None, bcc=None)
+
+
+class DispatchSchedulerTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_throttling
+    """
+
+    def test_recipient_domains(self):
+        email = SimpleNamespace(
+            to=["Ann <ann@Gmail.com>", "bob@example.com"],
+            cc=["carl@gmail.com"],
+            bcc=None,
+        )
+        self.assertEqual(get_recipient_domains(email), ["example.com", "gmail.com"])
+
+    def test_throttled_emails_are_skipped_not_waited_on(self):
+        emails = [
+            make_email(1, "a@gmail.com"),
+            make_email(2, "b@gmail.com"),
+            make_email(3, "c@example.com"),
+            make_email(4, "d@gmail.com"),
+        ]
+        rate_limiter = FakeRateLimiter({"domain:gmail.com": 1, "domain:example.com": 5})
+        scheduler = DispatchScheduler(emails, rate_limiter)
+
+        ready, wait = scheduler.poll()
+
+        self.assertEqual([email.id for email in ready], [1, 3])
+        self.assertEqual([email.id for email in scheduler.pending], [2, 4])
+        self.assertEqual(wait, 1.5)
+        # Email 4 is deferred without asking the rate limiter again
+        self.assertEqual(rate_limiter.calls, 3)
+
+
+class RateLimiterTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_throttling
+    """
+
+    @override_settings(
+        POST_OFFICE={
+            "BACKEND_RATE_LIMIT": 10,
+            "DOMAIN_RATE_LIMITS": {"Gmail.com": 2},
+            "RATE_LIMIT_BURST": 1,
+        }
+    )
+    def test_a_token_is_taken_per_recipient(self):
+        client = MagicMock()
+        rate_limiter = RateLimiter(client=client)
+        email = SimpleNamespace(
+            email_backend_id=1,
+            to=["a@gmail.com", "b@gmail.com", "c@example.com"],
+            cc=["d@gmail.com"],
+            bcc=["e@gmail.com"],
+        )
+        script = client.register_script.return_value
+        script.return_value = ["0"]
+
+        buckets = rate_limiter.get_buckets(email)
+        rate_limiter.acquire(buckets)
+
+        self.assertEqual(
+            buckets,
+            {
+                "post_office:rate:backend:1": (10, 5),
+                "post_office:rate:domain:gmail.com": (2, 4),
+            },
+        )
+        # Four gmail.com recipients take the whole bucket of two tokens
+        self.assertEqual(script.call_args.kwargs["args"], [10, 10, 5, 2, 2, 2])
+
+    @override_settings(POST_OFFICE={"RATE_LIMIT_ENABLED": True})
+    def test_redis_client_is_reused_across_batches(self):
+        with patch.object(throttling, "_script", None), patch.object(
+            throttling.redis.StrictRedis, "from_url"
+        ) as from_url:
+            first = get_rate_limiter()
+            second = get_rate_limiter()
+
+        from_url.assert_called_once()
+        from_url.return_value.register_script.assert_called_once()
+        self.assertIs(first._script, second._script)
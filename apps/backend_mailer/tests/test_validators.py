@@ -0,0 +1,100 @@
+from unittest.mock import patch
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.test import SimpleTestCase, override_settings
+
+from apps.backend_mailer import validators
+from apps.backend_mailer.utils import parse_emails
+from apps.backend_mailer.validators import (
+    domain_cache,
+    is_valid_email,
+    split_valid_emails,
+    validate_comma_separated_emails,
+)
+
+ADDRESSES = [
+    "ann@example.com",
+    "Ann <ann@example.com>",
+    "first.last+tag@mail.example.co.uk",
+    "o'brien@example.ie",
+    '"quoted name"@example.com',
+    "user@localhost",
+    "user@[127.0.0.1]",
+    "user@[999.0.0.1]",
+    "user@bücher.de",
+    "üser@example.com",
+    "user@-example.com",
+    "user@example",
+    "user@example.c",
+    "first..last@example.com",
+    ".first@example.com",
+    "no-at-sign.example.com",
+    "@example.com",
+    "user@",
+    "",
+    "a" * 310 + "@example.com",
+]
+
+
+class EmailValidatorTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_validators
+    """
+
+    def setUp(self):
+        domain_cache.clear()
+
+    def test_result_matches_django_validator(self):
+        for address in ADDRESSES:
+            recipient = validators.get_recipient(address)
+            try:
+                validate_email(recipient)
+            except ValidationError:
+                expected = False
+            else:
+                expected = True
+            with self.subTest(address=address):
+                self.assertEqual(is_valid_email(address), expected)
+
+    def test_domain_validation_is_memoized(self):
+        with patch.object(
+            validators, "validate_email", wraps=validators.validate_email
+        ) as full_validator:
+            split_valid_emails(["%s@example.com" % i for i in range(100)])
+
+        self.assertEqual(full_validator.call_count, 1)
+
+    @override_settings(POST_OFFICE={"EMAIL_DOMAIN_CACHE_SIZE": 1})
+    def test_cache_size_is_read_from_settings_on_use(self):
+        split_valid_emails(["ann@example.com", "bob@example.org"])
+
+        self.assertEqual(domain_cache.max_size, 1)
+        self.assertEqual(list(domain_cache._entries), ["example.org"])
+
+    def test_full_validator_is_only_used_for_unusual_addresses(self):
+        with patch.object(
+            validators, "validate_email", wraps=validators.validate_email
+        ) as full_validator:
+            split_valid_emails(["ann@example.com", "bob@example.com"])
+            self.assertEqual(full_validator.call_count, 1)
+
+            split_valid_emails(['"quoted name"@example.com'])
+            self.assertEqual(full_validator.call_count, 2)
+
+    def test_recipient_list_is_split(self):
+        valid, rejected = split_valid_emails(
+            ["ann@example.com", "not an email", "Bob <bob@example.com>", "x@y"]
+        )
+
+        self.assertEqual(valid, ["ann@example.com", "Bob <bob@example.com>"])
+        self.assertEqual(rejected, ["not an email", "x@y"])
+
+    def test_first_rejected_address_is_reported(self):
+        with self.assertRaisesMessage(
+            ValidationError, "bad is not a valid email address"
+        ):
+            parse_emails(["ann@example.com", "bad", "worse"])
+
+        with self.assertRaisesMessage(ValidationError, "Invalid email: bad"):
+            validate_comma_separated_emails(["ann@example.com", "bad"])
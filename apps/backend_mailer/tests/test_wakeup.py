@@ -0,0 +1,122 @@
+import datetime
+import time
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase, override_settings
+
+from apps.backend_mailer.constants import BackendConstants
+from apps.backend_mailer.wakeup import QueueWakeup, get_wakeup_countdown
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.renewals = []
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = str(value).encode()
+        return True
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def delete(self, key):
+        return int(self.data.pop(key, None) is not None)
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def pexpire(self, key, milliseconds):
+        return int(key in self.data)
+
+    def register_script(self, script):
+        def release(keys, args):
+            if self.data.get(keys[0]) == args[0].encode():
+                return self.delete(keys[0])
+            return 0
+
+        def renew(keys, args):
+            if self.data.get(keys[0]) == args[0].encode():
+                self.renewals.append(args[0])
+                return 1
+            return 0
+
+        return renew if "pexpire" in script else release
+
+
+class QueueWakeupTests(SimpleTestCase):
+    """
+    ./manage.py test apps.backend_mailer.tests.test_wakeup
+    """
+
+    def setUp(self):
+        self.client = FakeRedis()
+        self.wakeup = QueueWakeup(client=self.client)
+
+    def test_signals_are_coalesced_into_one_drain(self):
+        tokens = [self.wakeup.notify() for _ in range(100)]
+
+        self.assertIsNotNone(tokens[0])
+        self.assertEqual(tokens[1:], [None] * 99)
+
+    def test_periodic_run_skips_while_a_drain_is_in_flight(self):
+        self.wakeup.notify()
+        drains = []
+
+        self.assertFalse(self.wakeup.run(lambda: drains.append(1)))
+        self.assertEqual(drains, [])
+
+    def test_emails_queued_during_a_drain_are_drained(self):
+        token = self.wakeup.notify()
+        drains = []
+
+        def drain():
+            drains.append(1)
+            if len(drains) < 3:
+                # Queued meanwhile, coalesced into the running drain
+                self.assertIsNone(self.wakeup.notify())
+
+        self.assertTrue(self.wakeup.run(drain, token))
+
+        self.assertEqual(len(drains), 3)
+        self.assertEqual(self.client.data, {})
+        self.assertIsNotNone(self.wakeup.notify())
+
+    def test_drain_is_released_when_it_fails(self):
+        token = self.wakeup.notify()
+
+        def drain():
+            raise ValueError("Failed")
+
+        with self.assertRaises(ValueError):
+            self.wakeup.run(drain, token)
+
+        self.assertIsNone(self.client.get(self.wakeup.drain_key))
+
+    @override_settings(
+        POST_OFFICE={"WAKEUP_LEASE": datetime.timedelta(milliseconds=30)}
+    )
+    def test_lease_is_renewed_during_a_long_drain(self):
+        wakeup = QueueWakeup(client=self.client)
+        token = wakeup.notify()
+        renewals = []
+
+        def drain():
+            time.sleep(0.1)
+            renewals.append(len(self.client.renewals))
+
+        self.assertTrue(wakeup.run(drain, token))
+
+        # Once before the pass, then by the heartbeat while it runs
+        self.assertGreater(renewals[0], 1)
+        self.assertEqual(set(self.client.renewals), {token})
+        self.assertEqual(self.client.data, {})
+
+    def test_urgent_emails_are_not_debounced(self):
+        low = SimpleNamespace(priority=BackendConstants.PRIORITY.low)
+        high = SimpleNamespace(priority=BackendConstants.PRIORITY.high)
+
+        self.assertEqual(get_wakeup_countdown([low, high]), 0)
+        self.assertGreater(get_wakeup_countdown([low]), 0)
@@ -0,0 +1,221 @@
+from collections import Counter, deque
+from email.utils import parseaddr
+from typing import Dict, List, Tuple
+
+import redis
+
+from apps.backend_mailer.logutils import setup_loghandlers
+from apps.backend_mailer.settings import (
+    get_backend_rate_limit,
+    get_backend_rate_limits,
+    get_domain_rate_limits,
+    get_rate_limit_burst,
+    get_rate_limit_enabled,
+)
+from config.settings import REDIS_URL
+
+logger = setup_loghandlers("INFO")
+
+# Refills every bucket in KEYS and takes the given number of tokens from
+# each of them atomically, or from none of them. ARGV holds (rate, capacity,
+# tokens) triples for each key. Returns {"0"} when the tokens were taken,
+# otherwise the seconds until all buckets have enough followed by the
+# (1-based) indexes of the short buckets.
+TOKEN_BUCKET_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local wait = 0
+local tokens = {}
+local empty = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 3 - 2])
+    local capacity = tonumber(ARGV[i * 3 - 1])
+    local needed = tonumber(ARGV[i * 3])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local available = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    available = math.min(capacity, available + math.max(0, now - ts) * rate)
+    tokens[i] = available
+    if available < needed then
+        wait = math.max(wait, (needed - available) / rate)
+        table.insert(empty, i)
+    end
+end
+if wait > 0 then
+    table.insert(empty, 1, tostring(wait))
+    return empty
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 3 - 2])
+    local capacity = tonumber(ARGV[i * 3 - 1])
+    local needed = tonumber(ARGV[i * 3])
+    redis.call('HSET', key, 'tokens', tokens[i] - needed, 'ts', now)
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return {"0"}
+"""
+
+
+def count_recipients(email) -> Counter:
+    """
+    Returns the number of recipients of an email per domain, addresses
+    without a domain are counted under "".
+    """
+    counts = Counter()
+    for address in (email.to or []) + (email.cc or []) + (email.bcc or []):
+        _, address = parseaddr(address)
+        domain = address.rsplit("@", 1)[1].lower() if "@" in address else ""
+        counts[domain] += 1
+    return counts
+
+
+def get_recipient_domains(email) -> List[str]:
+    return sorted(domain for domain in count_recipients(email) if domain)
+
+
+class RateLimiter:
+    """
+    Token buckets shared through Redis, one per ``EmailBackend`` and one per
+    recipient domain.
+
+    Rates are given in recipients per second through ``BACKEND_RATE_LIMIT``
+    (every backend), ``BACKEND_RATE_LIMITS`` (per backend id) and
+    ``DOMAIN_RATE_LIMITS`` (per recipient domain), an email takes one token
+    per recipient. Buckets hold ``RATE_LIMIT_BURST`` seconds worth of tokens.
+    """
+
+    def __init__(self, client=None):
+        self.backend_rate = get_backend_rate_limit()
+        self.backend_rates = get_backend_rate_limits()
+        self.domain_rates = {
+            domain.lower(): rate for domain, rate in get_domain_rate_limits().items()
+        }
+        self.burst = get_rate_limit_burst()
+        if client is None:
+            self._script = get_token_bucket_script()
+        else:
+            self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def get_buckets(self, email) -> Dict[str, Tuple[float, int]]:
+        """
+        Returns a mapping of bucket key to ``(rate, tokens)`` for the given
+        email, where tokens is the number of its recipients in the bucket.
+        """
+        buckets = {}
+        counts = count_recipients(email)
+
+        backend_rate = self.backend_rates.get(email.email_backend_id, self.backend_rate)
+        if backend_rate:
+            buckets["post_office:rate:backend:%s" % email.email_backend_id] = (
+                backend_rate,
+                max(sum(counts.values()), 1),
+            )
+
+        for domain, count in sorted(counts.items()):
+            domain_rate = self.domain_rates.get(domain)
+            if domain and domain_rate:
+                buckets["post_office:rate:domain:%s" % domain] = (domain_rate, count)
+
+        return buckets
+
+    def acquire(self, buckets: Dict[str, Tuple[float, int]]) -> Tuple[float, List[str]]:
+        """
+        Takes the given number of tokens from every bucket. Returns ``(0, [])``
+        on success, otherwise the number of seconds to wait and the short
+        bucket keys.
+        """
+        if not buckets:
+            return 0, []
+
+        keys = list(buckets)
+        args = []
+        for rate, tokens in buckets.values():
+            capacity = max(rate * self.burst, 1)
+            # More recipients than a full bucket holds take the whole bucket
+            args.extend([rate, capacity, min(tokens, capacity)])
+
+        try:
+            result = self._script(keys=keys, args=args)
+        except redis.RedisError as e:
+            # Don't stop sending because Redis is unavailable
+            logger.warning("Rate limiter unavailable, not throttling: %s" % e)
+            return 0, []
+
+        wait = float(result[0])
+        return wait, [keys[int(index) - 1] for index in result[1:]]
+
+
+class DispatchScheduler:
+    """
+    Orders a batch of emails for dispatch under the rate limiter.
+
+    Each ``poll()`` returns every pending email whose buckets have a token,
+    skipping past throttled ones instead of waiting on them, so emails for
+    other backends and domains keep flowing while one bucket refills.
+    """
+
+    def __init__(self, emails, rate_limiter: RateLimiter):
+        self.rate_limiter = rate_limiter
+        self._pending = deque(emails)
+
+    def __bool__(self):
+        return bool(self._pending)
+
+    def __len__(self):
+        return len(self._pending)
+
+    @property
+    def pending(self) -> list:
+        return list(self._pending)
+
+    def poll(self) -> Tuple[list, float]:
+        """
+        Returns the emails that can be dispatched now and the number of
+        seconds until the next throttled email may become available.
+        """
+        ready = []
+        deferred = deque()
+        wait = None
+        # Buckets denied during this poll, no need to ask Redis again
+        throttled = {}
+
+        while self._pending:
+            email = self._pending.popleft()
+            buckets = self.rate_limiter.get_buckets(email)
+
+            delay = max((throttled.get(key, 0) for key in buckets), default=0)
+            if not delay:
+                delay, empty_keys = self.rate_limiter.acquire(buckets)
+                for key in empty_keys:
+                    throttled[key] = delay
+
+            if delay:
+                deferred.append(email)
+                wait = delay if wait is None else min(wait, delay)
+            else:
+                ready.append(email)
+
+        self._pending = deferred
+        return ready, wait or 0
+
+
+_script = None
+
+
+def get_token_bucket_script():
+    """
+    Returns the token bucket script registered on the Redis client of this
+    process, the client and its connection pool are reused across batches.
+    """
+    global _script
+    if _script is None:
+        client = redis.StrictRedis.from_url(REDIS_URL)
+        _script = client.register_script(TOKEN_BUCKET_SCRIPT)
+    return _script
+
+
+def get_rate_limiter():
+    """Returns a RateLimiter, or None when throttling is disabled."""
+    if not get_rate_limit_enabled():
+        return None
+    return RateLimiter()
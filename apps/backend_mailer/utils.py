@@ -4,6 +4,7 @@ from django.core.files import File
 from django.utils.encoding import force_str
 
 from apps.backend_mailer import cache
+from apps.backend_mailer.attachment_gc import collect_orphan_attachments
 from apps.backend_mailer.models import (
     Email,
     EmailTemplate,
@@ -13,7 +14,7 @@ from apps.backend_mailer.constants import BackendConstants
 from apps.backend_mailer.settings import get_default_priority, fernet
 from apps.backend_mailer.signals import email_queued
 
-from apps.backend_mailer.validators import validate_email_with_name
+from apps.backend_mailer.validators import split_valid_emails
 
 
 def send_mail(
@@ -160,11 +161,9 @@ def parse_emails(emails):
     elif emails is None:
         emails = []
 
-    for email in emails:
-        try:
-            validate_email_with_name(email)
-        except ValidationError:
-            raise ValidationError("%s is not a valid email address" % email)
+    _, rejected = split_valid_emails(emails)
+    if rejected:
+        raise ValidationError("%s is not a valid email address" % rejected[0])
 
     return emails
 
@@ -186,20 +185,10 @@ def cleanup_expired_mails(cutoff_date, delete_attachments=True, batch_size=1000)
 
         _, deleted_data = Email.objects.filter(id__in=email_ids).delete()
         if deleted_data:
-            total_deleted_emails += deleted_data["post_office.Email"]
+            total_deleted_emails += deleted_data.get("backend_mailer.Email", 0)
 
     attachments_count = 0
     if delete_attachments:
-        while True:
-            attachments = Attachment.objects.filter(emails=None)[:batch_size]
-            if not attachments:
-                break
-            attachment_ids = set()
-            for attachment in attachments:
-                # Delete the actual file
-                attachment.file.delete()
-                attachment_ids.add(attachment.id)
-            deleted_count, _ = Attachment.objects.filter(id__in=attachment_ids).delete()
-            attachments_count += deleted_count
+        attachments_count, _ = collect_orphan_attachments(batch_size)
 
     return total_deleted_emails, attachments_count
@@ -1,25 +1,135 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Tuple
+
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
 from django.template import Template, TemplateSyntaxError, TemplateDoesNotExist
 from django.utils.encoding import force_str
 
+from apps.backend_mailer.settings import get_email_domain_cache_size
 
-def validate_email_with_name(value):
-    """
-    Validate email address.
+# Maximum length of an email address per RFC 3696 section 3
+EMAIL_MAX_LENGTH = 320
+# The dot-atom local part accepted by django's EmailValidator, quoted local
+# parts are left to the full validator
+LOCAL_PART_REGEX = re.compile(
+    r"[-!#$%&'*+/=?^_`{}|~0-9A-Z]+(?:\.[-!#$%&'*+/=?^_`{}|~0-9A-Z]+)*\Z",
+    re.IGNORECASE,
+)
 
-    Both "Recipient Name <email@example.com>" and "email@example.com" are valid.
-    """
-    value = force_str(value)
 
-    recipient = value
+def get_recipient(value: str) -> str:
+    """Returns the address of "Recipient Name <email@example.com>"."""
     if "<" in value and ">" in value:
         start = value.find("<") + 1
         end = value.find(">")
         if start < end:
-            recipient = value[start:end]
+            return value[start:end]
+    return value
+
+
+class DomainCache:
+    """
+    In-process LRU of validated domain parts.
+
+    The size is read from ``EMAIL_DOMAIN_CACHE_SIZE`` on use unless given,
+    so the module level cache follows settings overridden after import.
+    """
+
+    def __init__(self, max_size: int = None):
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size or get_email_domain_cache_size()
+
+    def get(self, domain: str):
+        with self._lock:
+            valid = self._entries.get(domain)
+            if valid is not None:
+                self._entries.move_to_end(domain)
+            return valid
+
+    def store(self, domain: str, valid: bool) -> None:
+        with self._lock:
+            self._entries[domain] = valid
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+domain_cache = DomainCache()
+
+
+def is_valid_domain(domain: str) -> bool:
+    """
+    Validates a domain part with django's EmailValidator, recipient lists
+    repeat a handful of domains so the result is memoized.
+    """
+    valid = domain_cache.get(domain)
+    if valid is not None:
+        return valid
+
+    try:
+        validate_email("user@" + domain)
+    except ValidationError:
+        valid = False
+    else:
+        valid = True
+    domain_cache.store(domain, valid)
+    return valid
+
+
+def is_valid_email(value) -> bool:
+    """
+    Same result as ``validate_email_with_name`` without raising. Common
+    addresses are checked with a precompiled regex and a memoized domain
+    check, anything else goes through the full validator.
+    """
+    recipient = get_recipient(force_str(value))
+    if not recipient or len(recipient) > EMAIL_MAX_LENGTH:
+        return False
+
+    local_part, at, domain = recipient.rpartition("@")
+    if not at:
+        return False
+    if LOCAL_PART_REGEX.match(local_part):
+        return is_valid_domain(domain)
+
+    try:
+        validate_email(recipient)
+    except ValidationError:
+        return False
+    return True
+
 
-    validate_email(recipient)
+def split_valid_emails(values: Iterable) -> Tuple[List, List]:
+    """
+    Returns the valid and the rejected addresses of a recipient list.
+    """
+    valid, rejected = [], []
+    for value in values:
+        (valid if is_valid_email(value) else rejected).append(value)
+    return valid, rejected
+
+
+def validate_email_with_name(value):
+    """
+    Validate email address.
+
+    Both "Recipient Name <email@example.com>" and "email@example.com" are valid.
+    """
+    if not is_valid_email(value):
+        raise ValidationError(
+            validate_email.message, code=validate_email.code, params={"value": value}
+        )
 
 
 def validate_comma_separated_emails(value):
@@ -29,11 +139,9 @@ def validate_comma_separated_emails(value):
     if not isinstance(value, (tuple, list)):
         raise ValidationError("Email list must be a list/tuple.")
 
-    for email in value:
-        try:
-            validate_email_with_name(email)
-        except ValidationError:
-            raise ValidationError("Invalid email: %s" % email, code="invalid")
+    _, rejected = split_valid_emails(value)
+    if rejected:
+        raise ValidationError("Invalid email: %s" % rejected[0], code="invalid")
 
 
 def validate_template_syntax(source):
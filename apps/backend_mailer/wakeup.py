@@ -0,0 +1,172 @@
+import threading
+from typing import Callable, Optional
+from uuid import uuid4
+
+import redis
+
+from apps.backend_mailer.constants import BackendConstants
+from apps.backend_mailer.logutils import setup_loghandlers
+from apps.backend_mailer.settings import (
+    get_wakeup_debounce,
+    get_wakeup_enabled,
+    get_wakeup_lease,
+)
+from config.settings import REDIS_URL
+
+logger = setup_loghandlers("INFO")
+
+# Deletes KEYS[1] only while it still holds the token in ARGV[1]
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Renews KEYS[1] for ARGV[2] milliseconds only while it still holds the
+# token in ARGV[1]
+RENEW_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+URGENT_PRIORITIES = {BackendConstants.PRIORITY.high, BackendConstants.PRIORITY.now}
+
+
+class QueueWakeup:
+    """
+    Coalesces ``email_queued`` signals into at most one in-flight drain per
+    shard.
+
+    The drain key of a shard holds the token of the drain that is scheduled
+    or running. Signals always mark the shard dirty but only the one that
+    sets the drain key starts a drain. The drain passes over the queue again
+    while the shard is dirty and hands the key back only once it is clean.
+    While a pass runs, a heartbeat keeps renewing the key, so it only
+    expires, after ``WAKEUP_LEASE``, once the drain's worker died.
+    """
+
+    def __init__(self, shard="default", client=None):
+        self.client = client or redis.StrictRedis.from_url(REDIS_URL)
+        self.shard = shard
+        self.drain_key = "post_office:wakeup:%s:drain" % shard
+        self.dirty_key = "post_office:wakeup:%s:dirty" % shard
+        self.lease = int(get_wakeup_lease().total_seconds() * 1000)
+        self._release = self.client.register_script(RELEASE_SCRIPT)
+        self._renew = self.client.register_script(RENEW_SCRIPT)
+
+    def acquire(self) -> Optional[str]:
+        token = uuid4().hex
+        if self.client.set(self.drain_key, token, nx=True, px=self.lease):
+            return token
+        return None
+
+    def release(self, token: str) -> None:
+        self._release(keys=[self.drain_key], args=[token])
+
+    def renew(self, token: str) -> bool:
+        return bool(self._renew(keys=[self.drain_key], args=[token, self.lease]))
+
+    def notify(self) -> Optional[str]:
+        """
+        Marks the shard dirty. Returns a token when the caller has to start
+        a drain, ``None`` when one is already scheduled or running.
+        """
+        try:
+            self.client.set(self.dirty_key, 1, px=self.lease)
+            return self.acquire()
+        except redis.RedisError as e:
+            # The periodic drain still picks the emails up
+            logger.warning("Queue wakeup unavailable: %s" % e)
+            return None
+
+    def run(self, drain: Callable[[], None], token: Optional[str] = None) -> bool:
+        """
+        Runs ``drain`` until no emails were queued during the last pass.
+        Without a token, e.g. from the periodic task, the drain only runs
+        when none is in flight. Returns whether it ran.
+        """
+        try:
+            token = token or self.acquire()
+        except redis.RedisError as e:
+            logger.warning("Queue wakeup unavailable, draining anyway: %s" % e)
+            drain()
+            return True
+        if token is None:
+            logger.info("A drain of the %s queue is already in flight" % self.shard)
+            return False
+
+        heartbeat = LeaseHeartbeat(self, token)
+        heartbeat.start()
+        try:
+            while token is not None:
+                heartbeat.token = token
+                self.client.delete(self.dirty_key)
+                self.renew(token)
+                drain()
+                if self.client.exists(self.dirty_key):
+                    continue
+                self.release(token)
+                token = None
+                # Emails queued between the check and the release found the
+                # key taken, so pick them up unless a new drain got it
+                if self.client.exists(self.dirty_key):
+                    token = self.acquire()
+        except BaseException:
+            if token is not None:
+                self.release(token)
+            raise
+        finally:
+            heartbeat.stop()
+        return True
+
+
+class LeaseHeartbeat(threading.Thread):
+    """
+    Renews the drain key of a QueueWakeup every third of its lease while
+    the drain holding ``token`` runs.
+    """
+
+    def __init__(self, wakeup: QueueWakeup, token: str):
+        super().__init__(name="wakeup-heartbeat-%s" % wakeup.shard, daemon=True)
+        self.wakeup = wakeup
+        self.token = token
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.wakeup.lease / 3000):
+            try:
+                self.wakeup.renew(self.token)
+            except redis.RedisError as e:
+                # Retried on the next beat, the key outlives a few misses
+                logger.warning("Failed to renew the drain lease: %s" % e)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def is_urgent(emails) -> bool:
+    return any(email.priority in URGENT_PRIORITIES for email in emails or [])
+
+
+def get_wakeup_countdown(emails) -> float:
+    """Urgent emails start a drain at once, others wait for more emails."""
+    return 0 if is_urgent(emails) else get_wakeup_debounce()
+
+
+_wakeups = {}
+
+
+def get_queue_wakeup(shard="default"):
+    """
+    Returns the QueueWakeup of a shard for this process, or None when
+    wakeups are disabled.
+    """
+    if not get_wakeup_enabled():
+        return None
+    if shard not in _wakeups:
+        _wakeups[shard] = QueueWakeup(shard)
+    return _wakeups[shard]
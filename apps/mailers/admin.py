@@ -11,6 +11,8 @@ class CampaignAdmin(admin.ModelAdmin):
         "author",
         "status",
         "message",
+        "released_emails",
+        "total_emails",
         "created_at",
         "updated_at",
     )
@@ -35,8 +35,8 @@ class CampaignConstants:
 
     """ STATUS ->"""
     STATUS = namedtuple(
-        "STATUS", "created started completed stopped error ai_mailing sending "
-    )._make(range(7))
+        "STATUS", "created started completed stopped error ai_mailing sending building"
+    )._make(range(8))
 
     STATUS_CHOICES = [
         (STATUS.created, _("created")),
@@ -46,5 +46,6 @@ class CampaignConstants:
         (STATUS.error, _("Error")),
         (STATUS.ai_mailing, _("AI Mailing")),
         (STATUS.sending, _("Sending")),
+        (STATUS.building, _("Building audience")),
     ]
     """ STATUS ->"""
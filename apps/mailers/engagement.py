@@ -0,0 +1,184 @@
+import datetime
+import logging
+import os
+import socket
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import redis
+from django.db import connection, transaction
+
+from apps.backend_mailer.settings import get_tracking_batch_size
+from apps.mailers.models import Campaign, CampaignStats, MessageEngagement
+from apps.mailers.stats import upsert_stats
+from apps.mailers.tracking import CLICK, OPEN, TRACKING_STREAM
+from config.settings import REDIS_URL
+
+logger = logging.getLogger(__name__)
+
+CONSUMER_GROUP = "engagement"
+
+# Events a consumer read but didn't acknowledge for this long are taken
+# over, e.g. after the consumer died
+CLAIM_IDLE_MS = 60000
+
+ENGAGEMENT_FIELDS = (
+    "opens",
+    "clicks",
+    "first_opened_at",
+    "last_opened_at",
+    "first_clicked_at",
+    "last_clicked_at",
+)
+
+
+def parse_event(fields: Dict[bytes, bytes]) -> Optional[Dict]:
+    try:
+        return {
+            "kind": fields[b"kind"].decode(),
+            "email_id": int(fields[b"email"]),
+            "campaign_id": int(fields[b"campaign"]) if fields[b"campaign"] else None,
+            "time": datetime.datetime.fromtimestamp(
+                float(fields[b"time"]), tz=datetime.timezone.utc
+            ),
+        }
+    except (KeyError, ValueError):
+        return None
+
+
+def fold_events(events: List[Dict]) -> Dict[int, Counter]:
+    """
+    Adds the events to the engagement rows of their emails and returns the
+    per-campaign deltas of emails opened or clicked for the first time.
+    """
+    events_by_email = defaultdict(list)
+    for event in events:
+        if event["kind"] in (OPEN, CLICK):
+            events_by_email[event["email_id"]].append(event)
+    if not events_by_email:
+        return {}
+
+    email_ids = sorted(events_by_email)
+    # Missing rows are created first so concurrent consumers lock the same
+    # rows and an email is never counted as first opened twice
+    MessageEngagement.objects.bulk_create(
+        [
+            MessageEngagement(
+                email_id=email_id,
+                campaign_id=events_by_email[email_id][0]["campaign_id"],
+            )
+            for email_id in email_ids
+        ],
+        ignore_conflicts=True,
+    )
+    engagements = MessageEngagement.objects.select_for_update().in_bulk(email_ids)
+
+    deltas = defaultdict(Counter)
+    for email_id, email_events in events_by_email.items():
+        engagement = engagements[email_id]
+        for event in sorted(email_events, key=lambda event: event["time"]):
+            prefix = "opened" if event["kind"] == OPEN else "clicked"
+            if getattr(engagement, "first_%s_at" % prefix) is None:
+                setattr(engagement, "first_%s_at" % prefix, event["time"])
+                if engagement.campaign_id:
+                    deltas[engagement.campaign_id][event["kind"] + "s"] += 1
+            setattr(engagement, "last_%s_at" % prefix, event["time"])
+            if event["kind"] == OPEN:
+                engagement.opens += 1
+            else:
+                engagement.clicks += 1
+
+    MessageEngagement.objects.bulk_update(
+        engagements.values(), ENGAGEMENT_FIELDS, batch_size=1000
+    )
+    return deltas
+
+
+def update_campaign_rates(campaign_ids: List[int]) -> None:
+    """
+    Copies unique clicks to ``Campaign.visitor_clicks`` and sets
+    ``Campaign.open_rate`` to the percentage of sent emails that were opened.
+    """
+    campaign = connection.ops.quote_name(Campaign._meta.db_table)
+    stats = connection.ops.quote_name(CampaignStats._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE {campaign} SET visitor_clicks = {stats}.clicks, "
+            "open_rate = COALESCE(LEAST(100, {stats}.opens * 100 / "
+            "COALESCE(NULLIF({stats}.sent, 0), NULLIF({campaign}.total_emails, 0))), 0) "
+            "FROM {stats} WHERE {stats}.campaign_id = {campaign}.id "
+            "AND {campaign}.id = ANY(%s)".format(campaign=campaign, stats=stats),
+            [campaign_ids],
+        )
+
+
+class EngagementConsumer:
+    """
+    Reads tracking events from the stream as a member of a consumer group
+    and acknowledges them once they are folded into the database.
+    """
+
+    def __init__(self, client=None, name=None):
+        self.client = client or redis.StrictRedis.from_url(REDIS_URL)
+        self.name = name or "%s-%s" % (socket.gethostname(), os.getpid())
+
+    def ensure_group(self) -> None:
+        try:
+            self.client.xgroup_create(
+                TRACKING_STREAM, CONSUMER_GROUP, id="0", mkstream=True
+            )
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def read(self, count: int):
+        """Returns stale events of dead consumers first, then new ones."""
+        claimed = self.client.xautoclaim(
+            TRACKING_STREAM,
+            CONSUMER_GROUP,
+            self.name,
+            min_idle_time=CLAIM_IDLE_MS,
+            start_id="0-0",
+            count=count,
+        )
+        if claimed[1]:
+            return claimed[1]
+        streams = self.client.xreadgroup(
+            CONSUMER_GROUP, self.name, {TRACKING_STREAM: ">"}, count=count
+        )
+        return streams[0][1] if streams else []
+
+    def ack(self, message_ids) -> None:
+        self.client.xack(TRACKING_STREAM, CONSUMER_GROUP, *message_ids)
+        self.client.xdel(TRACKING_STREAM, *message_ids)
+
+    def consume(self, batch_size: Optional[int] = None) -> int:
+        """
+        Folds batches of events into the engagement rows and campaign stats
+        until the stream is drained. Returns the number of events.
+        """
+        batch_size = batch_size or get_tracking_batch_size()
+        self.ensure_group()
+        consumed = 0
+        while True:
+            messages = self.read(batch_size)
+            if not messages:
+                break
+            events = [
+                event
+                for event in (parse_event(fields) for _, fields in messages)
+                if event is not None
+            ]
+            with transaction.atomic():
+                deltas = fold_events(events)
+                if deltas:
+                    upsert_stats(deltas)
+                    update_campaign_rates(sorted(deltas))
+            self.ack([message_id for message_id, _ in messages])
+            consumed += len(messages)
+            if len(messages) < batch_size:
+                break
+
+        if consumed:
+            logger.info(f"Folded {consumed} tracking events")
+        return consumed
@@ -0,0 +1,44 @@
+# Generated by Django 5.0.6 on 2026-10-18 18:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "mailers",
+            "0004_remove_campaign_comment_remove_campaign_country_tag_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="campaign",
+            name="next_wave_at",
+            field=models.DateTimeField(
+                blank=True, help_text="Time the next wave is released", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="campaign",
+            name="released_emails",
+            field=models.PositiveIntegerField(
+                default=0, help_text="Emails released into the queue"
+            ),
+        ),
+        migrations.AddField(
+            model_name="campaign",
+            name="total_emails",
+            field=models.PositiveIntegerField(default=0, help_text="Emails to deliver"),
+        ),
+        migrations.AddField(
+            model_name="campaign",
+            name="wave_size",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="Emails released into the queue per wave",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.0.6 on 2026-10-18 18:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailers", "0005_campaign_waves"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CampaignStats",
+            fields=[
+                (
+                    "campaign",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="mailers.campaign",
+                    ),
+                ),
+                (
+                    "sent",
+                    models.PositiveBigIntegerField(default=0, help_text="Sent emails"),
+                ),
+                (
+                    "failed",
+                    models.PositiveBigIntegerField(
+                        default=0, help_text="Failed emails"
+                    ),
+                ),
+                (
+                    "requeued",
+                    models.PositiveBigIntegerField(
+                        default=0, help_text="Delivery attempts that were retried"
+                    ),
+                ),
+                (
+                    "bounced",
+                    models.PositiveBigIntegerField(
+                        default=0, help_text="Failed emails refused permanently"
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Campaign stats",
+                "verbose_name_plural": "Campaign stats",
+            },
+        ),
+    ]
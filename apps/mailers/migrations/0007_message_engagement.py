@@ -0,0 +1,66 @@
+# Generated by Django 5.0.6 on 2026-10-18 18:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend_mailer", "0010_email_source_campaign"),
+        ("mailers", "0006_campaign_stats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="campaignstats",
+            name="clicks",
+            field=models.PositiveBigIntegerField(
+                default=0, help_text="Emails with at least one clicked link"
+            ),
+        ),
+        migrations.AddField(
+            model_name="campaignstats",
+            name="opens",
+            field=models.PositiveBigIntegerField(
+                default=0, help_text="Emails opened at least once"
+            ),
+        ),
+        migrations.CreateModel(
+            name="MessageEngagement",
+            fields=[
+                (
+                    "email",
+                    models.OneToOneField(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="engagement",
+                        serialize=False,
+                        to="backend_mailer.email",
+                    ),
+                ),
+                ("opens", models.PositiveIntegerField(default=0, help_text="Opens")),
+                ("clicks", models.PositiveIntegerField(default=0, help_text="Clicks")),
+                ("first_opened_at", models.DateTimeField(blank=True, null=True)),
+                ("last_opened_at", models.DateTimeField(blank=True, null=True)),
+                ("first_clicked_at", models.DateTimeField(blank=True, null=True)),
+                ("last_clicked_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "campaign",
+                    models.ForeignKey(
+                        blank=True,
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="engagements",
+                        to="mailers.campaign",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Message engagement",
+                "verbose_name_plural": "Message engagements",
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-18 18:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailers", "0007_message_engagement"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="campaign",
+            name="status",
+            field=models.PositiveSmallIntegerField(
+                choices=[
+                    (0, "created"),
+                    (1, "started"),
+                    (2, "Completed"),
+                    (3, "Stopped"),
+                    (4, "Error"),
+                    (5, "AI Mailing"),
+                    (6, "Sending"),
+                    (7, "Building audience"),
+                ],
+                default=0,
+                help_text="Campaign status",
+            ),
+        ),
+    ]
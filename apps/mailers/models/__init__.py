@@ -1 +1,3 @@
 from apps.mailers.models.campaign import Campaign
+from apps.mailers.models.campaign_stats import CampaignStats
+from apps.mailers.models.engagement import MessageEngagement
@@ -56,5 +56,19 @@ class Campaign(DeleteModelMixin, DateModelMixin, models.Model):
     message = models.ForeignKey(
         Email, on_delete=models.CASCADE, help_text=_("Message for campaign")
     )
+    wave_size = models.PositiveIntegerField(
+        help_text=_("Emails released into the queue per wave"),
+        null=True,
+        blank=True,
+    )
+    total_emails = models.PositiveIntegerField(
+        help_text=_("Emails to deliver"), default=0
+    )
+    released_emails = models.PositiveIntegerField(
+        help_text=_("Emails released into the queue"), default=0
+    )
+    next_wave_at = models.DateTimeField(
+        help_text=_("Time the next wave is released"), null=True, blank=True
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
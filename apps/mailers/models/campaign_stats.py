@@ -0,0 +1,37 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+from apps.mailers.models.campaign import Campaign
+
+
+class CampaignStats(models.Model):
+    """
+    Delivery counters of a campaign, kept up to date from the deltas the
+    sender buffers in Redis, see mailers.stats.
+    """
+
+    campaign = models.OneToOneField(
+        Campaign,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+    )
+    sent = models.PositiveBigIntegerField(help_text=_("Sent emails"), default=0)
+    failed = models.PositiveBigIntegerField(help_text=_("Failed emails"), default=0)
+    requeued = models.PositiveBigIntegerField(
+        help_text=_("Delivery attempts that were retried"), default=0
+    )
+    bounced = models.PositiveBigIntegerField(
+        help_text=_("Failed emails refused permanently"), default=0
+    )
+    opens = models.PositiveBigIntegerField(
+        help_text=_("Emails opened at least once"), default=0
+    )
+    clicks = models.PositiveBigIntegerField(
+        help_text=_("Emails with at least one clicked link"), default=0
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Campaign stats")
+        verbose_name_plural = _("Campaign stats")
@@ -0,0 +1,39 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+from apps.backend_mailer.models import Email
+from apps.mailers.models.campaign import Campaign
+
+
+class MessageEngagement(models.Model):
+    """
+    Opens and clicks of one email, folded in from the tracking stream, see
+    mailers.engagement. Rows outlive archived emails, so the foreign keys
+    have no database constraint.
+    """
+
+    email = models.OneToOneField(
+        Email,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        db_constraint=False,
+        related_name="engagement",
+    )
+    campaign = models.ForeignKey(
+        Campaign,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        db_constraint=False,
+        related_name="engagements",
+    )
+    opens = models.PositiveIntegerField(help_text=_("Opens"), default=0)
+    clicks = models.PositiveIntegerField(help_text=_("Clicks"), default=0)
+    first_opened_at = models.DateTimeField(null=True, blank=True)
+    last_opened_at = models.DateTimeField(null=True, blank=True)
+    first_clicked_at = models.DateTimeField(null=True, blank=True)
+    last_clicked_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("Message engagement")
+        verbose_name_plural = _("Message engagements")
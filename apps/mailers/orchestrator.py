@@ -0,0 +1,146 @@
+import logging
+from typing import Dict, Optional
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from apps.backend_mailer.constants import BackendConstants
+from apps.backend_mailer.models import Email
+from apps.backend_mailer.settings import (
+    get_campaign_wave_interval,
+    get_campaign_wave_size,
+)
+from apps.backend_mailer.signals import email_queued
+from apps.mailers.constants import CampaignConstants
+from apps.mailers.models import Campaign
+
+logger = logging.getLogger(__name__)
+
+# Campaign statuses the orchestrator advances
+ACTIVE_STATUSES = [CampaignConstants.STATUS.started, CampaignConstants.STATUS.sending]
+
+# Email statuses of a campaign that still have to be delivered
+PENDING_STATUSES = [
+    BackendConstants.STATUS.created,
+    BackendConstants.STATUS.queued,
+    BackendConstants.STATUS.requeued,
+    BackendConstants.STATUS.sending,
+]
+
+
+def get_audience(campaign: Campaign):
+    """
+    Emails generated for the campaign, or its message alone for campaigns
+    sending a single email.
+    """
+    emails = Email.objects.filter(source_campaign=campaign)
+    if emails.exists():
+        return emails
+    return Email.objects.filter(id=campaign.message_id)
+
+
+def adopt_message(campaign: Campaign) -> None:
+    """
+    Links the message of a campaign sending a single email to the campaign,
+    so its outcome is counted in the campaign's stats.
+    """
+    if not Email.objects.filter(source_campaign=campaign).exists():
+        Email.objects.filter(id=campaign.message_id, source_campaign=None).update(
+            source_campaign=campaign
+        )
+
+
+def get_progress(campaign: Campaign) -> Dict[int, int]:
+    """Number of the campaign's emails per email status."""
+    return dict(
+        get_audience(campaign)
+        .order_by()
+        .values_list("status")
+        .annotate(count=Count("id"))
+    )
+
+
+def release_wave(campaign: Campaign, wave_size: int) -> list:
+    """
+    Queues the next ``wave_size`` emails of the campaign that haven't been
+    queued yet. Returns the released emails.
+    """
+    wave = list(
+        get_audience(campaign)
+        .filter(status=BackendConstants.STATUS.created)
+        .select_for_update(skip_locked=True)
+        .order_by("id")
+        .only("id", "priority")[:wave_size]
+    )
+    if wave:
+        Email.objects.filter(id__in=[email.id for email in wave]).update(
+            status=BackendConstants.STATUS.queued
+        )
+    return wave
+
+
+def finish_campaign(campaign: Campaign) -> Optional[int]:
+    """
+    Completes a campaign once all its emails were released and delivered,
+    or fails it when none of them could be sent. Returns the new status.
+    """
+    progress = get_progress(campaign)
+    if any(progress.get(status) for status in PENDING_STATUSES):
+        return None
+
+    if progress.get(BackendConstants.STATUS.failed) and not progress.get(
+        BackendConstants.STATUS.sent
+    ):
+        status = CampaignConstants.STATUS.error
+    else:
+        status = CampaignConstants.STATUS.completed
+    Campaign.objects.filter(
+        id=campaign.id, status=CampaignConstants.STATUS.sending
+    ).update(status=status)
+    logger.info(f"Campaign {campaign.id} finished with {progress}")
+    return status
+
+
+def advance_campaign(campaign_id: int, now=None) -> Optional[int]:
+    """
+    Moves one campaign forward: a started campaign starts sending, a wave
+    of its emails is released once per ``CAMPAIGN_WAVE_INTERVAL`` and it
+    is finished when nothing is left to deliver. Campaigns another worker
+    is advancing are skipped. Returns the number of released emails.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        campaign = (
+            Campaign.objects.select_for_update(skip_locked=True)
+            .filter(id=campaign_id, status__in=ACTIVE_STATUSES)
+            .first()
+        )
+        if campaign is None:
+            return None
+
+        update_fields = ["released_emails", "next_wave_at", "updated_at"]
+        if campaign.status == CampaignConstants.STATUS.started:
+            adopt_message(campaign)
+            campaign.status = CampaignConstants.STATUS.sending
+            campaign.total_emails = get_audience(campaign).count()
+            update_fields += ["status", "total_emails"]
+
+        wave = None
+        if campaign.next_wave_at is None or campaign.next_wave_at <= now:
+            wave = release_wave(
+                campaign, campaign.wave_size or get_campaign_wave_size()
+            )
+            campaign.released_emails += len(wave)
+            campaign.next_wave_at = now + get_campaign_wave_interval()
+        campaign.save(update_fields=update_fields)
+
+    if wave is None:
+        return 0
+    if wave:
+        logger.info(f"Released {len(wave)} emails of campaign {campaign.id}")
+        email_queued.send(sender=Email, emails=wave)
+    else:
+        # Everything was released, wait for the deliveries to finish
+        finish_campaign(campaign)
+    return len(wave)
@@ -0,0 +1,178 @@
+import logging
+from typing import Iterator, List, Optional, Tuple
+
+from django.db import connection
+from django.db.models import CharField, Exists, F, Func, OuterRef, QuerySet, Value
+from django.db.models.functions import Lower
+
+from apps.backend_mailer.constants import BackendConstants
+from apps.backend_mailer.mail import send_stream
+from apps.backend_mailer.models import Email
+from apps.backend_mailer.settings import get_enqueue_chunk_size
+from apps.mail_servers.models.mailer import Base
+from apps.mailers.constants import CampaignConstants
+from apps.mailers.models import Campaign
+
+logger = logging.getLogger(__name__)
+
+
+class SplitPart(Func):
+    function = "SPLIT_PART"
+    output_field = CharField()
+
+
+def get_segment(
+    sessions: List[int],
+    statuses: Optional[List[str]] = None,
+    domains: Optional[List[str]] = None,
+    exclude_sessions: Optional[List[int]] = None,
+    exclude_domains: Optional[List[str]] = None,
+    dedupe: bool = True,
+) -> QuerySet:
+    """
+    Base rows matching the filters, annotated with their lowercased
+    ``address`` and ``domain``. Addresses found in one of the
+    ``exclude_sessions`` are left out. With ``dedupe`` every address is
+    kept once, from its oldest row. Everything is filtered by Postgres in
+    a single query. At least one session is required, so a segment never
+    spans every imported row.
+    """
+    if not sessions:
+        raise ValueError("A segment needs at least one session")
+    segment = (
+        Base.objects.filter(email__contains="@", session_id__in=sessions)
+        .annotate(address=Lower("email"))
+        .annotate(domain=SplitPart(F("address"), Value("@"), Value(2)))
+    )
+    if statuses:
+        segment = segment.filter(status__in=statuses)
+    if domains:
+        segment = segment.filter(domain__in=[domain.lower() for domain in domains])
+    if exclude_domains:
+        segment = segment.exclude(
+            domain__in=[domain.lower() for domain in exclude_domains]
+        )
+    if exclude_sessions:
+        excluded = (
+            Base.objects.filter(session_id__in=exclude_sessions)
+            .annotate(address=Lower("email"))
+            .filter(address=OuterRef("address"))
+        )
+        segment = segment.filter(~Exists(excluded))
+
+    if dedupe:
+        return segment.order_by("address", "id").distinct("address")
+    return segment.order_by("id")
+
+
+def iter_recipients(
+    segment: QuerySet, chunk_size: Optional[int] = None
+) -> Iterator[Tuple[str, dict]]:
+    """
+    Yields ``(address, context)`` for the rows of a segment, read through a
+    server-side cursor so the segment is never loaded at once.
+    """
+    rows = segment.values_list("id", "address", "first", "last").iterator(
+        chunk_size=chunk_size or get_enqueue_chunk_size()
+    )
+    for base_id, address, first, last in rows:
+        yield address, {"base_id": base_id, "first": first or "", "last": last or ""}
+
+
+def clear_audience(campaign: Campaign) -> int:
+    """
+    Deletes the emails generated for a campaign that hasn't started yet.
+    They have no logs or attachments, so rows are deleted without the ORM
+    collecting them first.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM %s WHERE source_campaign_id = %%s AND status = %%s "
+            "AND id <> %%s" % connection.ops.quote_name(Email._meta.db_table),
+            [campaign.id, BackendConstants.STATUS.created, campaign.message_id],
+        )
+        return cursor.rowcount
+
+
+class AudienceBuildAborted(Exception):
+    """The campaign left the ``building`` status while its emails were generated."""
+
+
+def iter_while_building(
+    campaign: Campaign, recipients: Iterator, chunk_size: int
+) -> Iterator:
+    """
+    Passes ``recipients`` through, checking before every chunk that the
+    campaign is still being built.
+    """
+    for index, recipient in enumerate(recipients):
+        if (
+            index % chunk_size == 0
+            and not Campaign.objects.filter(
+                id=campaign.id, status=CampaignConstants.STATUS.building
+            ).exists()
+        ):
+            raise AudienceBuildAborted(
+                f"Campaign {campaign.id} is no longer building its audience"
+            )
+        yield recipient
+
+
+def build_campaign_audience(
+    campaign: Campaign, chunk_size: Optional[int] = None, **filters
+) -> Tuple[int, int]:
+    """
+    Generates one email per recipient of the segment described by
+    ``filters`` (see ``get_segment``) from the campaign's message. The
+    campaign has to be in the ``building`` status, which keeps it from
+    starting, and is back to ``created`` once the build is done. The
+    emails wait with status ``created`` until the orchestrator releases
+    them in waves, a previously built audience is replaced and a failed
+    build leaves none. Returns the number of generated and rejected
+    recipients.
+    """
+    if campaign.status != CampaignConstants.STATUS.building:
+        raise ValueError("The audience of a started campaign can't be changed")
+
+    try:
+        cleared = clear_audience(campaign)
+        if cleared:
+            logger.info(f"Cleared {cleared} emails of campaign {campaign.id}")
+
+        message = campaign.message
+        priority = message.priority
+        if priority == BackendConstants.PRIORITY.now:
+            priority = None
+        chunk_size = chunk_size or get_enqueue_chunk_size()
+        recipients = iter_recipients(get_segment(**filters), chunk_size)
+        queued, rejected = send_stream(
+            iter_while_building(campaign, recipients, chunk_size),
+            sender=message.from_email,
+            template=message.template,
+            subject=message.subject,
+            message=message.message,
+            html_message=message.html_message,
+            context=message.context,
+            headers=message.headers,
+            priority=priority,
+            render_on_delivery=bool(message.template),
+            email_backend=message.email_backend,
+            author=campaign.author,
+            chunk_size=chunk_size,
+            source_campaign=campaign,
+        )
+    except Exception:
+        # A partial audience is never left behind for a later start. A
+        # killed worker never gets here, its campaign stays ``building``
+        clear_audience(campaign)
+        raise
+    finally:
+        Campaign.objects.filter(
+            id=campaign.id, status=CampaignConstants.STATUS.building
+        ).update(status=CampaignConstants.STATUS.created)
+
+    logger.info(
+        f"Built audience of campaign {campaign.id}: {queued} emails, "
+        f"{rejected} rejected"
+    )
+    return queued, rejected
@@ -1,6 +1,9 @@
-from apps.mailers.models import Campaign
+from apps.mailers.models import Campaign, CampaignStats
+from django.utils import timezone
 from rest_framework import serializers
 
+from apps.mail_servers.models.mailer import StatusChoices
+from apps.mailers.constants import CampaignConstants
 from utils.get_user_from_request import RequestContext
 
 
@@ -14,6 +17,7 @@ class CreateCampaignSerializer(serializers.ModelSerializer):
             "country",
             "email_content",
             "message",
+            "wave_size",
         )
 
     def validate(self, attrs: dict) -> dict:
@@ -26,13 +30,27 @@ class CreateCampaignSerializer(serializers.ModelSerializer):
         return attrs
 
 
+class CampaignStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CampaignStats
+        fields = (
+            "sent",
+            "failed",
+            "requeued",
+            "bounced",
+            "opens",
+            "clicks",
+            "updated_at",
+        )
+
+
 class RetrieveCampaignSerializer(serializers.ModelSerializer):
     country = serializers.SerializerMethodField()
+    stats = CampaignStatsSerializer(read_only=True)
 
     def get_country(self, obj):
         return str(obj.country) if obj.country else None
 
-
     class Meta:
         model = Campaign
         fields = (
@@ -47,6 +65,10 @@ class RetrieveCampaignSerializer(serializers.ModelSerializer):
             "visitor_clicks",
             "status",
             "message",
+            "wave_size",
+            "total_emails",
+            "released_emails",
+            "stats",
             "created_at",
             "updated_at",
         )
@@ -56,3 +78,51 @@ class StartCampaignSerializer(serializers.ModelSerializer):
     class Meta:
         model = Campaign
         fields = ("status",)
+
+    def validate_status(self, value):
+        if value == CampaignConstants.STATUS.building:
+            raise serializers.ValidationError(
+                "Audiences are built through the audience endpoint."
+            )
+        return value
+
+    def update(self, instance, validated_data):
+        if "status" not in validated_data:
+            return instance
+        # A single conditional UPDATE, so a build that began after the
+        # campaign was read still keeps it from starting
+        updated = (
+            Campaign.objects.filter(id=instance.id)
+            .exclude(status=CampaignConstants.STATUS.building)
+            .update(status=validated_data["status"], updated_at=timezone.now())
+        )
+        if not updated:
+            raise serializers.ValidationError(
+                {"status": "The campaign audience is still being built."}
+            )
+        instance.status = validated_data["status"]
+        return instance
+
+
+class CampaignAudienceSerializer(serializers.Serializer):
+    """Segment of the imported Base rows a campaign is sent to."""
+
+    sessions = serializers.ListField(child=serializers.IntegerField(), min_length=1)
+    statuses = serializers.ListField(
+        child=serializers.ChoiceField(choices=StatusChoices.CHOICES),
+        required=False,
+        default=list,
+    )
+    domains = serializers.ListField(
+        child=serializers.CharField(max_length=255), required=False, default=list
+    )
+    exclude_sessions = serializers.ListField(
+        child=serializers.IntegerField(), required=False, default=list
+    )
+    exclude_domains = serializers.ListField(
+        child=serializers.CharField(max_length=255), required=False, default=list
+    )
+    dedupe = serializers.BooleanField(default=True)
+    preview = serializers.BooleanField(
+        default=False, help_text="Only count the recipients of the segment"
+    )
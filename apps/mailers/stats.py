@@ -0,0 +1,186 @@
+import logging
+from collections import Counter, defaultdict
+from typing import Dict, Optional
+
+import redis
+from django.db import connection, transaction
+
+from apps.backend_mailer.constants import BackendConstants
+from apps.backend_mailer.retry import classify_error
+from apps.backend_mailer.suppression import RecipientSuppressed
+from apps.backend_mailer.settings import get_campaign_stats_enabled
+from apps.mailers.models import Campaign, CampaignStats
+from config.settings import REDIS_URL
+
+logger = logging.getLogger(__name__)
+
+STATS_FIELDS = ("sent", "failed", "requeued", "bounced", "opens", "clicks")
+
+# Campaigns flushed per upsert
+FLUSH_BATCH_SIZE = 1000
+
+
+class CampaignStatsBuffer:
+    """
+    Accumulates per-campaign counter deltas in one Redis hash per campaign,
+    so the sender never writes the stats rows itself. Campaigns with pending
+    deltas are kept in a set the flush pops from.
+    """
+
+    def __init__(self, client=None):
+        self.client = client or redis.StrictRedis.from_url(REDIS_URL)
+        self.dirty_key = "post_office:campaign_stats:dirty"
+
+    @staticmethod
+    def get_key(campaign_id) -> str:
+        return "post_office:campaign_stats:%s" % campaign_id
+
+    def add(self, deltas: Dict[int, Counter]) -> None:
+        # Counters are incremented before the campaign is marked dirty, so
+        # a flush never pops a campaign ahead of its deltas
+        pipeline = self.client.pipeline()
+        for campaign_id, counts in deltas.items():
+            for field, value in counts.items():
+                if value:
+                    pipeline.hincrby(self.get_key(campaign_id), field, value)
+            pipeline.sadd(self.dirty_key, campaign_id)
+        pipeline.execute()
+
+    def pop(self, count: int) -> Dict[int, Dict[str, int]]:
+        """Takes the deltas of up to ``count`` dirty campaigns."""
+        campaign_ids = self.client.spop(self.dirty_key, count)
+        if not campaign_ids:
+            return {}
+        campaign_ids = sorted(int(campaign_id) for campaign_id in campaign_ids)
+
+        pipeline = self.client.pipeline()
+        for campaign_id in campaign_ids:
+            pipeline.hgetall(self.get_key(campaign_id))
+            pipeline.delete(self.get_key(campaign_id))
+        values = pipeline.execute()[::2]
+
+        deltas = {}
+        for campaign_id, counts in zip(campaign_ids, values):
+            if counts:
+                deltas[campaign_id] = {
+                    field.decode(): int(value) for field, value in counts.items()
+                }
+        return deltas
+
+
+def get_campaign_deltas(sent_emails, failed_emails, requeued_ids):
+    """
+    Counts the outcomes of a batch per campaign. Failed emails that were
+    refused permanently are counted as bounced as well, unless they were
+    never sent because of the suppression list.
+    """
+    deltas = defaultdict(Counter)
+    for email in sent_emails:
+        if email.source_campaign_id:
+            deltas[email.source_campaign_id]["sent"] += 1
+
+    requeued_ids = set(requeued_ids)
+    for email, exception in failed_emails:
+        if not email.source_campaign_id:
+            continue
+        counts = deltas[email.source_campaign_id]
+        if email.id in requeued_ids:
+            counts["requeued"] += 1
+            continue
+        counts["failed"] += 1
+        if isinstance(exception, RecipientSuppressed):
+            continue
+        if classify_error(exception) == BackendConstants.ERROR_CLASS.permanent:
+            counts["bounced"] += 1
+    return deltas
+
+
+def record_campaign_outcomes(sent_emails, failed_emails, requeued_ids) -> None:
+    buffer = get_stats_buffer()
+    if buffer is None:
+        return
+    deltas = get_campaign_deltas(sent_emails, failed_emails, requeued_ids)
+    if not deltas:
+        return
+    try:
+        buffer.add(deltas)
+    except redis.RedisError as e:
+        logger.warning(f"Campaign stats unavailable, dropped {dict(deltas)}: {e}")
+
+
+def upsert_stats(deltas: Dict[int, Dict[str, int]]) -> None:
+    """
+    Adds the deltas to the stats rows of their campaigns in one statement.
+    Deltas of campaigns deleted in the meantime are dropped.
+    """
+    campaign_ids = sorted(deltas)
+    columns = [campaign_ids] + [
+        [deltas[campaign_id].get(field, 0) for campaign_id in campaign_ids]
+        for field in STATS_FIELDS
+    ]
+    table = connection.ops.quote_name(CampaignStats._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO %s (campaign_id, %s, updated_at) "
+            "SELECT delta.campaign_id, %s, now() FROM unnest(%s) "
+            "AS delta(campaign_id, %s) JOIN %s ON %s.id = delta.campaign_id "
+            "ON CONFLICT (campaign_id) DO UPDATE SET %s, updated_at = now()"
+            % (
+                table,
+                ", ".join(STATS_FIELDS),
+                ", ".join("delta.%s" % field for field in STATS_FIELDS),
+                ", ".join(["%s::bigint[]"] * len(columns)),
+                ", ".join(STATS_FIELDS),
+                connection.ops.quote_name(Campaign._meta.db_table),
+                connection.ops.quote_name(Campaign._meta.db_table),
+                ", ".join(
+                    "%s = %s.%s + EXCLUDED.%s" % (field, table, field, field)
+                    for field in STATS_FIELDS
+                ),
+            ),
+            columns,
+        )
+
+
+def flush_campaign_stats(batch_size: int = FLUSH_BATCH_SIZE) -> int:
+    """
+    Moves the buffered deltas into ``CampaignStats``, one upsert per batch
+    of campaigns. Returns the number of updated campaigns.
+    """
+    buffer = get_stats_buffer()
+    if buffer is None:
+        return 0
+
+    flushed = 0
+    while True:
+        deltas = buffer.pop(batch_size)
+        if deltas:
+            try:
+                upsert_stats(deltas)
+            except Exception:
+                # Put the deltas back for the next flush
+                buffer.add(deltas)
+                raise
+            flushed += len(deltas)
+        if len(deltas) < batch_size:
+            break
+
+    if flushed:
+        logger.info(f"Flushed stats of {flushed} campaigns")
+    return flushed
+
+
+_buffer = None
+
+
+def get_stats_buffer() -> Optional[CampaignStatsBuffer]:
+    """
+    Returns the stats buffer of this process, or None when campaign stats
+    are disabled.
+    """
+    global _buffer
+    if not get_campaign_stats_enabled():
+        return None
+    if _buffer is None:
+        _buffer = CampaignStatsBuffer()
+    return _buffer
@@ -2,10 +2,13 @@ from celery import shared_task
 from celery.utils.log import get_task_logger
 from django.db.models import Q
 
-from apps.backend_mailer.constants import BackendConstants
-from apps.backend_mailer.crud.crud_email import CRUDEmail
 from apps.mailers.constants import CampaignConstants
 from apps.mailers.crud.crud_campaign import CRUDCampaign
+from apps.mailers.engagement import EngagementConsumer
+from apps.mailers.models import Campaign
+from apps.mailers.orchestrator import ACTIVE_STATUSES, advance_campaign
+from apps.mailers.segments import build_campaign_audience
+from apps.mailers.stats import flush_campaign_stats
 from apps.sentry.sentry_scripts import SendToSentry
 from apps.sentry.sentry_constants import SentryConstants
 
@@ -14,38 +17,85 @@ logger = get_task_logger(__name__)
 
 @shared_task
 def process_campaign():
-
+    """
+    Fans out one ``advance_campaign`` task per started or sending campaign,
+    so campaigns move forward concurrently on every beat tick.
+    """
     campaigns = CRUDCampaign.filter_campaign(
-        Q(status=CampaignConstants.STATUS.started), fields=["status"]
+        Q(status__in=ACTIVE_STATUSES), fields=["id"]
     )
-    for campaign in campaigns:
-        try:
-            is_ok = CRUDEmail.update_status(
-                campaign.id, status=BackendConstants.STATUS.queued, is_campaign=True
-            )
-            logger.info(f"Successfully process email status for emails")
-            if is_ok:
-                CRUDCampaign.update_campaign_status(
-                    object_id=campaign.id,
-                    status=CampaignConstants.STATUS.sending,
-                    is_campaign=True,
-                )
-                logger.info(
-                    f"Successfully process campaign {campaign} status {campaign.status}"
-                )
-                return "SUCCESS"
-        except Exception as ex:
-            SendToSentry.send_scope_msg(
-                scope_data={
-                    "message": f"process_campaign(): Ex",
-                    "level": SentryConstants.SENTRY_MSG_ERROR,
-                    "tag": SentryConstants.SENTRY_TAG_CELERY_TASK,
-                    "detail": f"Failed to process event {campaign.id}",
-                    "extra_detail": f"{ex= }",
-                }
-            )
-            logger.error(f"Failed to process campaign {campaign.id}: {ex}")
-            CRUDCampaign.update_campaign_status(
-                object_id=campaign.id, status=CampaignConstants.STATUS.error
-            )
-            return "FAILURE"
+    campaign_ids = [campaign.id for campaign in campaigns]
+    for campaign_id in campaign_ids:
+        advance_campaign_task.delay(campaign_id)
+    logger.info(f"Advancing {len(campaign_ids)} campaigns")
+    return "SUCCESS"
+
+
+@shared_task
+def advance_campaign_task(campaign_id):
+    try:
+        released = advance_campaign(campaign_id)
+        if released:
+            logger.info(f"Released {released} emails of campaign {campaign_id}")
+        return "SUCCESS"
+    except Exception as ex:
+        SendToSentry.send_scope_msg(
+            scope_data={
+                "message": f"advance_campaign_task(): Ex",
+                "level": SentryConstants.SENTRY_MSG_ERROR,
+                "tag": SentryConstants.SENTRY_TAG_CELERY_TASK,
+                "detail": f"Failed to process campaign {campaign_id}",
+                "extra_detail": f"{ex= }",
+            }
+        )
+        logger.error(f"Failed to process campaign {campaign_id}: {ex}")
+        CRUDCampaign.update_campaign_status(
+            object_id=campaign_id,
+            status=CampaignConstants.STATUS.error,
+            is_campaign=True,
+        )
+        return "FAILURE"
+
+
+@shared_task
+def build_campaign_audience_task(campaign_id, filters):
+    """
+    Generates the emails of a campaign from the Base rows matching the
+    segment filters.
+    """
+    try:
+        campaign = Campaign.objects.select_related("message").get(id=campaign_id)
+        queued, rejected = build_campaign_audience(campaign, **filters)
+        logger.info(
+            f"Campaign {campaign_id} audience: {queued} emails, {rejected} rejected"
+        )
+        return "SUCCESS"
+    except Exception as ex:
+        SendToSentry.send_scope_msg(
+            scope_data={
+                "message": f"build_campaign_audience_task(): Ex",
+                "level": SentryConstants.SENTRY_MSG_ERROR,
+                "tag": SentryConstants.SENTRY_TAG_CELERY_TASK,
+                "detail": f"Failed to build audience of campaign {campaign_id}",
+                "extra_detail": f"{ex= }",
+            }
+        )
+        logger.error(f"Failed to build audience of campaign {campaign_id}: {ex}")
+        return "FAILURE"
+
+
+@shared_task(ignore_result=True)
+def flush_campaign_stats_task():
+    """
+    Moves the campaign counters buffered by the sender into CampaignStats.
+    """
+    flush_campaign_stats()
+
+
+@shared_task(ignore_result=True)
+def consume_tracking_events_task():
+    """
+    Folds the open and click events of the tracking stream into the
+    engagement rows and campaign stats.
+    """
+    EngagementConsumer().consume()
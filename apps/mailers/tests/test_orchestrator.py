@@ -0,0 +1,303 @@
+import datetime
+import threading
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from django.db import connection
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+
+from apps.backend_mailer.constants import BackendConstants
+from apps.backend_mailer.models import Email
+from apps.mailers import orchestrator, tasks
+from apps.mailers.constants import CampaignConstants
+from apps.mailers.models import Campaign
+from apps.users.models import User
+
+STATUS = CampaignConstants.STATUS
+NOW = datetime.datetime(2026, 1, 1, 12, tzinfo=datetime.timezone.utc)
+
+
+def make_campaign(**kwargs):
+    options = dict(
+        id=1,
+        status=STATUS.started,
+        wave_size=None,
+        total_emails=0,
+        released_emails=0,
+        next_wave_at=None,
+        save=MagicMock(),
+    )
+    options.update(kwargs)
+    return SimpleNamespace(**options)
+
+
+@override_settings(
+    POST_OFFICE={
+        "CAMPAIGN_WAVE_SIZE": 100,
+        "CAMPAIGN_WAVE_INTERVAL": datetime.timedelta(minutes=1),
+    }
+)
+class AdvanceCampaignTests(SimpleTestCase):
+    """
+    ./manage.py test apps.mailers.tests.test_orchestrator
+    """
+
+    def setUp(self):
+        self.campaign = make_campaign()
+        patchers = [
+            patch.object(orchestrator.transaction, "atomic"),
+            patch.object(orchestrator, "adopt_message"),
+            patch.object(orchestrator, "Campaign"),
+            patch.object(orchestrator, "get_audience"),
+            patch.object(orchestrator, "release_wave"),
+            patch.object(orchestrator, "finish_campaign"),
+            patch.object(orchestrator.email_queued, "send"),
+        ]
+        (
+            _,
+            self.adopt_message,
+            campaign_model,
+            self.get_audience,
+            self.release_wave,
+            self.finish_campaign,
+            self.email_queued,
+        ) = [patcher.start() for patcher in patchers]
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+        locked = campaign_model.objects.select_for_update.return_value
+        locked.filter.return_value.first.return_value = self.campaign
+        self.get_audience.return_value.count.return_value = 250
+
+    def test_started_campaign_releases_its_first_wave(self):
+        self.release_wave.return_value = ["email"] * 100
+
+        released = orchestrator.advance_campaign(1, now=NOW)
+
+        self.assertEqual(released, 100)
+        self.release_wave.assert_called_once_with(self.campaign, 100)
+        self.assertEqual(self.campaign.status, STATUS.sending)
+        self.adopt_message.assert_called_once_with(self.campaign)
+        self.assertEqual(
+            (self.campaign.total_emails, self.campaign.released_emails), (250, 100)
+        )
+        self.assertEqual(
+            self.campaign.next_wave_at, NOW + datetime.timedelta(minutes=1)
+        )
+        self.email_queued.assert_called_once()
+        self.finish_campaign.assert_not_called()
+
+    def test_waves_are_paced(self):
+        self.campaign.status = STATUS.sending
+        self.campaign.next_wave_at = NOW + datetime.timedelta(seconds=30)
+
+        released = orchestrator.advance_campaign(1, now=NOW)
+
+        self.assertEqual(released, 0)
+        self.release_wave.assert_not_called()
+        self.get_audience.return_value.count.assert_not_called()
+
+    def test_campaign_wave_size_overrides_setting(self):
+        self.campaign.wave_size = 10
+        self.release_wave.return_value = ["email"] * 10
+
+        orchestrator.advance_campaign(1, now=NOW)
+
+        self.release_wave.assert_called_once_with(self.campaign, 10)
+
+    def test_campaign_is_finished_after_its_last_wave(self):
+        self.campaign.status = STATUS.sending
+        self.release_wave.return_value = []
+
+        orchestrator.advance_campaign(1, now=NOW)
+
+        self.finish_campaign.assert_called_once_with(self.campaign)
+        self.email_queued.assert_not_called()
+
+
+class FinishCampaignTests(SimpleTestCase):
+    """
+    ./manage.py test apps.mailers.tests.test_orchestrator
+    """
+
+    def finish(self, progress):
+        with patch.object(
+            orchestrator, "get_progress", return_value=progress
+        ), patch.object(orchestrator, "Campaign") as campaign_model:
+            status = orchestrator.finish_campaign(make_campaign(status=STATUS.sending))
+        return status, campaign_model.objects.filter.return_value.update
+
+    def test_campaign_with_pending_emails_keeps_sending(self):
+        status, update = self.finish(
+            {BackendConstants.STATUS.sent: 5, BackendConstants.STATUS.requeued: 1}
+        )
+
+        self.assertIsNone(status)
+        update.assert_not_called()
+
+    def test_campaign_is_completed_by_delivery_counts(self):
+        status, update = self.finish(
+            {BackendConstants.STATUS.sent: 5, BackendConstants.STATUS.failed: 1}
+        )
+
+        self.assertEqual(status, STATUS.completed)
+        update.assert_called_once_with(status=STATUS.completed)
+
+    def test_campaign_without_sent_emails_fails(self):
+        status, _ = self.finish({BackendConstants.STATUS.failed: 3})
+
+        self.assertEqual(status, STATUS.error)
+
+
+class CampaignDatabaseMixin:
+    def make_campaign(self, audience, wave_size=None):
+        author = User.objects.create_user(
+            email="orchestrator@example.com", password="P@$$w0rd"
+        )
+        campaign = Campaign.objects.create(
+            author=author,
+            campaign_name="Waves",
+            message=Email.objects.create(
+                author=author, from_email="shop@example.com", to=["a@example.com"]
+            ),
+            status=STATUS.started,
+            wave_size=wave_size,
+        )
+        for i in range(audience):
+            Email.objects.create(
+                author=author,
+                from_email="shop@example.com",
+                to=["user%s@example.com" % i],
+                source_campaign=campaign,
+            )
+        return campaign
+
+    def deliver(self, campaign, status=BackendConstants.STATUS.sent):
+        """Lets the sender deliver every released email of the campaign."""
+        Email.objects.filter(
+            source_campaign=campaign, status=BackendConstants.STATUS.queued
+        ).update(status=status)
+
+
+@override_settings(
+    POST_OFFICE={
+        "CAMPAIGN_WAVE_SIZE": 100,
+        "CAMPAIGN_WAVE_INTERVAL": datetime.timedelta(minutes=1),
+    }
+)
+@patch.object(orchestrator.email_queued, "send")
+class AdvanceCampaignDatabaseTests(CampaignDatabaseMixin, TestCase):
+    """
+    Advances campaigns stored in Postgres.
+
+    ./manage.py test apps.mailers.tests.test_orchestrator.AdvanceCampaignDatabaseTests
+    """
+
+    def advance(self, campaign, minutes):
+        return orchestrator.advance_campaign(
+            campaign.id, now=NOW + datetime.timedelta(minutes=minutes)
+        )
+
+    def test_campaign_is_sent_in_waves(self, email_queued):
+        campaign = self.make_campaign(5, wave_size=2)
+
+        self.assertEqual(self.advance(campaign, 0), 2)
+        self.assertEqual(self.advance(campaign, 0.5), 0)
+        self.deliver(campaign)
+        self.assertEqual(self.advance(campaign, 1), 2)
+        self.assertEqual(self.advance(campaign, 2), 1)
+        self.assertEqual(email_queued.call_count, 3)
+
+        # The last wave is still being delivered
+        self.assertEqual(self.advance(campaign, 3), 0)
+        campaign.refresh_from_db()
+        self.assertEqual(
+            (campaign.status, campaign.total_emails, campaign.released_emails),
+            (STATUS.sending, 5, 5),
+        )
+
+        self.deliver(campaign)
+        self.assertEqual(self.advance(campaign, 4), 0)
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.status, STATUS.completed)
+        self.assertIsNone(self.advance(campaign, 5))
+
+    def test_campaign_without_sent_emails_fails(self, email_queued):
+        campaign = self.make_campaign(3)
+
+        self.assertEqual(self.advance(campaign, 0), 3)
+        self.deliver(campaign, status=BackendConstants.STATUS.failed)
+        self.assertEqual(self.advance(campaign, 1), 0)
+
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.status, STATUS.error)
+
+
+@override_settings(
+    POST_OFFICE={
+        "CAMPAIGN_WAVE_SIZE": 3,
+        "CAMPAIGN_WAVE_INTERVAL": datetime.timedelta(minutes=1),
+    }
+)
+@patch.object(orchestrator.email_queued, "send")
+class ConcurrentAdvanceCampaignTests(CampaignDatabaseMixin, TransactionTestCase):
+    """
+    Advances one campaign from several database connections, needs Postgres.
+
+    ./manage.py test apps.mailers.tests.test_orchestrator.ConcurrentAdvanceCampaignTests
+    """
+
+    def test_concurrent_workers_release_one_wave(self, email_queued):
+        campaign = self.make_campaign(10)
+        barrier = threading.Barrier(4)
+        released = []
+
+        def advance():
+            try:
+                barrier.wait(10)
+                released.append(orchestrator.advance_campaign(campaign.id, now=NOW))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=advance) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Workers blocked by the campaign lock skip it, later ones wait for
+        # the next wave
+        self.assertEqual(sum(count or 0 for count in released), 3)
+        self.assertEqual(email_queued.call_count, 1)
+        self.assertEqual(
+            Email.objects.filter(
+                source_campaign=campaign, status=BackendConstants.STATUS.queued
+            ).count(),
+            3,
+        )
+        campaign.refresh_from_db()
+        self.assertEqual(
+            (campaign.status, campaign.total_emails, campaign.released_emails),
+            (STATUS.sending, 10, 3),
+        )
+
+
+class ProcessCampaignTests(SimpleTestCase):
+    """
+    ./manage.py test apps.mailers.tests.test_orchestrator
+    """
+
+    @patch.object(tasks.advance_campaign_task, "delay")
+    @patch.object(tasks.CRUDCampaign, "filter_campaign")
+    def test_every_active_campaign_is_advanced(self, filter_campaign, delay):
+        filter_campaign.return_value = [SimpleNamespace(id=i) for i in (3, 4, 5)]
+
+        self.assertEqual(tasks.process_campaign(), "SUCCESS")
+
+        self.assertEqual(
+            [call.args for call in delay.call_args_list], [(3,), (4,), (5,)]
+        )
@@ -0,0 +1,194 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from django.db import DatabaseError
+from django.test import SimpleTestCase
+from rest_framework.exceptions import ValidationError
+
+from apps.backend_mailer.constants import BackendConstants
+from apps.mailers import segments
+from apps.mailers.constants import CampaignConstants
+from apps.mailers.serializers import campaign as campaign_serializers
+from apps.mailers.serializers.campaign import StartCampaignSerializer
+
+
+class SegmentTests(SimpleTestCase):
+    """
+    ./manage.py test apps.mailers.tests.test_segments
+    """
+
+    def test_filters_are_applied_in_sql(self):
+        sql = str(
+            segments.get_segment(
+                sessions=[1, 2],
+                statuses=["active"],
+                domains=["Example.com"],
+                exclude_sessions=[9],
+                exclude_domains=["spam.test"],
+            ).query
+        )
+
+        self.assertIn('DISTINCT ON ("address")', sql)
+        self.assertIn('"bases"."session_id" IN (1, 2)', sql)
+        self.assertIn('"bases"."status" IN (active)', sql)
+        self.assertIn('SPLIT_PART(LOWER("bases"."email"), @, 2) IN (example.com)', sql)
+        self.assertIn("NOT EXISTS", sql)
+        self.assertIn('U0."session_id" IN (9)', sql)
+        self.assertIn("IN (spam.test)", sql)
+
+    def test_dedupe_can_be_disabled(self):
+        sql = str(segments.get_segment(sessions=[1], dedupe=False).query)
+
+        self.assertNotIn("DISTINCT", sql)
+        self.assertTrue(sql.endswith('ORDER BY "bases"."id" ASC'))
+
+    def test_segments_need_a_session(self):
+        with self.assertRaises(ValueError):
+            segments.get_segment(sessions=[], domains=["example.com"])
+
+    def test_recipients_are_streamed(self):
+        segment = MagicMock()
+        segment.values_list.return_value.iterator.return_value = iter(
+            [(1, "ann@example.com", "Ann", None)]
+        )
+
+        recipients = list(segments.iter_recipients(segment, chunk_size=10))
+
+        segment.values_list.return_value.iterator.assert_called_once_with(chunk_size=10)
+        self.assertEqual(
+            recipients,
+            [("ann@example.com", {"base_id": 1, "first": "Ann", "last": ""})],
+        )
+
+
+class BuildAudienceTests(SimpleTestCase):
+    """
+    ./manage.py test apps.mailers.tests.test_segments
+    """
+
+    def make_campaign(self, status=CampaignConstants.STATUS.building):
+        message = SimpleNamespace(
+            from_email="shop@example.com",
+            template=None,
+            subject="Hi {{ first }}",
+            message="Hello",
+            html_message="",
+            context=None,
+            headers=None,
+            priority=BackendConstants.PRIORITY.now,
+            email_backend=None,
+        )
+        return SimpleNamespace(
+            id=5, status=status, message=message, message_id=9, author=None
+        )
+
+    @patch.object(segments, "Campaign")
+    @patch.object(segments, "send_stream", return_value=(2, 1))
+    @patch.object(segments, "clear_audience", return_value=0)
+    @patch.object(segments, "get_segment")
+    def test_segment_is_streamed_into_campaign_emails(
+        self, get_segment, clear_audience, send_stream, campaign_model
+    ):
+        campaign = self.make_campaign()
+
+        result = segments.build_campaign_audience(
+            campaign, chunk_size=100, sessions=[1]
+        )
+
+        self.assertEqual(result, (2, 1))
+        clear_audience.assert_called_once_with(campaign)
+        get_segment.assert_called_once_with(sessions=[1])
+        kwargs = send_stream.call_args.kwargs
+        self.assertIs(kwargs["source_campaign"], campaign)
+        self.assertEqual(kwargs["subject"], "Hi {{ first }}")
+        self.assertEqual(kwargs["chunk_size"], 100)
+        self.assertIsNone(kwargs["priority"])
+        self.assertFalse(kwargs["render_on_delivery"])
+        campaign_model.objects.filter.assert_called_with(
+            id=5, status=CampaignConstants.STATUS.building
+        )
+        campaign_model.objects.filter.return_value.update.assert_called_once_with(
+            status=CampaignConstants.STATUS.created
+        )
+
+    @patch.object(segments, "send_stream")
+    @patch.object(segments, "clear_audience")
+    def test_started_campaigns_are_refused(self, clear_audience, send_stream):
+        campaign = self.make_campaign(status=CampaignConstants.STATUS.sending)
+
+        with self.assertRaises(ValueError):
+            segments.build_campaign_audience(campaign)
+
+        clear_audience.assert_not_called()
+        send_stream.assert_not_called()
+
+    @patch.object(segments, "Campaign")
+    @patch.object(segments, "clear_audience", return_value=0)
+    @patch.object(segments, "get_segment")
+    @patch.object(segments, "iter_recipients")
+    def test_build_stops_when_the_campaign_leaves_building(
+        self, iter_recipients, get_segment, clear_audience, campaign_model
+    ):
+        iter_recipients.return_value = iter(
+            [("user%s@example.com" % i, {}) for i in range(5)]
+        )
+        # Still building for the first chunk, not for the second
+        campaign_model.objects.filter.return_value.exists.side_effect = [True, False]
+        consumed = []
+
+        def send_stream(recipients, **kwargs):
+            consumed.extend(recipients)
+
+        with patch.object(segments, "send_stream", side_effect=send_stream):
+            with self.assertRaises(segments.AudienceBuildAborted):
+                segments.build_campaign_audience(
+                    self.make_campaign(), chunk_size=2, sessions=[1]
+                )
+
+        self.assertEqual(len(consumed), 2)
+        self.assertEqual(clear_audience.call_count, 2)
+
+    @patch.object(segments, "Campaign")
+    @patch.object(segments, "clear_audience", return_value=0)
+    @patch.object(segments, "get_segment")
+    @patch.object(segments, "send_stream", side_effect=DatabaseError("gone"))
+    def test_failed_builds_leave_no_partial_audience(
+        self, send_stream, get_segment, clear_audience, campaign_model
+    ):
+        campaign = self.make_campaign()
+
+        with self.assertRaises(DatabaseError):
+            segments.build_campaign_audience(campaign, sessions=[1])
+
+        self.assertEqual(clear_audience.call_count, 2)
+        campaign_model.objects.filter.return_value.update.assert_called_once_with(
+            status=CampaignConstants.STATUS.created
+        )
+
+
+class StartCampaignTests(SimpleTestCase):
+    """
+    ./manage.py test apps.mailers.tests.test_segments
+    """
+
+    @patch.object(campaign_serializers, "Campaign")
+    def test_campaigns_being_built_cant_start(self, campaign_model):
+        queryset = campaign_model.objects.filter.return_value
+        queryset.exclude.return_value.update.return_value = 0
+        serializer = StartCampaignSerializer()
+
+        with self.assertRaises(ValidationError):
+            serializer.update(
+                SimpleNamespace(id=5), {"status": CampaignConstants.STATUS.started}
+            )
+
+        queryset.exclude.assert_called_once_with(
+            status=CampaignConstants.STATUS.building
+        )
+
+    def test_building_status_cant_be_set(self):
+        serializer = StartCampaignSerializer(
+            data={"status": CampaignConstants.STATUS.building}
+        )
+
+        self.assertFalse(serializer.is_valid())
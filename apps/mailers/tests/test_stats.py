@@ -0,0 +1,176 @@
+import smtplib
+from collections import Counter
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import redis
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from apps.backend_mailer.models import Email
+from apps.backend_mailer.tests.test_bulk import CursorProxy
+from apps.mailers import stats
+from apps.mailers.engagement import update_campaign_rates
+from apps.mailers.models import Campaign, CampaignStats
+from apps.mailers.stats import CampaignStatsBuffer, get_campaign_deltas, upsert_stats
+from apps.users.models import User
+
+
+def make_email(email_id, campaign_id):
+    return SimpleNamespace(id=email_id, source_campaign_id=campaign_id)
+
+
+class CampaignDeltaTests(SimpleTestCase):
+    """
+    ./manage.py test apps.mailers.tests.test_stats
+    """
+
+    def test_outcomes_are_counted_per_campaign(self):
+        sent = [make_email(1, 7), make_email(2, 7), make_email(3, None)]
+        failed = [
+            (make_email(4, 7), smtplib.SMTPServerDisconnected("Gone")),
+            (
+                make_email(5, 8),
+                smtplib.SMTPRecipientsRefused(
+                    {"a@example.com": (550, b"No such user")}
+                ),
+            ),
+            (make_email(6, 8), smtplib.SMTPServerDisconnected("Gone")),
+        ]
+
+        deltas = get_campaign_deltas(sent, failed, requeued_ids=[4])
+
+        self.assertEqual(
+            deltas,
+            {
+                7: Counter(sent=2, requeued=1),
+                8: Counter(failed=2, bounced=1),
+            },
+        )
+
+    @override_settings(POST_OFFICE={"CAMPAIGN_STATS_ENABLED": True})
+    def test_redis_errors_do_not_break_delivery(self):
+        buffer = CampaignStatsBuffer(MagicMock())
+        buffer.client.pipeline.return_value.execute.side_effect = redis.RedisError()
+
+        with patch.object(stats, "_buffer", buffer):
+            stats.record_campaign_outcomes([make_email(1, 7)], [], [])
+
+        buffer.client.pipeline.return_value.hincrby.assert_called_once_with(
+            "post_office:campaign_stats:7", "sent", 1
+        )
+
+
+class CampaignStatsBufferTests(SimpleTestCase):
+    """
+    ./manage.py test apps.mailers.tests.test_stats
+    """
+
+    def setUp(self):
+        self.client = MagicMock()
+        self.buffer = CampaignStatsBuffer(self.client)
+
+    def test_deltas_are_taken_with_their_campaigns(self):
+        self.client.spop.return_value = [b"9", b"3"]
+        self.client.pipeline.return_value.execute.return_value = [
+            {b"sent": b"5", b"bounced": b"1"},
+            1,
+            {},
+            0,
+        ]
+
+        deltas = self.buffer.pop(100)
+
+        self.assertEqual(deltas, {3: {"sent": 5, "bounced": 1}})
+        self.client.pipeline.return_value.hgetall.assert_any_call(
+            "post_office:campaign_stats:9"
+        )
+
+    def test_failed_flush_puts_deltas_back(self):
+        deltas = {3: {"sent": 5}}
+        with override_settings(
+            POST_OFFICE={"CAMPAIGN_STATS_ENABLED": True}
+        ), patch.object(stats, "_buffer", self.buffer), patch.object(
+            self.buffer, "pop", return_value=deltas
+        ), patch.object(
+            self.buffer, "add"
+        ) as add, patch.object(
+            stats, "upsert_stats", side_effect=RuntimeError()
+        ):
+            with self.assertRaises(RuntimeError):
+                stats.flush_campaign_stats()
+
+        add.assert_called_once_with(deltas)
+
+    def test_deltas_are_added_in_one_upsert(self):
+        cursor = MagicMock()
+        proxy = CursorProxy(stats.connection, cursor)
+        with patch.object(stats, "connection", proxy), patch.object(
+            stats.transaction, "atomic"
+        ):
+            stats.upsert_stats({8: {"failed": 2}, 3: {"sent": 5, "requeued": 1}})
+
+        sql, params = cursor.__enter__.return_value.execute.call_args.args
+        self.assertIn("ON CONFLICT (campaign_id) DO UPDATE SET", sql)
+        self.assertIn('sent = "mailers_campaignstats".sent + EXCLUDED.sent', sql)
+        self.assertEqual(
+            params, [[3, 8], [5, 0], [0, 2], [1, 0], [0, 0], [0, 0], [0, 0]]
+        )
+
+
+class CampaignStatsDatabaseTests(TestCase):
+    """
+    Runs the stats statements against Postgres.
+
+    ./manage.py test apps.mailers.tests.test_stats.CampaignStatsDatabaseTests
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email="stats@example.com", password="P@$$w0rd"
+        )
+        cls.message = Email.objects.create(
+            author=cls.author, from_email="shop@example.com", to=["a@example.com"]
+        )
+
+    def make_campaign(self, total_emails=0):
+        return Campaign.objects.create(
+            author=self.author,
+            campaign_name="Stats",
+            message=self.message,
+            total_emails=total_emails,
+        )
+
+    def test_deltas_are_added_to_existing_rows(self):
+        campaign = self.make_campaign()
+        deleted = self.make_campaign()
+        deleted_id = deleted.id
+        deleted.delete()
+
+        upsert_stats({campaign.id: {"sent": 3, "opens": 1}, deleted_id: {"sent": 1}})
+        upsert_stats({campaign.id: {"sent": 2, "bounced": 1}})
+
+        row = CampaignStats.objects.get()
+        self.assertEqual(row.campaign_id, campaign.id)
+        self.assertEqual(
+            (row.sent, row.failed, row.bounced, row.opens, row.clicks),
+            (5, 0, 1, 1, 0),
+        )
+
+    def test_rates_are_copied_from_the_stats(self):
+        sent = self.make_campaign()
+        CampaignStats.objects.create(campaign=sent, sent=8, opens=2, clicks=3)
+        # Nothing counted as sent yet, the audience size is used instead
+        unsent = self.make_campaign(total_emails=10)
+        CampaignStats.objects.create(campaign=unsent, opens=5)
+        untracked = self.make_campaign()
+
+        update_campaign_rates([sent.id, unsent.id, untracked.id])
+
+        self.assertEqual(
+            {
+                campaign.id: (campaign.open_rate, campaign.visitor_clicks)
+                for campaign in Campaign.objects.all()
+            },
+            {sent.id: (25, 3), unsent.id: (50, 0), untracked.id: (0, 0)},
+        )
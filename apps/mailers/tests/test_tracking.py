@@ -0,0 +1,225 @@
+import base64
+import datetime
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from apps.backend_mailer.constants import BackendConstants
+from apps.mailers import engagement
+from apps.mailers.engagement import EngagementConsumer, fold_events
+from apps.mailers.tracking import (
+    PIXEL,
+    add_tracking,
+    get_unsubscribe_headers,
+    make_token,
+    read_token,
+)
+from apps.mailers.views.v1 import tracking as views
+
+
+def at(second):
+    return datetime.datetime(2026, 1, 1, 12, 0, second, tzinfo=datetime.timezone.utc)
+
+
+@override_settings(POST_OFFICE={"TRACKING_HOST": "https://t.example.com"})
+class TrackingTokenTests(SimpleTestCase):
+    """
+    ./manage.py test apps.mailers.tests.test_tracking
+    """
+
+    def test_tokens_are_verified_without_a_lookup(self):
+        token = make_token(5, 7, "https://example.com/")
+
+        self.assertEqual(
+            read_token(token), {"e": 5, "c": 7, "u": "https://example.com/"}
+        )
+        self.assertIsNone(read_token(token[:-2] + "xx"))
+        self.assertIsNone(read_token("garbage"))
+
+    def test_links_and_pixel_are_added(self):
+        tracked = add_tracking(
+            '<body><a class="b" href="https://example.com/?a=1&amp;b=2">Go</a>'
+            '<a href="mailto:ann@example.com">Mail</a></body>',
+            5,
+            7,
+        )
+
+        self.assertIn(
+            '<a class="b" href="https://t.example.com/api/1.0/tracking/click/', tracked
+        )
+        self.assertIn('href="mailto:ann@example.com"', tracked)
+        self.assertRegex(tracked, r'/tracking/open/[^"]+/" width="1"[^>]*></body>$')
+
+        click_token = tracked.split("/tracking/click/")[1].split("/")[0]
+        self.assertEqual(read_token(click_token)["u"], "https://example.com/?a=1&b=2")
+
+
+class TrackingViewTests(SimpleTestCase):
+    """
+    ./manage.py test apps.mailers.tests.test_tracking
+    """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        patcher = patch.object(views, "get_tracking_events")
+        self.events = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def test_open_returns_pixel(self):
+        response = views.track_open(self.factory.get("/"), make_token(5, 7))
+
+        self.assertEqual(response.content, PIXEL)
+        self.assertEqual(response["Content-Type"], "image/gif")
+        self.events.add.assert_called_once_with("open", {"e": 5, "c": 7})
+
+    def test_tampered_open_is_not_recorded(self):
+        response = views.track_open(self.factory.get("/"), "e30:forged")
+
+        self.assertEqual(response.content, PIXEL)
+        self.events.add.assert_not_called()
+
+    def test_click_redirects_to_signed_url(self):
+        token = make_token(5, 7, "https://example.com/offer")
+
+        response = views.track_click(self.factory.get("/"), token)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response["Location"], "https://example.com/offer")
+
+        with self.assertRaises(Http404):
+            views.track_click(self.factory.get("/"), token + "x")
+
+
+@override_settings(POST_OFFICE={"TRACKING_HOST": "https://t.example.com"})
+class UnsubscribeTests(SimpleTestCase):
+    """
+    ./manage.py test apps.mailers.tests.test_tracking
+    """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.headers = get_unsubscribe_headers(5, 7, "ann@example.com")
+        self.token = self.headers["List-Unsubscribe"].split("/unsubscribe/")[1][:-2]
+
+    def test_headers_point_at_the_unsubscribe_endpoint(self):
+        self.assertTrue(
+            self.headers["List-Unsubscribe"].startswith(
+                "<https://t.example.com/api/1.0/tracking/unsubscribe/"
+            )
+        )
+        self.assertEqual(
+            self.headers["List-Unsubscribe-Post"], "List-Unsubscribe=One-Click"
+        )
+
+    def test_address_isnt_readable_from_the_url(self):
+        self.assertNotIn("ann", self.headers["List-Unsubscribe"])
+        self.assertNotIn("ann", base64.urlsafe_b64decode(self.token).decode("latin-1"))
+
+    @patch.object(views, "suppress")
+    def test_get_only_asks_for_confirmation(self, suppress):
+        response = views.unsubscribe(self.factory.get("/"), self.token)
+
+        self.assertIn(b'<form method="post">', response.content)
+        self.assertNotIn(b"ann@example.com", response.content)
+        suppress.assert_not_called()
+
+    @patch.object(views, "suppress")
+    def test_post_suppresses_the_recipient(self, suppress):
+        response = views.unsubscribe(self.factory.post("/"), self.token)
+
+        self.assertEqual(response.status_code, 200)
+        suppress.assert_called_once_with(
+            ["ann@example.com"],
+            BackendConstants.SUPPRESSION_REASON.unsubscribe,
+            detail="Email 5 of campaign 7",
+        )
+
+        with self.assertRaises(Http404):
+            views.unsubscribe(self.factory.post("/"), make_token(5, 7))
+
+
+class FoldEventsTests(SimpleTestCase):
+    """
+    ./manage.py test apps.mailers.tests.test_tracking
+    """
+
+    def test_first_opens_and_clicks_are_counted_once(self):
+        rows = {
+            1: SimpleNamespace(
+                campaign_id=7,
+                opens=1,
+                clicks=0,
+                first_opened_at=at(0),
+                last_opened_at=at(0),
+                first_clicked_at=None,
+                last_clicked_at=None,
+            ),
+            2: SimpleNamespace(
+                campaign_id=7,
+                opens=0,
+                clicks=0,
+                first_opened_at=None,
+                last_opened_at=None,
+                first_clicked_at=None,
+                last_clicked_at=None,
+            ),
+        }
+        events = [
+            {"kind": "open", "email_id": 1, "campaign_id": 7, "time": at(5)},
+            {"kind": "click", "email_id": 1, "campaign_id": 7, "time": at(6)},
+            {"kind": "open", "email_id": 2, "campaign_id": 7, "time": at(4)},
+            {"kind": "open", "email_id": 2, "campaign_id": 7, "time": at(3)},
+        ]
+
+        with patch.object(engagement, "MessageEngagement") as model:
+            model.objects.select_for_update.return_value.in_bulk.return_value = rows
+            deltas = fold_events(events)
+
+        self.assertEqual(deltas, {7: {"opens": 1, "clicks": 1}})
+        self.assertEqual((rows[1].opens, rows[1].clicks), (2, 1))
+        self.assertEqual(rows[1].first_opened_at, at(0))
+        self.assertEqual(rows[2].opens, 2)
+        self.assertEqual(
+            (rows[2].first_opened_at, rows[2].last_opened_at), (at(3), at(4))
+        )
+        model.objects.bulk_create.assert_called_once()
+
+
+class EngagementConsumerTests(SimpleTestCase):
+    """
+    ./manage.py test apps.mailers.tests.test_tracking
+    """
+
+    def test_events_are_acknowledged_after_folding(self):
+        client = MagicMock()
+        client.xautoclaim.return_value = [b"0-0", [], []]
+        client.xreadgroup.return_value = [
+            [
+                b"post_office:tracking:events",
+                [
+                    (
+                        b"1-0",
+                        {
+                            b"kind": b"open",
+                            b"email": b"1",
+                            b"campaign": b"7",
+                            b"time": b"1.0",
+                        },
+                    ),
+                    (b"2-0", {b"kind": b"open"}),
+                ],
+            ]
+        ]
+
+        with patch.object(
+            engagement, "fold_events", return_value={}
+        ) as fold, patch.object(engagement.transaction, "atomic"):
+            consumed = EngagementConsumer(client, "test").consume(batch_size=10)
+
+        self.assertEqual(consumed, 2)
+        self.assertEqual([event["email_id"] for event in fold.call_args.args[0]], [1])
+        client.xack.assert_called_once_with(
+            "post_office:tracking:events", "engagement", b"1-0", b"2-0"
+        )
@@ -0,0 +1,158 @@
+import base64
+import html
+import json
+import logging
+import re
+import time
+from typing import Dict, Optional
+
+import redis
+from cryptography.fernet import InvalidToken
+from django.core import signing
+from django.urls import reverse
+
+from apps.backend_mailer.settings import (
+    fernet,
+    get_tracking_host,
+    get_tracking_stream_maxlen,
+)
+from config.settings import MAIN_HOST, REDIS_URL
+
+logger = logging.getLogger(__name__)
+
+TRACKING_STREAM = "post_office:tracking:events"
+
+OPEN = "open"
+CLICK = "click"
+
+PIXEL = base64.b64decode("R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7")
+
+# Absolute http(s) links of anchors, mailto: and anchors within the email
+# are left alone
+LINK = re.compile(
+    r"""(<a\b[^>]*?\bhref\s*=\s*)(["'])(https?://[^"']+)\2""", re.IGNORECASE
+)
+BODY_END = re.compile(r"</body\s*>", re.IGNORECASE)
+
+# Tokens are signed with SECRET_KEY, so they are checked without a query
+signer = signing.Signer(salt="apps.mailers.tracking")
+
+
+def make_token(email_id: int, campaign_id: Optional[int], url: str = None) -> str:
+    payload = {"e": email_id, "c": campaign_id}
+    if url is not None:
+        payload["u"] = url
+    return signer.sign_object(payload, compress=True)
+
+
+def read_token(token: str) -> Optional[Dict]:
+    """Returns the payload of a token, or None when it was tampered with."""
+    try:
+        payload = signer.unsign_object(token)
+    except (signing.BadSignature, ValueError):
+        return None
+    if not isinstance(payload, dict) or "e" not in payload:
+        return None
+    return payload
+
+
+def get_tracking_url(view_name: str, token: str) -> str:
+    host = (get_tracking_host() or MAIN_HOST).rstrip("/")
+    return host + reverse(view_name, kwargs={"token": token})
+
+
+def get_open_url(email_id: int, campaign_id: Optional[int]) -> str:
+    return get_tracking_url("tracking_api:open", make_token(email_id, campaign_id))
+
+
+def get_click_url(email_id: int, campaign_id: Optional[int], url: str) -> str:
+    return get_tracking_url(
+        "tracking_api:click", make_token(email_id, campaign_id, url)
+    )
+
+
+def make_unsubscribe_token(
+    email_id: int, campaign_id: Optional[int], address: str
+) -> str:
+    # Encrypted rather than signed, the address can't be read from the URL
+    payload = {"e": email_id, "c": campaign_id, "a": address}
+    return fernet.encrypt(json.dumps(payload).encode()).decode()
+
+
+def read_unsubscribe_token(token: str) -> Optional[Dict]:
+    """Returns the payload of an unsubscribe token, or None when invalid."""
+    try:
+        payload = json.loads(fernet.decrypt(token.encode()))
+    except (InvalidToken, ValueError):
+        return None
+    if not isinstance(payload, dict) or not payload.get("a"):
+        return None
+    return payload
+
+
+def get_unsubscribe_headers(
+    email_id: int, campaign_id: Optional[int], address: str
+) -> Dict[str, str]:
+    """One-click List-Unsubscribe headers of RFC 8058 for one recipient."""
+    token = make_unsubscribe_token(email_id, campaign_id, address)
+    url = get_tracking_url("tracking_api:unsubscribe", token)
+    return {
+        "List-Unsubscribe": "<%s>" % url,
+        "List-Unsubscribe-Post": "List-Unsubscribe=One-Click",
+    }
+
+
+def add_tracking(html_message: str, email_id: int, campaign_id: Optional[int]) -> str:
+    """
+    Points the links of an html message at the click endpoint and adds the
+    open pixel before the end of its body.
+    """
+
+    def track_link(match):
+        url = get_click_url(email_id, campaign_id, html.unescape(match[3]))
+        return "%s%s%s%s" % (match[1], match[2], html.escape(url), match[2])
+
+    html_message = LINK.sub(track_link, html_message)
+    pixel = '<img src="%s" width="1" height="1" alt="" style="display:none">' % (
+        html.escape(get_open_url(email_id, campaign_id))
+    )
+    html_message, replaced = BODY_END.subn(
+        lambda match: pixel + match[0], html_message, count=1
+    )
+    if not replaced:
+        html_message += pixel
+    return html_message
+
+
+class TrackingEvents:
+    """Appends open and click events to a capped Redis stream."""
+
+    def __init__(self, client=None):
+        self.client = client or redis.StrictRedis.from_url(REDIS_URL)
+        self.maxlen = get_tracking_stream_maxlen()
+
+    def add(self, kind: str, payload: Dict) -> None:
+        event = {
+            "kind": kind,
+            "email": payload["e"],
+            "campaign": payload.get("c") or "",
+            "time": "%.3f" % time.time(),
+        }
+        if kind == CLICK:
+            event["url"] = payload["u"]
+        try:
+            self.client.xadd(
+                TRACKING_STREAM, event, maxlen=self.maxlen, approximate=True
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Tracking event dropped: {e}")
+
+
+_events = None
+
+
+def get_tracking_events() -> TrackingEvents:
+    global _events
+    if _events is None:
+        _events = TrackingEvents()
+    return _events
@@ -17,4 +17,9 @@ urlpatterns = [
         ),
         name="campaign_by_id",
     ),
+    path(
+        "<int:pk>/audience/",
+        CampaignView.as_view({"post": "audience"}),
+        name="campaign_audience",
+    ),
 ]
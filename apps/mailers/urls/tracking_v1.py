@@ -0,0 +1,11 @@
+from django.urls import path
+
+from apps.mailers.views.v1.tracking import track_click, track_open, unsubscribe
+
+app_name = "tracking_api"
+
+urlpatterns = [
+    path("open/<str:token>/", track_open, name="open"),
+    path("click/<str:token>/", track_click, name="click"),
+    path("unsubscribe/<str:token>/", unsubscribe, name="unsubscribe"),
+]
@@ -63,6 +63,7 @@ class CampaignQueryset:
                 .order_by(*order_by)
                 .select_related(
                     "author",
+                    "stats",
                 )
             )
         except Exception as ex:
@@ -1,11 +1,18 @@
 import logging
+from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 
+from apps.mailers.constants import CampaignConstants
+from apps.mailers.models import Campaign
+from apps.mailers.segments import get_segment
 from apps.mailers.serializers.campaign import (
+    CampaignAudienceSerializer,
     CreateCampaignSerializer,
     RetrieveCampaignSerializer,
     StartCampaignSerializer,
 )
+from apps.mailers.tasks import build_campaign_audience_task
 from apps.mailers.view_logic.campaign_qs import CampaignQueryset
 from utils.permissions import IsTokenValid, IsOwner
 from utils.views import MultiSerializerViewSet
@@ -25,6 +32,7 @@ class CampaignView(MultiSerializerViewSet):
         "create": CreateCampaignSerializer,
         "retrieve": RetrieveCampaignSerializer,
         "partial_update": StartCampaignSerializer,
+        "audience": CampaignAudienceSerializer,
     }
 
     def get_queryset(self):
@@ -37,7 +45,7 @@ class CampaignView(MultiSerializerViewSet):
 
     def get_permissions(self):
         logger.info(f"Getting permissions for action {self.action}")
-        if self.action in ("list", "retrieve", "update", "partial_update", "destroy"):
+        if self.action in ("list", "retrieve", "update", "partial_update", "destroy", "audience"):
             return [
                 permission() for permission in (IsAuthenticated, IsTokenValid, IsOwner)
             ]
@@ -91,4 +99,42 @@ class CampaignView(MultiSerializerViewSet):
     def destroy(self, request, *args, **kwargs):
         logger.info(f"Delete campaign {kwargs.get('pk')} for user {request.user}")
         return super().destroy(request, *args, **kwargs)
-    
\ No newline at end of file
+
+    @swagger_auto_schema(
+        operation_summary="Build Campaign Audience",
+        operation_description=(
+            "Generate the campaign's emails from the Base rows matching the "
+            "segment filters, or only count them with preview."
+        ),
+    )
+    def audience(self, request, *args, **kwargs):
+        logger.info(f"Build audience of campaign {kwargs.get('pk')} for user {request.user}")
+        campaign = self.get_object()
+        filters = self.get_valid_data()
+        preview = filters.pop("preview")
+        if preview:
+            return self.get_response({"recipients": get_segment(**filters).count()})
+
+        # Starting the campaign is refused until the build is done
+        building = Campaign.objects.filter(
+            id=campaign.id, status=CampaignConstants.STATUS.created
+        ).update(status=CampaignConstants.STATUS.building)
+        if not building:
+            return Response(
+                {
+                    "detail": "The audience of a started campaign, or one "
+                    "being built, can't be changed."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            build_campaign_audience_task.delay(campaign.id, dict(filters))
+        except Exception:
+            Campaign.objects.filter(
+                id=campaign.id, status=CampaignConstants.STATUS.building
+            ).update(status=CampaignConstants.STATUS.created)
+            raise
+        return Response(
+            {"detail": "Building the campaign audience."},
+            status=status.HTTP_202_ACCEPTED,
+        )
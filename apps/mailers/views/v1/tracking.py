@@ -0,0 +1,61 @@
+from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_http_methods
+
+from apps.backend_mailer.constants import BackendConstants
+from apps.backend_mailer.suppression import suppress
+from apps.mailers.tracking import (
+    CLICK,
+    OPEN,
+    PIXEL,
+    get_tracking_events,
+    read_token,
+    read_unsubscribe_token,
+)
+
+# Plain Django views instead of DRF ones: they are hit by every recipient
+# of a campaign, need no authentication and must not touch the database
+
+
+@never_cache
+@require_GET
+def track_open(request, token):
+    payload = read_token(token)
+    if payload is not None:
+        get_tracking_events().add(OPEN, payload)
+    # Tampered tokens get the pixel as well, so they can't be told apart
+    return HttpResponse(PIXEL, content_type="image/gif")
+
+
+@never_cache
+@require_GET
+def track_click(request, token):
+    payload = read_token(token)
+    if payload is None or not payload.get("u"):
+        raise Http404
+    get_tracking_events().add(CLICK, payload)
+    return HttpResponseRedirect(payload["u"])
+
+
+# Mail clients unsubscribe with a POST (RFC 8058), a GET only shows a
+# confirmation so link scanners can't unsubscribe anyone
+@csrf_exempt
+@never_cache
+@require_http_methods(["GET", "POST"])
+def unsubscribe(request, token):
+    payload = read_unsubscribe_token(token)
+    if payload is None:
+        raise Http404
+    if request.method == "GET":
+        return HttpResponse(
+            '<form method="post"><p>Unsubscribe from these emails?</p>'
+            '<button type="submit">Unsubscribe</button></form>'
+        )
+
+    suppress(
+        [payload["a"]],
+        BackendConstants.SUPPRESSION_REASON.unsubscribe,
+        detail="Email %s of campaign %s" % (payload["e"], payload.get("c")),
+    )
+    return HttpResponse("You have been unsubscribed.", content_type="text/plain")
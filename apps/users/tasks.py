@@ -3,6 +3,26 @@ from django.conf import settings
 from django.core.mail import send_mail
 from rest_framework.reverse import reverse_lazy, reverse
 
+from apps.backend_mailer.constants import BackendConstants
+from apps.backend_mailer.mail import send
+from apps.backend_mailer.settings import get_lanes_enabled
+
+
+def send_account_email(from_email: str, user_email: str, subject: str, message: str):
+    # Queued in the high priority lane, ahead of campaign mail. Without
+    # lanes the queue is shared with campaigns, so it's sent right away
+    if get_lanes_enabled():
+        send(
+            recipients=[user_email],
+            sender=from_email,
+            subject=subject,
+            message=message,
+            priority=BackendConstants.PRIORITY.high,
+        )
+    else:
+        recipient_list = (user_email,)
+        send_mail(subject, message, from_email, recipient_list)
+
 
 @shared_task
 def send_verification_email_task(from_email: str, user_email: str, token: str) -> None:
@@ -12,8 +32,7 @@ def send_verification_email_task(from_email: str, user_email: str, token: str) -
     verification_url = str(reverse_lazy("users_api:email_verify"))
     link = settings.MAIN_HOST + verification_url + "?token=" + token
 
-    recipient_list = (user_email,)
-    send_mail(subject, message + link, from_email, recipient_list)
+    send_account_email(from_email, user_email, subject, message + link)
 
 
 @shared_task
@@ -26,5 +45,4 @@ def send_one_time_jwt_task(from_email: str, user_email: str, token: str) -> None
         + "?token="
         + token
     )
-    recipient_list = (user_email,)
-    send_mail(subject, message + link, from_email, recipient_list)
+    send_account_email(from_email, user_email, subject, message + link)
@@ -0,0 +1,33 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from apps.backend_mailer.constants import BackendConstants
+from apps.users.tasks import send_account_email
+
+
+class SendAccountEmailTests(SimpleTestCase):
+    """
+    ./manage.py test apps.users.tests.test_tasks
+    """
+
+    @mock.patch("apps.users.tasks.send")
+    @mock.patch("apps.users.tasks.send_mail")
+    def test_sent_right_away_without_lanes(self, send_mail, send):
+        send_account_email("from@example.com", "ann@example.com", "Hi", "Link")
+
+        send_mail.assert_called_once_with(
+            "Hi", "Link", "from@example.com", ("ann@example.com",)
+        )
+        send.assert_not_called()
+
+    @override_settings(POST_OFFICE={"LANES_ENABLED": True, "CLAIM_ENABLED": True})
+    @mock.patch("apps.users.tasks.send")
+    @mock.patch("apps.users.tasks.send_mail")
+    def test_queued_in_the_high_lane(self, send_mail, send):
+        send_account_email("from@example.com", "ann@example.com", "Hi", "Link")
+
+        send_mail.assert_not_called()
+        self.assertEqual(
+            send.call_args.kwargs["priority"], BackendConstants.PRIORITY.high
+        )
@@ -41,4 +41,18 @@ class CeleryConstants:
     DATA_PROCESSING_WORKER_NAME = "data_processing"
     DATA_PROCESSING_CONCURRENCY = min([cpu_count, 4])
     DATA_PROCESSING_TASK_PREFIX = "data_processing"
+
+    """ Mail priority lanes -> """
+    MAIL_HIGH_QUEUE = "mail_high"
+    MAIL_MEDIUM_QUEUE = "mail_medium"
+    MAIL_LOW_QUEUE = "mail_low"
+
+    MAIL_TRANSACTIONAL_WORKER_NAME = "mail_transactional"
+    MAIL_TRANSACTIONAL_QUEUES = MAIL_HIGH_QUEUE
+    MAIL_TRANSACTIONAL_CONCURRENCY = 2
+
+    MAIL_BULK_WORKER_NAME = "mail_bulk"
+    MAIL_BULK_QUEUES = f"{MAIL_MEDIUM_QUEUE},{MAIL_LOW_QUEUE}"
+    MAIL_BULK_CONCURRENCY = 2
+    """ <- Mail priority lanes """
     """<- Celery"""
\ No newline at end of file
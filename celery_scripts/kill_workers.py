@@ -7,6 +7,12 @@ from celery_scripts.restart_workers import RestartWorkers
 from celery_scripts.constants import CeleryConstants
 
 def run() -> None:
+    RestartWorkers.kill_celery_worker(
+        worker_name=CeleryConstants.MAIL_BULK_WORKER_NAME,
+    )
+    RestartWorkers.kill_celery_worker(
+        worker_name=CeleryConstants.MAIL_TRANSACTIONAL_WORKER_NAME,
+    )
     RestartWorkers.kill_celery_worker(
         worker_name=CeleryConstants.DATA_PROCESSING_WORKER_NAME,
     )
@@ -3,7 +3,7 @@ run:
     python manage.py runscript celery_scripts.restart_workers
 or:
     from celery_scripts.restart_workers import RestartWorkers
-    # workers names = main, general, log_processing, parser
+    # workers names = main, general, data_processing, mail_transactional, mail_bulk
     RestartWorkers.restart_workers(restart_all=False, worker_name="general")
 """
 
@@ -92,6 +92,40 @@ class RestartWorkers:
             )
         """ <- Custom 'data_processing' queue """
 
+        """ 4. Mail 'high' priority lane -> """
+        if restart_all or worker_name == CeleryConstants.MAIL_TRANSACTIONAL_WORKER_NAME:
+            cls.kill_celery_worker(
+                worker_name=CeleryConstants.MAIL_TRANSACTIONAL_WORKER_NAME,
+            )
+            cls.start_celery_worker(
+                worker_name=CeleryConstants.MAIL_TRANSACTIONAL_WORKER_NAME,
+                queue_name=CeleryConstants.MAIL_TRANSACTIONAL_QUEUES,
+                concurrency_number=CeleryConstants.MAIL_TRANSACTIONAL_CONCURRENCY,
+                log_lvl=log_lvl,
+                log_date=date_str,
+                with_beat=False,
+                with_autoscale=False,
+                autoscale_value="",
+            )
+        """ <- Mail 'high' priority lane """
+
+        """ 5. Mail 'medium' and 'low' priority lanes -> """
+        if restart_all or worker_name == CeleryConstants.MAIL_BULK_WORKER_NAME:
+            cls.kill_celery_worker(
+                worker_name=CeleryConstants.MAIL_BULK_WORKER_NAME,
+            )
+            cls.start_celery_worker(
+                worker_name=CeleryConstants.MAIL_BULK_WORKER_NAME,
+                queue_name=CeleryConstants.MAIL_BULK_QUEUES,
+                concurrency_number=CeleryConstants.MAIL_BULK_CONCURRENCY,
+                log_lvl=log_lvl,
+                log_date=date_str,
+                with_beat=False,
+                with_autoscale=False,
+                autoscale_value="",
+            )
+        """ <- Mail 'medium' and 'low' priority lanes """
+
         return None
 
     @staticmethod
@@ -161,7 +195,7 @@ class RestartWorkers:
                 f" {'--beat' if with_beat else ''}"
                 f" --queues={queue_name}"
                 f" {autoscale}"
-                f" --hostname=mm_back_{queue_name}@%n"
+                f" --hostname=mm_back_{queue_name.replace(',', '_')}@%n"
                 f" --pidfile=./logs/{worker_name}_%n.pid"
                 f" --logfile=./logs/{worker_name}_%n_{log_date}.log"
             )
@@ -265,10 +265,30 @@ CELERY_BEAT_SCHEDULE = {
         "task": "apps.backend_mailer.tasks.send_queued_mail",
         "schedule": 30.0,
     },
+    "backend_mailer_lane_aging_task": {
+        "task": "apps.backend_mailer.tasks.promote_starved_mail",
+        "schedule": 60.0,
+    },
+    "backend_mailer_archive_task": {
+        "task": "apps.backend_mailer.tasks.archive_mail",
+        "schedule": crontab(hour=3, minute=0),
+    },
+    "backend_mailer_suppression_task": {
+        "task": "apps.backend_mailer.tasks.rebuild_suppression",
+        "schedule": crontab(hour=4, minute=0),
+    },
     "campaign_status_check_task": {
         "task": "apps.mailers.tasks.process_campaign",
         "schedule": 10.0,
     },
+    "campaign_stats_flush_task": {
+        "task": "apps.mailers.tasks.flush_campaign_stats_task",
+        "schedule": 5.0,
+    },
+    "tracking_events_task": {
+        "task": "apps.mailers.tasks.consume_tracking_events_task",
+        "schedule": 5.0,
+    },
     "proxy_check_health": {
         "task": "apps.proxies.tasks.check_proxy_health",
         "schedule": 20.0,
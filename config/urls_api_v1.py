@@ -9,6 +9,7 @@ urlpatterns = [
     path("tariffs/", include("apps.products.urls.urls_tariffs")),
     path("messages/", include("apps.backend_mailer.urls.message_v1")),
     path("campaign/", include("apps.mailers.urls.campaign_v1")),
+    path("tracking/", include("apps.mailers.urls.tracking_v1")),
     path("companies/", include("apps.companies.urls.urls_companies")),
     path("monitoring/", include("apps.metrics.urls")),
     path("proxies/", include("apps.proxies.urls.urls_proxies")),
@@ -4,6 +4,8 @@ echo "--- Clean logs and db_backup files ---"
 rm ./logs/main_worker_*.log
 rm ./logs/general_worker_*.log
 rm ./logs/data_processing_*.log
+rm ./logs/mail_transactional_*.log
+rm ./logs/mail_bulk_*.log
 rm ./logs/gunicorn.log
 touch ./logs/gunicorn.log
 touch ./logs/data_processing.log
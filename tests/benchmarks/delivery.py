@@ -0,0 +1,339 @@
+"""
+Benchmark of the delivery pipeline against a local SMTP sink.
+
+Seeds ``count`` queued emails rendered from a template with an attachment,
+drains them with ``send_queued_mail_until_done()`` once per mode and reports
+messages per second, p50/p99 SMTP transaction latency, DB queries per
+message and peak RSS. Each mode runs in a fresh interpreter, since peak RSS
+is a process high-water mark, unless ``isolate=0``. Run it against a
+scratch database only, every queued email is sent to the sink:
+
+    python manage.py runscript tests.benchmarks.delivery
+    python manage.py runscript tests.benchmarks.delivery --script-args \
+        count=2000 modes=default,threaded latency=0.005 error_rate=0.01 \
+        output=benchmark.json baseline=baseline.json max_regression=0.2
+
+With ``baseline`` the script exits with status 1 when a mode is slower, or
+runs more queries per message, than the baseline by more than
+``max_regression``.
+"""
+
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import override_settings
+
+from apps.backend_mailer.constants import BackendConstants
+from apps.backend_mailer.mail import send_queued_mail_until_done, send_stream
+from apps.backend_mailer.models import Attachment, Email, EmailBackend, EmailTemplate
+from apps.backend_mailer.models.email import QUEUE_STATUSES
+from apps.backend_mailer.settings import get_config
+from apps.users.models import User
+from tests.benchmarks.smtp_sink import SMTPSink
+
+# POST_OFFICE overrides and processes of every delivery mode
+MODES = {
+    "default": ({}, 1),
+    "processes": ({}, 4),
+    "threaded": ({"ENGINE": BackendConstants.ENGINE_THREADED}, 1),
+    "fanout": ({"FANOUT_ENABLED": True}, 1),
+    "message_cache": ({"MESSAGE_CACHE_ENABLED": True}, 1),
+    "streaming": ({"STREAMING_DRAIN": True, "CLAIM_ENABLED": True}, 1),
+}
+
+DEFAULTS = {
+    "count": 1000,
+    "modes": ",".join(MODES),
+    "latency": 0.0,
+    "error_rate": 0.0,
+    "attachment_size": 32 * 1024,
+    "render_on_delivery": True,
+    "output": None,
+    "baseline": None,
+    "max_regression": 0.2,
+    "force": False,
+    "isolate": True,
+}
+
+# Options passed on to the interpreter running a single mode
+MODE_OPTIONS = (
+    "count",
+    "latency",
+    "error_rate",
+    "attachment_size",
+    "render_on_delivery",
+    "force",
+)
+
+
+class QueryCounter:
+    """
+    Counts queries on every connection of this process and of processes
+    forked from it, so thread pools and multiprocessing modes are included.
+    """
+
+    def __init__(self):
+        self.value = multiprocessing.Value("l", 0)
+
+    def __call__(self, execute, sql, params, many, context):
+        with self.value.get_lock():
+            self.value.value += 1
+        return execute(sql, params, many, context)
+
+    def install(self, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def __enter__(self):
+        self.value.value = 0
+        self.install(connection)
+        connection_created.connect(self.install)
+        return self
+
+    def __exit__(self, *exc_info):
+        connection_created.disconnect(self.install)
+        if self in connection.execute_wrappers:
+            connection.execute_wrappers.remove(self)
+
+    @property
+    def count(self):
+        return self.value.value
+
+
+def parse_args(args):
+    options = dict(DEFAULTS)
+    for arg in args:
+        key, _, value = arg.partition("=")
+        if key not in DEFAULTS:
+            raise ValueError("Unknown benchmark option: %s" % key)
+        default = DEFAULTS[key]
+        if isinstance(default, bool):
+            value = value.lower() in ("1", "true", "yes")
+        elif isinstance(default, (int, float)):
+            value = type(default)(value)
+        options[key] = value
+    return options
+
+
+def get_peak_rss_mb():
+    """
+    Peak resident set size of this process and its reaped children, only
+    meaningful per mode when every mode runs in its own process.
+    """
+    peak_kb = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return round(peak_kb / 1024.0, 1)
+
+
+class Fixture:
+    """The backend, template and attachment the benchmark emails use."""
+
+    def __init__(self, sink, attachment_size):
+        self.name = "benchmark-%s" % uuid.uuid4().hex[:12]
+        self.author, _ = User.objects.get_or_create(email="%s@example.com" % self.name)
+        self.email_backend = EmailBackend.objects.create(
+            author=self.author,
+            backend_type=BackendConstants.SMTP_EMAIL_BACKEND,
+            config=json.dumps(
+                {
+                    "host": sink.host,
+                    "port": sink.port,
+                    "username": "benchmark",
+                    "password": "benchmark",
+                    "use_tls": False,
+                }
+            ),
+        )
+        self.template = EmailTemplate.objects.create(
+            name=self.name,
+            subject="Benchmark {{ number }}",
+            content="Hello {{ name }},\n\nThis is message {{ number }}.",
+            html_content="<p>Hello <b>{{ name }}</b>,</p><p>Message {{ number }}.</p>",
+        )
+        self.attachment = Attachment(name="benchmark.bin", mimetype="text/plain")
+        self.attachment.file.save(
+            "%s.txt" % self.name, ContentFile(b"x" * attachment_size), save=True
+        )
+
+    def seed(self, count, render_on_delivery):
+        recipients = (
+            ("user%s@example.com" % i, {"name": "User %s" % i, "number": i})
+            for i in range(count)
+        )
+        queued, _ = send_stream(
+            recipients,
+            sender="%s@example.com" % self.name,
+            template=self.template,
+            render_on_delivery=render_on_delivery,
+            email_backend=self.email_backend,
+            author=self.author,
+        )
+        through = Attachment.emails.through
+        through.objects.bulk_create(
+            through(attachment_id=self.attachment.id, email_id=email_id)
+            for email_id in self.get_emails().values_list("id", flat=True)
+        )
+        return queued
+
+    def get_emails(self):
+        return Email.objects.filter(email_backend=self.email_backend)
+
+    def clear(self):
+        Attachment.emails.through.objects.filter(
+            attachment_id=self.attachment.id
+        ).delete()
+        self.get_emails().delete()
+
+    def delete(self):
+        self.clear()
+        self.attachment.file.delete(save=False)
+        self.attachment.delete()
+        self.template.delete()
+        self.email_backend.delete()
+        self.author.delete()
+
+
+def run_mode(mode, fixture, sink, options):
+    overrides, processes = MODES[mode]
+    config = dict(get_config(), CELERY_ENABLED=False, **overrides)
+
+    fixture.clear()
+    fixture.seed(options["count"], options["render_on_delivery"])
+    sink.reset()
+
+    lockfile = os.path.join(tempfile.gettempdir(), fixture.name)
+    with override_settings(POST_OFFICE=config), QueryCounter() as queries:
+        started = time.monotonic()
+        send_queued_mail_until_done(lockfile, processes=processes)
+        elapsed = time.monotonic() - started
+
+    stats = sink.get_stats()
+    left = fixture.get_emails().filter(status__in=QUEUE_STATUSES).count()
+    return {
+        "processes": processes,
+        "seconds": round(elapsed, 3),
+        "msgs_per_sec": round(stats["accepted"] / elapsed, 1) if elapsed else None,
+        "p50_ms": stats["p50_ms"],
+        "p99_ms": stats["p99_ms"],
+        "queries_per_msg": round(queries.count / float(options["count"]), 2),
+        "peak_rss_mb": get_peak_rss_mb(),
+        "accepted": stats["accepted"],
+        "rejected": stats["rejected"],
+        "connections": stats["connections"],
+        "left_in_queue": left,
+    }
+
+
+def run_isolated(mode, options):
+    """
+    Runs one mode in a fresh interpreter and returns its results, so its
+    peak RSS isn't the high-water mark left by the modes run before it.
+    """
+    fd, output = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    args = ["modes=%s" % mode, "isolate=0", "output=%s" % output]
+    args.extend("%s=%s" % (key, options[key]) for key in MODE_OPTIONS)
+    try:
+        subprocess.run(
+            [
+                sys.executable,
+                os.path.join(settings.BASE_DIR, "manage.py"),
+                "runscript",
+                "tests.benchmarks.delivery",
+                "--script-args",
+                *args,
+            ],
+            stdout=subprocess.DEVNULL,
+            check=True,
+        )
+        with open(output) as f:
+            return json.load(f)["results"][mode]
+    finally:
+        os.remove(output)
+
+
+def get_regressions(results, baseline, max_regression):
+    regressions = []
+    for mode, result in results.items():
+        expected = baseline.get("results", {}).get(mode)
+        if not expected:
+            continue
+        if result["msgs_per_sec"] < expected["msgs_per_sec"] * (1 - max_regression):
+            regressions.append(
+                "%s: %s msgs/s, baseline %s"
+                % (mode, result["msgs_per_sec"], expected["msgs_per_sec"])
+            )
+        if result["queries_per_msg"] > expected["queries_per_msg"] * (
+            1 + max_regression
+        ):
+            regressions.append(
+                "%s: %s queries/msg, baseline %s"
+                % (mode, result["queries_per_msg"], expected["queries_per_msg"])
+            )
+    return regressions
+
+
+def print_results(results):
+    columns = ("msgs_per_sec", "p50_ms", "p99_ms", "queries_per_msg", "peak_rss_mb")
+    print("%-14s" % "mode" + "".join("%16s" % column for column in columns))
+    for mode, result in results.items():
+        print("%-14s" % mode + "".join("%16s" % result[column] for column in columns))
+
+
+def run(*args):
+    options = parse_args(args)
+    modes = [mode for mode in options["modes"].split(",") if mode]
+    for mode in modes:
+        if mode not in MODES:
+            raise ValueError("Unknown benchmark mode: %s" % mode)
+
+    if (
+        not options["force"]
+        and Email.objects.filter(status__in=QUEUE_STATUSES).exists()
+    ):
+        raise RuntimeError(
+            "The queue is not empty, run the benchmark on a scratch database "
+            "or pass force=1 to send the queued emails to the sink as well"
+        )
+
+    results = {}
+    if options["isolate"] and len(modes) > 1:
+        for mode in modes:
+            results[mode] = run_isolated(mode, options)
+    else:
+        with SMTPSink(
+            latency=options["latency"], error_rate=options["error_rate"]
+        ) as sink:
+            fixture = Fixture(sink, options["attachment_size"])
+            try:
+                for mode in modes:
+                    results[mode] = run_mode(mode, fixture, sink, options)
+            finally:
+                fixture.delete()
+
+    print_results(results)
+    report = {"options": options, "results": results}
+    if options["output"]:
+        with open(options["output"], "w") as f:
+            json.dump(report, f, indent=2)
+
+    if options["baseline"]:
+        with open(options["baseline"]) as f:
+            baseline = json.load(f)
+        regressions = get_regressions(results, baseline, options["max_regression"])
+        if regressions:
+            print("Regressions:\n  %s" % "\n  ".join(regressions))
+            sys.exit(1)
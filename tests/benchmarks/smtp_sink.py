@@ -0,0 +1,185 @@
+"""
+A local SMTP server that accepts and discards every message, for the
+delivery benchmark. It runs on its own event loop in a background thread:
+
+    with SMTPSink(latency=0.01, error_rate=0.05) as sink:
+        connection = get_connection(host=sink.host, port=sink.port)
+        ...
+        sink.get_stats()
+"""
+
+import asyncio
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+def get_percentile(values: List[float], percentile: float) -> Optional[float]:
+    """Nearest-rank percentile of ``values``, None when there are none."""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(int(round(percentile / 100.0 * len(values))) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+class SMTPSink:
+    """
+    ``latency`` seconds are waited before the reply to every end of DATA
+    and ``error_rate`` of the messages are answered with ``error_reply``
+    instead of being accepted. Errors are drawn from a seeded generator so
+    a run can be repeated.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0,
+        error_rate: float = 0,
+        error_reply: str = "451 4.3.0 Try again later",
+        seed: int = 0,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_reply = error_reply
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._started = threading.Event()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.connections = 0
+            self.accepted = 0
+            self.rejected = 0
+            self.recipients = 0
+            self.latencies = []
+
+    def get_stats(self) -> Dict:
+        """Counters and transaction latencies in ms since the last reset."""
+        with self._lock:
+            latencies = list(self.latencies)
+            stats = {
+                "connections": self.connections,
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "recipients": self.recipients,
+            }
+        for percentile in (50, 99):
+            value = get_percentile(latencies, percentile)
+            stats["p%s_ms" % percentile] = (
+                round(value * 1000, 3) if value is not None else None
+            )
+        return stats
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._started.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            self._loop.run_until_complete(self._server.wait_closed())
+            self._loop.close()
+
+    async def _handle(self, reader, writer):
+        with self._lock:
+            self.connections += 1
+
+        def reply(line):
+            writer.write(("%s\r\n" % line).encode())
+
+        reply("220 %s ESMTP sink" % self.host)
+        transaction_start = None
+        recipients = 0
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode("latin-1").strip()
+                verb = command[:4].upper()
+
+                if verb in ("EHLO", "HELO"):
+                    reply("250-%s" % self.host)
+                    reply("250-PIPELINING")
+                    reply("250-8BITMIME")
+                    reply("250 AUTH PLAIN LOGIN")
+                elif verb == "AUTH":
+                    reply("235 2.7.0 Authentication successful")
+                elif verb == "MAIL":
+                    transaction_start = time.monotonic()
+                    recipients = 0
+                    reply("250 2.1.0 OK")
+                elif verb == "RCPT":
+                    recipients += 1
+                    reply("250 2.1.5 OK")
+                elif verb == "DATA":
+                    reply("354 End data with <CR><LF>.<CR><LF>")
+                    await writer.drain()
+                    while True:
+                        data = await reader.readline()
+                        if not data or data in (b".\r\n", b".\n"):
+                            break
+                    if self.latency:
+                        await asyncio.sleep(self.latency)
+                    reply(self._finish(transaction_start, recipients))
+                    transaction_start = None
+                elif verb == "RSET":
+                    transaction_start = None
+                    reply("250 2.0.0 OK")
+                elif verb == "NOOP":
+                    reply("250 2.0.0 OK")
+                elif verb == "QUIT":
+                    reply("221 2.0.0 Bye")
+                    await writer.drain()
+                    break
+                else:
+                    reply("502 5.5.2 Command not recognized")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _finish(self, transaction_start, recipients) -> str:
+        with self._lock:
+            if transaction_start is not None:
+                self.latencies.append(time.monotonic() - transaction_start)
+            if self._random.random() < self.error_rate:
+                self.rejected += 1
+                return self.error_reply
+            self.accepted += 1
+            self.recipients += recipients
+            return "250 2.0.0 OK queued"
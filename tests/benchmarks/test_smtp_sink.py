@@ -0,0 +1,46 @@
+import smtplib
+import unittest
+
+from tests.benchmarks.smtp_sink import SMTPSink, get_percentile
+
+MESSAGE = "Subject: Benchmark\r\n\r\nHello\r\n.leading dot\r\n"
+
+
+class SMTPSinkTest(unittest.TestCase):
+    def test_messages_are_accepted(self):
+        with SMTPSink() as sink:
+            with smtplib.SMTP(sink.host, sink.port) as smtp:
+                smtp.login("benchmark", "benchmark")
+                for _ in range(3):
+                    smtp.sendmail(
+                        "from@example.com", ["a@example.com", "b@example.com"], MESSAGE
+                    )
+
+            stats = sink.get_stats()
+
+        self.assertEqual(stats["connections"], 1)
+        self.assertEqual(stats["accepted"], 3)
+        self.assertEqual(stats["recipients"], 6)
+        self.assertIsNotNone(stats["p99_ms"])
+
+    def test_errors_are_injected(self):
+        with SMTPSink(error_rate=1, error_reply="421 4.7.0 Slow down") as sink:
+            with smtplib.SMTP(sink.host, sink.port) as smtp:
+                with self.assertRaises(smtplib.SMTPDataError) as error:
+                    smtp.sendmail("from@example.com", ["a@example.com"], MESSAGE)
+
+            stats = sink.get_stats()
+
+        self.assertEqual(error.exception.smtp_code, 421)
+        self.assertEqual((stats["accepted"], stats["rejected"]), (0, 1))
+
+    def test_percentile(self):
+        values = [i / 100.0 for i in range(1, 101)]
+
+        self.assertEqual(get_percentile(values, 50), 0.5)
+        self.assertEqual(get_percentile(values, 99), 0.99)
+        self.assertIsNone(get_percentile([], 99))
+
+
+if __name__ == "__main__":
+    unittest.main()